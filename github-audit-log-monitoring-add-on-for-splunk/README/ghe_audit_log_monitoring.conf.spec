@@ -0,0 +1,65 @@
+[settings]
+* Process wide settings of the GitHub audit log modular input
+
+use_single_instance = <value>
+* Boolean to run every input in a single process instead of one process per input
+
+worker_threads = <value>
+* Number of inputs polled concurrently when use_single_instance is enabled
+
+daemon = <value>
+* Boolean to keep the process running and poll the inputs on an internal schedule
+
+poll_interval = <value>
+* Number of seconds between two polls of an input in daemon mode
+
+buffered_writer = <value>
+* Boolean to buffer the events and write them to splunkd in batches instead of one at a time
+
+write_buffer_kb = <value>
+* Size in KB of the buffered events that triggers a write when buffered_writer is enabled
+
+write_flush_seconds = <value>
+* Maximum number of seconds events stay buffered when buffered_writer is enabled
+
+output = <value>
+* Where the events are sent: stdout (to splunkd, the default) or hec (to an HTTP Event Collector)
+
+hec_url = <value>
+* Base URL of the HTTP Event Collector when output is hec
+
+hec_credential = <value>
+* Name of the credential holding the HTTP Event Collector token in Splunk's password storage (storage/passwords) when output is hec
+
+hec_batch_size = <value>
+* Number of events per HTTP Event Collector request
+
+hec_max_in_flight = <value>
+* Number of HTTP Event Collector requests sent concurrently
+
+hec_ack = <value>
+* Boolean to wait for the indexer acknowledgement of the events before checkpointing
+
+hec_ack_timeout = <value>
+* Maximum number of seconds to wait for the indexer acknowledgements
+
+hec_verify_ssl = <value>
+* Boolean to verify the certificate of the HTTP Event Collector
+
+checkpoint_backend = <value>
+* Where the checkpoints are kept: file (local state files, the default) or kvstore (local state files mirrored to the KV Store)
+
+kvstore_flush_seconds = <value>
+* Maximum number of seconds the checkpoints committed wait before being saved to the KV Store
+
+[projection:<name>]
+* Projection profile, selected by the projection option of the inputs
+
+keep = <value>
+* Comma separated list of the only fields written, dotted paths reach into nested objects, e.g. actor_location.country_code
+
+drop = <value>
+* Comma separated list of the fields never written, dotted paths reach into nested objects
+
+actions = <value>
+* Comma separated list of patterns, e.g. git.*, of the actions whose entries are projected; the other entries are written whole. Defaults to every action
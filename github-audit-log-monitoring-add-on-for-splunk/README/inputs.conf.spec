@@ -27,5 +27,74 @@ ignore_ssc = <value>
 debug = <value>
 * Boolean to enable/disable debug mode
 
+pool_size = <value>
+* Number of keep-alive connections kept open to the GitHub API
+
+connect_timeout = <value>
+* Seconds to wait for a connection to the GitHub API
+
+read_timeout = <value>
+* Seconds to wait for the GitHub API to send a response
+
 python.version = <value>
 * Python version to run. Can also use python2 for older Splunk versions
+
+streaming = <value>
+* Boolean to fetch the next page on a background thread while a page is being written
+
+prefetch_pages = <value>
+* Maximum number of pages fetched ahead of the writer in streaming mode
+
+backfill_start = <value>
+* Date (YYYY-MM-DD) from which to backfill the audit log before regular polling
+
+backfill_window_days = <value>
+* Number of days covered by each backfill window
+
+backfill_workers = <value>
+* Number of backfill windows fetched concurrently
+
+rate_limit_max_wait = <value>
+* Maximum seconds to wait for the API rate limit to reset before ending the run
+
+rate_limit_reserve = <value>
+* Number of API calls of the hourly budget left for other tools
+
+max_retries = <value>
+* Number of times a page is retried after a transient failure
+
+dedup_retention_hours = <value>
+* Number of hours the document ids written to Splunk are remembered
+
+stream_json = <value>
+* Boolean to decode the audit log entries as the response is read off the socket
+
+max_buffer_mb = <value>
+* Budget in MB of API responses for the audit log pages held in memory at once:
+* the pages fetched ahead and not yet written in streaming mode, the pages of
+* the concurrent windows in backfill mode
+
+output_mode = <value>
+* Format of the events: kv for key=value pairs, json for compact JSON, raw for the JSON of the entries as received
+
+event_time = <value>
+* Boolean to set the time of the events from their @timestamp or created_at field
+
+spool = <value>
+* Boolean to append the pages fetched to an on-disk spool before writing them to Splunk
+
+projection = <value>
+* Name of the projection profile selecting the fields written, see ghe_audit_log_monitoring.conf.spec
+
+rollup = <value>
+* Boolean to write the git.* events as counts per time bucket by action, repo, actor and transport protocol
+
+rollup_bucket_seconds = <value>
+* Length in seconds of the time buckets of the git rollup
+
+rollup_sample_ratio = <value>
+* Ratio, between 0 and 1, of the git events rolled up that are also written as events
+
+rollup_index = <value>
+* Metrics index the git rollup is written to, the index of the input if empty
+* (a warning is logged: the datapoints only become metrics in a metrics index)
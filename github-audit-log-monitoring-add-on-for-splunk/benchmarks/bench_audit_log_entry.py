@@ -0,0 +1,98 @@
+"""Compares the memory and construction time of AuditLogEntry against the
+previous __dict__ based implementation.
+
+Usage: python benchmarks/bench_audit_log_entry.py [entries]
+"""
+from __future__ import absolute_import, print_function
+import os
+import sys
+import gc
+import time
+import random
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bin"))
+
+from audit_log_entry import AuditLogEntry  # noqa: E402
+
+
+class LegacyAuditLogEntry:
+    """AuditLogEntry as it was before the slots based implementation"""
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+    @property
+    def action(self):
+        return self.__dict__["action"]
+
+    @property
+    def document_id(self):
+        return self.__dict__["_document_id"]
+
+
+SHAPES = [
+    ("git.fetch", ["business", "org", "repo", "transport_protocol_name", "transport_protocol", "repository", "repository_public"]),
+    ("git.clone", ["business", "org", "repo", "transport_protocol_name", "transport_protocol", "repository", "repository_public", "actor", "user"]),
+    ("repo.create", ["actor", "visibility", "org", "repo", "created_at"]),
+    ("org.update_member", ["actor", "org", "created_at", "user", "permission"]),
+]
+
+
+def make_items(count):
+    rng = random.Random(42)
+    items = []
+    for index in range(count):
+        action, fields = SHAPES[index % len(SHAPES)]
+        item = {"@timestamp": 1614692646036 + index, "action": action}
+        for field in fields:
+            item[field] = "{}-{}".format(field, rng.randint(0, 50))
+        item["_document_id"] = "doc-{:08d}".format(index)
+        items.append(item)
+    return items
+
+
+def measure(name, build, items):
+    # Timed without tracemalloc, which slows allocations down
+    gc.collect()
+    started = time.time()
+    entries = build(items)
+    elapsed = time.time() - started
+    del entries
+    gc.collect()
+    tracemalloc.start()
+    entries = build(items)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    started = time.time()
+    for entry in entries:
+        entry.document_id
+        entry.action
+    access = time.time() - started
+    print(
+        "{:<10} build: {:7.3f}s  access: {:7.3f}s  memory: {:8.1f} MiB".format(
+            name, elapsed, access, current / 1024.0 / 1024.0
+        )
+    )
+    return elapsed, current
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    items = make_items(count)
+    print("{} entries".format(count))
+    legacy = measure(
+        "legacy", lambda items: [LegacyAuditLogEntry(**item) for item in items], items
+    )
+    compact = measure(
+        "slots", lambda items: [AuditLogEntry.from_dict(item) for item in items], items
+    )
+    print(
+        "memory saved: {:.0%}  build time saved: {:.0%}".format(
+            1 - float(compact[1]) / legacy[1], 1 - compact[0] / legacy[0]
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Compares the time spent writing events with splunklib's EventWriter
+(Event.write_to, one ElementTree and one flush per event) against the
+BufferedEventWriter.
+
+Usage: python benchmarks/bench_event_writers.py [events]
+"""
+from __future__ import absolute_import, print_function
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bin"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
+
+from splunklib.modularinput import Event, EventWriter  # noqa: E402
+from audit_log_entry import AuditLogEntry  # noqa: E402
+from event_writers import BufferedEventWriter  # noqa: E402
+from utilities import Utilities  # noqa: E402
+
+
+class CountingOutput(io.TextIOWrapper):
+    """Text output to /dev/null counting the writes reaching the file"""
+
+    def __init__(self):
+        self.writes = 0
+        raw = io.FileIO(os.devnull, "w")
+        super(CountingOutput, self).__init__(io.BufferedWriter(raw), encoding="utf-8")
+
+    def flush(self):
+        self.writes += 1
+        super(CountingOutput, self).flush()
+
+
+def make_events(count):
+    events = []
+    for index in range(count):
+        entry = AuditLogEntry.from_dict(
+            {
+                "@timestamp": 1614692646036 + index,
+                "action": "git.fetch",
+                "actor": "octocat",
+                "business": "poizen-inc",
+                "org": "org-demo",
+                "repo": "org-demo/public-repo",
+                "transport_protocol_name": "http",
+                "transport_protocol": 1,
+                "repository_public": False,
+                "_document_id": "doc-{:08d}".format(index),
+            }
+        )
+        events.append(
+            Event(
+                data=Utilities.json_serialize(entry),
+                stanza="ghe_audit_log_monitoring://poizen-inc",
+                time=Utilities.event_times([entry])[0],
+            )
+        )
+    return events
+
+
+def measure(name, event_writer, output, events):
+    started = time.time()
+    for event in events:
+        event_writer.write_event(event)
+    event_writer.close()
+    elapsed = time.time() - started
+    print(
+        "{:<10} {:7.3f}s  {:6.1f} us/event  flushes: {}".format(
+            name, elapsed, elapsed / len(events) * 1e6, output.writes
+        )
+    )
+    return elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    events = make_events(count)
+    print("{} events".format(count))
+    output = CountingOutput()
+    default = measure("default", EventWriter(output=output), output, events)
+    output = CountingOutput()
+    buffered = measure(
+        "buffered", BufferedEventWriter(output=output), output, events
+    )
+    print("write time saved: {:.0%}".format(1 - buffered / default))
+
+
+if __name__ == "__main__":
+    main()
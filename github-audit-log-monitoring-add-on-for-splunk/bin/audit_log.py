@@ -1,6 +1,9 @@
 """AuditLog class
 """
 from __future__ import absolute_import, print_function
+import json
+from collections import deque
+from itertools import chain
 
 try:
     from six.moves.urllib.parse import urlparse, parse_qs
@@ -8,18 +11,26 @@ except ImportError:
     from urllib.parse import urlparse, parse_qs
 
 from audit_log_entry import AuditLogEntry
+from json_stream import iter_json_array, CHUNK_SIZE
+from page_batch import PageBatch
 
 
 class AuditLog:
     def __init__(self, type=None, enterprise=None, **kwargs):
         self._type = type
         self._enterprise = enterprise
-        self._entries = []
+        # Pages of entries, oldest first, with the size in bytes of their
+        # response body: whole pages are dropped from the front in O(1)
+        self._pages = deque()
+        self._bytes = 0
+        self._iterator = iter(())
+        self._batch = None
         self._total = 0
         self._page_cursor = {"next": None, "prev": None, "first": None, "last": None}
         self._has_next_page = True
         self._index = 0
         self._last_page = {"_document_id": "", "count": 0}
+        self._etag = None
         self._api_rate_limits = {
             "x_rl_limit": 0,
             "x_rl_remainig": 0,
@@ -59,6 +70,104 @@ class AuditLog:
     def last_page(self):
         return self._last_page
 
+    @property
+    def etag(self):
+        return self._etag
+
+    @property
+    def entries(self):
+        return list(chain.from_iterable(entries for entries, _ in self._pages))
+
+    @property
+    def byte_size(self):
+        """Size of the response bodies of the pages held, a proxy for the
+        memory used by the entries"""
+        return self._bytes
+
+    @property
+    def page_count(self):
+        return len(self._pages)
+
+    @property
+    def batch(self):
+        """Columnar view (PageBatch) of the entries, built on first access
+        and rebuilt after the entries change"""
+        if self._batch is None:
+            self._batch = PageBatch.from_entries(self.entries)
+        return self._batch
+
+    def _changed(self):
+        self._total = sum(len(entries) for entries, _ in self._pages)
+        self._batch = None
+
+    def set_entries(self, entries, byte_size=0):
+        """Replaces the entries with a single page"""
+        self._pages.clear()
+        self._bytes = 0
+        if entries:
+            self._pages.append((list(entries), byte_size))
+            self._bytes = byte_size
+        self._changed()
+
+    def pop_page(self):
+        """Removes the oldest page and releases its memory. Helper of
+        drop_from_start(), which pops the pages it drops whole.
+
+        Returns:
+            [list]: Entries of the page, None if there are no pages left
+        """
+        if not self._pages:
+            return None
+        entries, byte_size = self._pages.popleft()
+        self._bytes -= byte_size
+        self._total -= len(entries)
+        self._batch = None
+        return entries
+
+    def drop_from_start(self, count):
+        """Removes the first count entries: whole pages are popped from the
+        front, only the page the cut falls in is sliced.
+
+        Args:
+            count ([int]): Number of entries to remove
+
+        Returns:
+            [int]: Number of entries removed
+        """
+        removed = 0
+        while self._pages and removed + len(self._pages[0][0]) <= count:
+            removed += len(self.pop_page())
+        if self._pages and removed < count:
+            entries, byte_size = self._pages.popleft()
+            cut = count - removed
+            kept = entries[cut:]
+            kept_size = byte_size * len(kept) // len(entries)
+            self._pages.appendleft((kept, kept_size))
+            self._bytes -= byte_size - kept_size
+            removed = count
+        self._changed()
+        return removed
+
+    def _keep(self, keep):
+        """Keeps the entries for which keep(position, entry) is true, page by
+        page. The byte size of each page is prorated to what is kept."""
+        pages = deque()
+        position = 0
+        self._bytes = 0
+        for entries, byte_size in self._pages:
+            kept = [
+                entry
+                for offset, entry in enumerate(entries)
+                if keep(position + offset, entry)
+            ]
+            position += len(entries)
+            if kept:
+                kept_size = byte_size * len(kept) // len(entries)
+                pages.append((kept, kept_size))
+                self._bytes += kept_size
+        self._pages = pages
+        self._changed()
+
     def set_page_cursor(self, links, url=None):
         """Parse the links in the response headers
 
@@ -138,8 +247,7 @@ class AuditLog:
         Returns:
             [AuditLog]: AuditLog instance
         """
-        self._entries = []
-        self._total = 0
+        self.set_entries([])
         return self
 
     def truncate_from_start(self, count=None):
@@ -156,16 +264,54 @@ class AuditLog:
         """
         if count is None:
             raise ValueError("count cannot be undefined. Nothing to purge.")
-        self._entries = self._entries[-count:]
-        self._total = count
+        self.drop_from_start(max(0, self._total - count))
         return self
 
-    def load(self, response):
+    def drop_through(self, document_id=None):
+        """Remove the entries up to and including the entry with the given
+        document id. Nothing is removed if the document id is not found.
+
+        Args:
+            document_id ([str], optional): _document_id of the last entry to drop. Defaults to None.
+
+        Returns:
+            [int]: Number of entries removed
+        """
+        position = 0
+        for entries, _ in self._pages:
+            for entry in entries:
+                position += 1
+                if entry.document_id == document_id:
+                    return self.drop_from_start(position)
+        return 0
+
+    def deduplicate(self, dedup_index=None):
+        """Remove the entries whose document id is in the dedup index, i.e.
+        the entries already written to Splunk
+
+        Args:
+            dedup_index ([DedupIndex], optional): Index of the document ids written. Defaults to None.
+
+        Returns:
+            [int]: Number of entries removed
+        """
+        if dedup_index is None:
+            return 0
+        total = self._total
+        self._keep(lambda _, entry: entry.document_id not in dedup_index)
+        return total - self._total
+
+    def load(self, response, stream=False, raw=False):
         """Will load and append audit log entries from the audit log
         API response and update the cursor.
 
         Args:
             response ([requests.Response]): requests library Response obect
+            stream ([bool], optional): Decode the body incrementally as it is
+                read off the socket, the response must have been requested with
+                stream=True. Defaults to False.
+            raw ([bool], optional): Keep the JSON text of each entry and only
+                its RAW_FIELDS, see AuditLogEntry.from_raw(). Defaults to False.
 
         Raises:
             ValueError: response cannot be None or an empty string
@@ -175,28 +321,103 @@ class AuditLog:
         """
         if response is None or response == "":
             raise ValueError("API call response cannot be None or an empty string")
-        json = response.json()
         # Set the meta-data first
         self.set_api_limits(response.headers)
         self.set_page_cursor(links=response.links, url=response.url)
+        self._etag = response.headers.get("ETag")
         if "next" in self._page_cursor:
             self._has_next_page = self._page_cursor["next"] is not None
         # Otherwise add the entries
-        for item in json:
-            entry = AuditLogEntry(**item)
-            self._entries.append(entry)
+        entries = []
+        if stream:
+            # Entries are built one at a time, without holding the whole body
+            # and the whole list of dicts in memory
+            byte_size = [0]
+
+            def chunks():
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    byte_size[0] += len(chunk)
+                    yield chunk
+
+            try:
+                self._load_items(
+                    entries, chunks(), response.encoding or "utf-8", raw
+                )
+            finally:
+                response.close()
+            byte_size = byte_size[0]
+        elif raw:
+            # The JSON text of the entries is sliced out of the body
+            self._load_items(
+                entries, [response.content], response.encoding or "utf-8", raw
+            )
+            byte_size = len(response.content)
+        else:
+            for item in response.json():
+                entry = AuditLogEntry.from_dict(item)
+                entries.append(entry)
+            byte_size = len(response.content)
         # Number of entries in the last page
         if self._total == 0:
-            last_count = len(self._entries) - self._total
+            last_count = len(entries)
         else:
-            last_count = len(self._entries)
-        if len(self._entries) > 0:
+            last_count = self._total + len(entries)
+        if entries:
+            self._pages.append((entries, byte_size))
+            self._bytes += byte_size
+        if self._total + len(entries) > 0:
             self.set_last_page(
-                last_document_id=self._entries[-1].document_id, last_count=last_count
+                last_document_id=self.last_entry().document_id, last_count=last_count
             )
-        self._total = len(self._entries)
+        self._changed()
         return self
 
+    def dumps(self):
+        """Returns the entries as a JSON array, e.g. to spool a page. Entries
+        built from raw JSON are written as they were received.
+
+        Returns:
+            [str]: JSON array of the entries
+        """
+        return "[{}]".format(
+            ",".join(
+                entry.raw if entry.raw is not None else json.dumps(dict(entry.items()))
+                for entry in self
+            )
+        )
+
+    def loads(self, text, raw=False):
+        """Appends the entries of a JSON array written by dumps() as a page.
+        The cursor and the last page are left untouched.
+
+        Args:
+            text ([str]): JSON array of entries
+            raw ([bool], optional): See load(). Defaults to False.
+
+        Returns:
+            AuditLog: Returns the current AuditLog instance
+        """
+        entries = []
+        self._load_items(entries, [text], "utf-8", raw)
+        if entries:
+            self._pages.append((entries, len(text)))
+            self._bytes += len(text)
+        self._changed()
+        return self
+
+    @staticmethod
+    def _load_items(entries, chunks, encoding, raw):
+        if raw:
+            for item, text in iter_json_array(chunks, encoding=encoding, raw=True):
+                entries.append(AuditLogEntry.from_raw(item, text))
+        else:
+            for item in iter_json_array(chunks, encoding=encoding):
+                entries.append(AuditLogEntry.from_dict(item))
+
+    def last_entry(self):
+        """Returns the newest entry, None if there are no entries"""
+        return self._pages[-1][0][-1] if self._pages else None
+
     def __iter__(self):
         """Create the iterator object after parsing the raw JSON response
         from GHE
@@ -216,8 +437,12 @@ class AuditLog:
         Returns:
             Object: Content of the 'node' element in the entries
         """
+        if self._index == 0:
+            self._iterator = chain.from_iterable(
+                [entries for entries, _ in self._pages]
+            )
         if self._index < self._total:
-            result = self._entries[self._index]
+            result = next(self._iterator)
             self._index += 1
             return result
         else:
@@ -234,8 +459,12 @@ class AuditLog:
         Returns:
             Object: Content of the 'node' element in the entries
         """
+        if self._index == 0:
+            self._iterator = chain.from_iterable(
+                [entries for entries, _ in self._pages]
+            )
         if self._index < self._total:
-            result = self._entries[self._index]
+            result = next(self._iterator)
             self._index += 1
             return result
         else:
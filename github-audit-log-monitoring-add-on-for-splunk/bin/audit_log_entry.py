@@ -3,81 +3,218 @@
 import json
 import hashlib
 
+# Key tables are shared by the entries with the same keys in the same order.
+# Entries of a given action nearly always have the same shape, so a few
+# hundred tables cover a whole catch-up run; past this bound new shapes are
+# simply not shared.
+MAX_SHAPES = 4096
+
+# Fields kept by the entries built from raw JSON: the ones the cursor, the
+# dedup index and the logs need
+RAW_FIELDS = ("@timestamp", "created_at", "action", "_document_id")
+
+
+def fingerprint(item):
+    """md5 of the canonical JSON of a decoded entry"""
+    return hashlib.md5(json.dumps(item, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class _Shape(object):
+    """Key table shared by the entries with the same keys: the keys in order,
+    the position of each key in the entries' values and, in slots, the
+    positions of the hot fields"""
+
+    __slots__ = ("keys", "index", "timestamp", "action", "document_id")
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.index = dict((key, position) for position, key in enumerate(keys))
+        timestamp = self.index.get("@timestamp")
+        self.timestamp = timestamp if timestamp is not None else self.index.get("timestamp")
+        self.action = self.index.get("action")
+        self.document_id = self.index.get("_document_id")
+
+
+_shapes = {}
+
+
+def _shape(keys):
+    shape = _shapes.get(keys)
+    if shape is None:
+        shape = _Shape(keys)
+        if len(_shapes) < MAX_SHAPES:
+            _shapes[keys] = shape
+    return shape
+
+
+class AuditLogEntry(object):
+    """A single audit log entry.
+
+    The values are kept in a tuple, in the order they were received, next to
+    a key table shared with every entry of the same shape, instead of a
+    __dict__ per entry. The key table keeps the positions of the hot fields,
+    so reading them costs no dict lookup. Any key can still be read as an
+    attribute, e.g. entry.business.
+
+    Entries built with from_raw() only keep RAW_FIELDS next to the JSON text
+    they were decoded from, which is written to Splunk as is.
+    """
+
+    __slots__ = ("_shape", "_values", "_hash", "_raw")
 
-class AuditLogEntry:
     def __init__(self, **kwargs):
-        self.__dict__.update(kwargs)
+        self._load(kwargs)
+
+    @classmethod
+    def from_dict(cls, item):
+        """Builds an entry from a decoded JSON object without copying it into
+        keyword arguments first
+
+        Args:
+            item ([dict]): Decoded audit log entry
+
+        Returns:
+            AuditLogEntry: The new entry
+        """
+        entry = cls.__new__(cls)
+        entry._load(item)
+        return entry
+
+    @classmethod
+    def from_raw(cls, item, raw):
+        """Builds an entry that only keeps the RAW_FIELDS of a decoded JSON
+        object, and the JSON text itself
+
+        Args:
+            item ([dict]): Decoded audit log entry
+            raw ([str]): JSON text of the entry, as received
+
+        Returns:
+            AuditLogEntry: The new entry
+        """
+        entry = cls.__new__(cls)
+        entry._load(dict((key, item[key]) for key in RAW_FIELDS if key in item))
+        entry._raw = raw
+        if "_document_id" not in item:
+            # The fallback document id is the fingerprint of the whole entry
+            entry._hash = fingerprint(item)
+        return entry
+
+    def _load(self, item):
+        keys = tuple(item)
+        shape = _shapes.get(keys)
+        self._shape = shape if shape is not None else _shape(keys)
+        self._values = tuple(item.values())
+        self._hash = None
+        self._raw = None
 
     def __repr__(self):
         return self.id
 
+    def __getattr__(self, name):
+        # Only called for the keys that are not a slot or a property
+        if name in AuditLogEntry.__slots__:
+            raise AttributeError(name)
+        position = self._shape.index.get(name)
+        if position is None:
+            raise AttributeError(
+                "'AuditLogEntry' object has no attribute '{}'".format(name)
+            )
+        return self._values[position]
+
+    def __getitem__(self, key):
+        return self._values[self._shape.index[key]]
+
+    def __contains__(self, key):
+        return key in self._shape.index
+
+    def get(self, key, default=None):
+        """Returns the value of a key, or default if the entry does not have it"""
+        position = self._shape.index.get(key)
+        return default if position is None else self._values[position]
+
+    def keys(self):
+        return self._shape.keys
+
+    def values(self):
+        """Returns the values, in the order of keys()"""
+        return self._values
+
+    def items(self):
+        """Returns the (key, value) pairs, in the order they were received"""
+        return zip(self._shape.keys, self._values)
+
+    def to_dict(self):
+        return dict(zip(self._shape.keys, self._values))
+
+    @property
+    def raw(self):
+        """JSON text of the entry as received, None unless built by from_raw()"""
+        return self._raw
+
     @property
     def id(self):
         return "{} - {}".format(self.timestamp, self.action)
 
     @property
     def timestamp(self):
-        if self.__dict__["@timestamp"]:
-            return self.__dict__["@timestamp"]
-        elif self.__dict__["timestamp"]:
-            return self.__dict__["timestamp"]
-        else:
-            return None
+        position = self._shape.timestamp
+        return None if position is None else self._values[position]
 
     @property
     def action(self):
-        return self.__dict__["action"]
+        position = self._shape.action
+        return None if position is None else self._values[position]
 
     @property
     def actor(self):
-        return self.__dict__["actor"]
+        return self.get("actor")
 
     @property
     def transport_protocol_name(self):
-        return self.__dict__["transport_protocol_name"]
+        return self.get("transport_protocol_name")
 
     @property
     def transport_protocol(self):
-        return self.__dict__["transport_protocol"]
+        return self.get("transport_protocol")
 
     @property
     def created_at(self):
-        return self.__dict__["created_at"]
+        return self.get("created_at")
 
     @property
     def org(self):
-        return self.__dict__["org"] if not None else self.__dict__["business"]
+        return self.get("org") or self.get("business")
 
     @property
     def team(self):
-        return self.__dict__["team"]
+        return self.get("team")
 
     @property
     def user(self):
-        return self.__dict__["user"]
+        return self.get("user")
 
     @property
     def repo(self):
-        return self.__dict__["repo"]
+        return self.get("repo")
 
     @property
     def visibility(self):
-        return (
-            self.__dict__["visibility"]
-            if not None
-            else self.__dict__["repository_public"]
-        )
+        visibility = self.get("visibility")
+        return visibility if visibility is not None else self.get("repository_public")
 
     @property
     def document_id(self):
-        return (
-            self.__dict__["_document_id"]
-            if "_document_id" in self.__dict__
-            else str(self.hash)
-        )
+        position = self._shape.document_id
+        return self._values[position] if position is not None else str(self.hash)
 
     @property
     def hash(self):
-        return hashlib.md5(
-            json.dumps(self.__dict__, sort_keys=True).encode("utf-8")
-        ).hexdigest()
+        """Fingerprint of the entry, used as its document id when it has no
+        _document_id (e.g. most Git events). Entries are immutable, so it is
+        computed once. The digest and canonical form must not change: the
+        fingerprints are stored in checkpoints and dedup indexes.
+        """
+        if self._hash is None:
+            self._hash = fingerprint(self.to_dict())
+        return self._hash
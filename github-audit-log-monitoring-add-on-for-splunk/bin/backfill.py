@@ -0,0 +1,208 @@
+"""Backfill class
+"""
+from __future__ import absolute_import, print_function
+import logging
+import datetime
+
+import requests
+
+from pipeline import run_in_pool
+from rate_limit import RateLimitExceeded
+
+
+class Backfill:
+    """Fetches the history of the audit log in time-sliced windows, several
+    windows at a time, instead of walking the after cursor one page at a
+    time from the start of history.
+
+    The range between the backfill start date and the day the backfill was
+    planned is split into windows of window_days days, each one fetched with
+    the created: search qualifier. The last window is open-ended
+    (created:YYYY-MM-DD..*): once it is exhausted, its last page becomes the
+    input's regular checkpoint, and its search phrase (see phrase()) the
+    phrase of the regular polls, which its after cursors belong to.
+
+    Progress is kept in the [backfill] section of the enterprise state file,
+    with one key per window. The value is empty while the window is pending,
+    holds the after cursor of the next page while the window is partially
+    fetched, and is "done" once the window is exhausted.
+
+    The windows fetched concurrently are held in memory until they are
+    written: each one stops at max_entries entries or at its share of the
+    max_bytes budget, whichever comes first.
+    """
+
+    SECTION = "backfill"
+    DONE = "done"
+
+    def __init__(
+        self,
+        github,
+        state,
+        type=None,
+        enterprise=None,
+        start=None,
+        window_days=7,
+        workers=4,
+        max_entries=1000,
+        max_bytes=None,
+    ):
+        self._github = github
+        self._state = state
+        self._type = type
+        self._enterprise = enterprise
+        self._start = start
+        self._window_days = max(1, int(window_days))
+        self._workers = max(1, int(workers))
+        self._max_entries = int(max_entries)
+        self._max_bytes = None if max_bytes is None else int(max_bytes)
+
+    @property
+    def completed(self):
+        return (
+            self._state.has_section(Backfill.SECTION)
+            and self._state.get(Backfill.SECTION, "completed", fallback="0") == "1"
+        )
+
+    def plan(self, today=None):
+        """Splits the backfill range into windows and stores them in the
+        state. The plan is only made once per start date, later runs resume
+        the stored windows.
+
+        Args:
+            today ([datetime.date], optional): End of the range. Defaults to today (UTC).
+
+        Returns:
+            [list]: The window labels, in chronological order
+        """
+        if (
+            self._state.has_section(Backfill.SECTION)
+            and self._state.get(Backfill.SECTION, "start", fallback="") == self._start
+        ):
+            return self.windows()
+        if self._state.has_section(Backfill.SECTION):
+            self._state.remove_section(Backfill.SECTION)
+        self._state.add_section(Backfill.SECTION)
+        self._state.set(Backfill.SECTION, "start", self._start)
+        self._state.set(Backfill.SECTION, "completed", "0")
+        today = datetime.datetime.utcnow().date() if today is None else today
+        window_start = datetime.datetime.strptime(self._start, "%Y-%m-%d").date()
+        step = datetime.timedelta(days=self._window_days)
+        while window_start + step <= today:
+            window_end = window_start + step - datetime.timedelta(days=1)
+            self._state.set(
+                Backfill.SECTION,
+                "{}..{}".format(window_start.isoformat(), window_end.isoformat()),
+                "",
+            )
+            window_start += step
+        self._state.set(Backfill.SECTION, "{}..*".format(window_start.isoformat()), "")
+        return self.windows()
+
+    def windows(self):
+        """Returns the labels of every planned window in chronological order"""
+        return sorted(
+            key for key in self._state.options(Backfill.SECTION) if ".." in key
+        )
+
+    def pending(self):
+        """Returns the labels of the windows that are not exhausted yet"""
+        return [
+            window
+            for window in self.windows()
+            if self._state.get(Backfill.SECTION, window) != Backfill.DONE
+        ]
+
+    @staticmethod
+    def phrase(window):
+        """Returns the search phrase of a window"""
+        return "created:{}".format(window)
+
+    def fetch_window(self, window):
+        """Fetches up to max_entries entries of a single window, resuming
+        from its stored cursor. A window that fails does not fail the others:
+        the error is logged and the pages fetched so far are returned, the
+        next run resumes the window after them.
+
+        Args:
+            window ([str]): Window label, e.g. 2021-01-01..2021-01-07
+
+        Returns:
+            [list]: The AuditLog pages fetched. Empty if the API budget was
+            exhausted, or the first page failed.
+        """
+        cursor = self._state.get(Backfill.SECTION, window)
+        pages = []
+        try:
+            for page in self._github.iter_enterprise_audit_log(
+                type=self._type,
+                enterprise=self._enterprise,
+                page_cursor=cursor if cursor else None,
+                phrase=Backfill.phrase(window),
+                max_entries=self._max_entries,
+                max_bytes=None
+                if self._max_bytes is None
+                else self._max_bytes // self._workers,
+            ):
+                pages.append(page)
+        except RateLimitExceeded:
+            pass
+        except (RuntimeError, requests.exceptions.RequestException) as error:
+            logging.error(
+                "Backfill.fetch_window(): Window %s failed after %d pages: %s",
+                window,
+                len(pages),
+                error,
+            )
+        return pages
+
+    def run(self):
+        """Fetches the next pending windows concurrently, one window per
+        worker.
+
+        Returns:
+            [list]: (window, pages) tuples in chronological order
+        """
+        windows = self.pending()[: self._workers]
+        return list(
+            zip(windows, run_in_pool(self.fetch_window, windows, self._workers))
+        )
+
+    @staticmethod
+    def merge(results):
+        """Yields the entries of the fetched windows in chronological order,
+        skipping document ids already seen in an earlier window (windows can
+        overlap on their boundaries).
+        """
+        seen = set()
+        for _, pages in results:
+            for page in pages:
+                for entry in page:
+                    if entry.document_id in seen:
+                        continue
+                    seen.add(entry.document_id)
+                    yield entry
+
+    def checkpoint(self, results):
+        """Stores the progress of every fetched window in the state. Must only
+        be called once the merged entries have been written.
+
+        Returns:
+            [AuditLog]: The last page of the open-ended window if it has been
+            exhausted in this run, to be used as the regular checkpoint.
+            Otherwise None.
+        """
+        head = None
+        for window, pages in results:
+            if not pages:
+                continue
+            last = pages[-1]
+            if last.has_next_page:
+                self._state.set(Backfill.SECTION, window, last.page_cursor["next"])
+            else:
+                self._state.set(Backfill.SECTION, window, Backfill.DONE)
+                if window.endswith("..*"):
+                    head = last
+        if not self.pending():
+            self._state.set(Backfill.SECTION, "completed", "1")
+        return head
@@ -0,0 +1,150 @@
+"""DedupIndex class
+"""
+from __future__ import absolute_import, print_function
+import os
+import json
+import time
+import logging
+
+from utilities import Utilities
+
+
+class DedupIndex:
+    """Bounded index of the _document_ids recently written to Splunk.
+
+    Document ids are grouped in buckets by the time they were written
+    (bucket_seconds wide). Whole buckets are evicted once they are older than
+    max_age seconds, or, oldest first, when the index holds more than max_ids
+    ids. Lookups are a single dict lookup, so overlapping pages can be re-read
+    and filtered entry by entry instead of guessing from counts which entries
+    are new.
+    """
+
+    def __init__(
+        self,
+        path=None,
+        max_age=86400,
+        max_ids=200000,
+        bucket_seconds=3600,
+        clock=time.time,
+    ):
+        self._path = path
+        self._max_age = float(max_age)
+        self._max_ids = int(max_ids)
+        self._bucket_seconds = int(bucket_seconds)
+        self._clock = clock
+        # bucket -> set of document ids, document id -> bucket
+        self._buckets = {}
+        self._ids = {}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, document_id):
+        return document_id in self._ids
+
+    @property
+    def path(self):
+        return self._path
+
+    def load(self):
+        """Loads the index saved on disk. A missing or unreadable file leaves
+        the index empty.
+
+        Returns:
+            DedupIndex: Returns the current DedupIndex instance
+        """
+        self._buckets = {}
+        self._ids = {}
+        if self._path is None or not os.path.exists(self._path):
+            return self
+        try:
+            with open(self._path) as index_file:
+                saved = json.load(index_file)
+        except ValueError:
+            logging.warning("DedupIndex.load(): ignoring corrupt file %s", self._path)
+            return self
+        return self.restore(saved)
+
+    def restore(self, saved):
+        """Replaces the content of the index with a dict returned by
+        to_dict(), e.g. read from another node's checkpoint
+
+        Returns:
+            DedupIndex: Returns the current DedupIndex instance
+        """
+        self._buckets = {}
+        self._ids = {}
+        for bucket, document_ids in saved.get("buckets", {}).items():
+            for document_id in document_ids:
+                self._insert(document_id, int(bucket))
+        self.evict()
+        return self
+
+    def to_dict(self):
+        """Returns the content of the index as a JSON serializable dict"""
+        return {
+            "buckets": dict(
+                (str(bucket), sorted(document_ids))
+                for bucket, document_ids in self._buckets.items()
+            )
+        }
+
+    def save(self):
+        """Saves the index on disk, after evicting the expired buckets"""
+        if self._path is None:
+            return
+        self.evict()
+        Utilities.atomic_write(
+            self._path, json.dumps(self.to_dict(), separators=(",", ":"))
+        )
+
+    def _insert(self, document_id, bucket):
+        previous = self._ids.get(document_id)
+        if previous is not None:
+            if previous >= bucket:
+                return
+            self._buckets[previous].discard(document_id)
+        self._ids[document_id] = bucket
+        self._buckets.setdefault(bucket, set()).add(document_id)
+
+    def add(self, document_id):
+        """Records a document id as written now
+
+        Args:
+            document_id ([str]): _document_id of the entry
+        """
+        self._insert(document_id, int(self._clock() // self._bucket_seconds))
+
+    def add_entries(self, entries):
+        """Records the document ids of the entries as written now
+
+        Args:
+            entries ([iterable]): AuditLogEntry instances
+
+        Returns:
+            [int]: Number of entries recorded
+        """
+        bucket = int(self._clock() // self._bucket_seconds)
+        count = 0
+        for entry in entries:
+            self._insert(entry.document_id, bucket)
+            count += 1
+        return count
+
+    def evict(self):
+        """Drops the buckets older than max_age, then the oldest buckets until
+        at most max_ids document ids are left
+
+        Returns:
+            [int]: Number of document ids evicted
+        """
+        oldest = int((self._clock() - self._max_age) // self._bucket_seconds)
+        evicted = 0
+        for bucket in sorted(self._buckets):
+            if bucket >= oldest and len(self._ids) <= self._max_ids:
+                break
+            for document_id in self._buckets.pop(bucket):
+                del self._ids[document_id]
+                evicted += 1
+        return evicted
@@ -0,0 +1,191 @@
+"""Event writers used on top of (or instead of) splunklib's EventWriter
+"""
+from __future__ import absolute_import, print_function
+import sys
+import time
+import threading
+import xml.etree.ElementTree as ET
+
+# Same escaping as ElementTree, which Event.write_to() uses
+_TEXT_ESCAPES = (("&", "&amp;"), ("<", "&lt;"), (">", "&gt;"))
+_ATTRIBUTE_ESCAPES = _TEXT_ESCAPES + (
+    ('"', "&quot;"),
+    ("\r", "&#13;"),
+    ("\n", "&#10;"),
+    ("\t", "&#09;"),
+)
+
+# Optional elements of an event, in the order Event.write_to() writes them
+_ELEMENTS = (
+    ("time", "<time>", "</time>"),
+    ("source", "<source>", "</source>"),
+    ("sourceType", "<sourcetype>", "</sourcetype>"),
+    ("index", "<index>", "</index>"),
+    ("host", "<host>", "</host>"),
+)
+
+
+def _escape(text, escapes):
+    for character, entity in escapes:
+        if character in text:
+            text = text.replace(character, entity)
+    # Non-ASCII characters are written as character references, like
+    # ElementTree does, whatever the encoding of stdout
+    return text.encode("ascii", "xmlcharrefreplace").decode("ascii")
+
+
+def escape_text(text):
+    """Escapes the text of an XML element"""
+    return _escape(text, _TEXT_ESCAPES)
+
+
+def escape_attribute(text):
+    """Escapes the value of an XML attribute"""
+    return _escape(text, _ATTRIBUTE_ESCAPES)
+
+
+class SynchronizedEventWriter:
+    """Serializes the calls made to an EventWriter by several threads, so the
+    XML of the events written by concurrent inputs is never interleaved on
+    stdout.
+    """
+
+    def __init__(self, event_writer):
+        self._event_writer = event_writer
+        self._lock = threading.Lock()
+
+    def write_event(self, event):
+        with self._lock:
+            self._event_writer.write_event(event)
+
+    def flush(self):
+        with self._lock:
+            # splunklib's EventWriter flushes after every event
+            if hasattr(self._event_writer, "flush"):
+                self._event_writer.flush()
+
+    def log(self, severity, message):
+        with self._lock:
+            self._event_writer.log(severity, message)
+
+    def close(self):
+        with self._lock:
+            self._event_writer.close()
+
+
+class BufferedEventWriter:
+    """Drop-in replacement of splunklib's EventWriter for high event rates.
+
+    EventWriter builds an ElementTree per event, serializes it and flushes
+    stdout after every event. This writer renders the same XML with string
+    templates, buffers it and only writes and flushes stdout once max_bytes
+    are buffered, once max_delay seconds have passed since the last flush,
+    or when flush() is called, e.g. before a checkpoint is committed.
+    """
+
+    DEBUG = "DEBUG"
+    INFO = "INFO"
+    WARN = "WARN"
+    ERROR = "ERROR"
+    FATAL = "FATAL"
+
+    def __init__(
+        self,
+        output=sys.stdout,
+        error=sys.stderr,
+        max_bytes=256 * 1024,
+        max_delay=1.0,
+        clock=time.time,
+    ):
+        self._out = output
+        self._err = error
+        self._max_bytes = int(max_bytes)
+        self._max_delay = float(max_delay)
+        self._clock = clock
+        self._buffer = []
+        self._buffered = 0
+        self._last_flush = clock()
+        # Opening tags by (stanza, unbroken)
+        self._openings = {}
+        self.header_written = False
+
+    @property
+    def buffered(self):
+        """Number of characters written but not flushed yet"""
+        return self._buffered
+
+    def _opening(self, stanza, unbroken):
+        key = (stanza, unbroken)
+        opening = self._openings.get(key)
+        if opening is None:
+            if stanza is None:
+                opening = '<event unbroken="{}">'.format(int(unbroken))
+            else:
+                opening = '<event stanza="{}" unbroken="{}">'.format(
+                    escape_attribute(stanza), int(unbroken)
+                )
+            self._openings[key] = opening
+        return opening
+
+    def render(self, event):
+        """Returns the XML of an event, as Event.write_to() writes it
+
+        Raises:
+            ValueError: The event has no data
+        """
+        if event.data is None:
+            raise ValueError(
+                "Events must have at least the data field set to be written to XML."
+            )
+        parts = [self._opening(event.stanza, event.unbroken)]
+        for attribute, opening, closing in _ELEMENTS:
+            value = getattr(event, attribute)
+            if value is not None:
+                parts.append(opening)
+                parts.append(escape_text(str(value)))
+                parts.append(closing)
+        if event.data:
+            parts.append("<data>")
+            parts.append(escape_text(event.data))
+            parts.append("</data>")
+        else:
+            parts.append("<data />")
+        parts.append("<done /></event>" if event.done else "</event>")
+        return "".join(parts)
+
+    def write_event(self, event):
+        """Buffers an event, writing the buffer out if it is full or old"""
+        if not self.header_written:
+            self._buffer.append("<stream>")
+            self.header_written = True
+        xml = self.render(event)
+        self._buffer.append(xml)
+        self._buffered += len(xml)
+        if (
+            self._buffered >= self._max_bytes
+            or self._clock() - self._last_flush >= self._max_delay
+        ):
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered events and flushes the output"""
+        if self._buffer:
+            self._out.write("".join(self._buffer))
+            self._buffer = []
+            self._buffered = 0
+        self._out.flush()
+        self._last_flush = self._clock()
+
+    def log(self, severity, message):
+        self._err.write("%s %s\n" % (severity, message))
+        self._err.flush()
+
+    def write_xml_document(self, document):
+        self.flush()
+        self._out.write(ET.tostring(document).decode("utf-8"))
+        self._out.flush()
+
+    def close(self):
+        """Writes the buffered events and the closing </stream> tag"""
+        self._buffer.append("</stream>")
+        self.flush()
@@ -4,8 +4,12 @@
 from __future__ import absolute_import, print_function
 import os
 import sys
+import errno
+import signal
 import time
 import logging
+import operator
+import threading
 import hashlib
 import warnings
 import requests
@@ -15,10 +19,38 @@ from io import open
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lib"))
 # pylint: disable=E0401
 # pylint: disable=C0413
-from splunklib.modularinput import Script, Scheme, Argument, Event
+from splunklib.modularinput import Script, Scheme, Argument, Event, EventWriter
 import splunklib.client as client
 from utilities import Utilities
+from audit_log import AuditLog
 from rest_client import GitHub
+from pipeline import Prefetcher, WorkerPool, run_in_pool
+from backfill import Backfill
+from rate_limit import RateLimitScheduler, RateLimitExceeded
+from event_writers import SynchronizedEventWriter, BufferedEventWriter
+from hec import HECEventWriter
+from scheduler import Scheduler
+from dedup_index import DedupIndex
+from spool import Spool
+from projection import Projection
+from state_store import StateStore
+from kvstore_state import KVStoreBatcher, KVStoreStateStore
+from rollup import Rollup
+from page_batch import PageBatch
+
+# Sourcetype of the events written in the json and raw output modes, defined
+# in default/props.conf
+JSON_SOURCETYPE = "ghe_audit_log_monitoring:json"
+# Sourcetype of the datapoints of the git events rolled up, see the rollup
+# option. props.conf turns them into metrics.
+ROLLUP_SOURCETYPE = "ghe_audit_log_monitoring:git_metrics"
+# KV Store collection of the checkpoints with checkpoint_backend = kvstore,
+# see default/collections.conf
+KVSTORE_COLLECTION = "ghe_audit_log_monitoring_checkpoints"
+# Name of the app, i.e. of the directory it is installed in under etc/apps
+APP_NAME = os.path.basename(
+    os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+)
 
 
 class MyScript(Script):
@@ -43,36 +75,218 @@ class MyScript(Script):
         # Configure  the logger
         self.logger = logging.getLogger()
         self.logging_handler = None
+        # Connections reused across the inputs handled by this process.
+        # Worker instances share these with the instance that spawned them.
+        self._splunk_service = None
+        self._kvstore_batcher = None
+        self._http_sessions = {}
+        self._shared_lock = threading.Lock()
+        # Plain text PATs by credential_id, kept between polls in daemon mode
+        self._credentials = {}
+        # Set to end daemon mode
+        self._stop = threading.Event()
+        # Dedup indexes by enterprise, kept between polls in daemon mode
+        self._dedup_indexes = {}
+        # Projections by profile name, compiled once per process
+        self._projections = {}
+        # Rollups by input name
+        self._rollups = {}
+
+    def app_file_path(self, *parts):
+        """Returns the path of a file relative to the app's root directory"""
+        return os.path.join(os.path.dirname(__file__), "..", *parts)
+
+    def load_settings(self):
+        """Loads the [settings] stanza of ghe_audit_log_monitoring.conf,
+        local/ values taking precedence over default/ ones.
+
+        Returns:
+            dict: use_single_instance (bool), worker_threads (int), daemon (bool),
+            poll_interval (float), buffered_writer (bool), write_buffer_kb (int),
+            write_flush_seconds (float), output (str), the hec_* settings,
+            checkpoint_backend (str) and kvstore_flush_seconds (float)
+        """
+        config = configparser.ConfigParser()
+        config.read(
+            [
+                self.app_file_path("default", "ghe_audit_log_monitoring.conf"),
+                self.app_file_path("local", "ghe_audit_log_monitoring.conf"),
+            ]
+        )
+        settings = dict(config.items("settings")) if config.has_section("settings") else {}
+        return {
+            "use_single_instance": bool(
+                Utilities.to_int(settings.get("use_single_instance"), 0)
+            ),
+            "worker_threads": max(1, Utilities.to_int(settings.get("worker_threads"), 4)),
+            "daemon": bool(Utilities.to_int(settings.get("daemon"), 0)),
+            "poll_interval": max(
+                1.0, Utilities.to_float(settings.get("poll_interval"), 60.0)
+            ),
+            "buffered_writer": bool(
+                Utilities.to_int(settings.get("buffered_writer"), 0)
+            ),
+            "write_buffer_kb": max(
+                1, Utilities.to_int(settings.get("write_buffer_kb"), 256)
+            ),
+            "write_flush_seconds": max(
+                0.0, Utilities.to_float(settings.get("write_flush_seconds"), 1.0)
+            ),
+            "output": (settings.get("output") or "stdout").strip().lower(),
+            "hec_url": settings.get("hec_url") or "https://127.0.0.1:8088",
+            "hec_credential": (settings.get("hec_credential") or "").strip(),
+            "hec_batch_size": max(1, Utilities.to_int(settings.get("hec_batch_size"), 100)),
+            "hec_max_in_flight": max(
+                1, Utilities.to_int(settings.get("hec_max_in_flight"), 4)
+            ),
+            "hec_ack": bool(Utilities.to_int(settings.get("hec_ack"), 0)),
+            "hec_ack_timeout": Utilities.to_float(settings.get("hec_ack_timeout"), 60.0),
+            "hec_verify_ssl": bool(Utilities.to_int(settings.get("hec_verify_ssl"), 1)),
+            "checkpoint_backend": (settings.get("checkpoint_backend") or "file")
+            .strip()
+            .lower(),
+            "kvstore_flush_seconds": max(
+                0.0, Utilities.to_float(settings.get("kvstore_flush_seconds"), 30.0)
+            ),
+        }
+
+    def run(self, args):
+        """Runs the modular input with the event writer selected in the
+        settings: the HECEventWriter when output is hec, otherwise splunklib's
+        EventWriter, or the BufferedEventWriter when buffered_writer is enabled.
+        The HEC token is read from splunkd's password storage once the session
+        key is known, see stream_events().
+        """
+        settings = self.load_settings()
+        if settings["output"] == "hec":
+            event_writer = HECEventWriter(
+                settings["hec_url"],
+                batch_size=settings["hec_batch_size"],
+                max_in_flight=settings["hec_max_in_flight"],
+                use_ack=settings["hec_ack"],
+                ack_timeout=settings["hec_ack_timeout"],
+                verify=settings["hec_verify_ssl"],
+            )
+        elif settings["buffered_writer"]:
+            event_writer = BufferedEventWriter(
+                max_bytes=settings["write_buffer_kb"] * 1024,
+                max_delay=settings["write_flush_seconds"],
+            )
+        else:
+            event_writer = EventWriter()
+        return self.run_script(args, event_writer, sys.stdin)
+
+    def splunk_service(self):
+        """Returns a splunkd connection authenticated with the session key,
+        created once and shared by every input handled by this process"""
+        with self._shared_lock:
+            if self._splunk_service is None:
+                args = {"token": self.session_key}
+                self._splunk_service = client.connect(**args)
+            return self._splunk_service
+
+    def kvstore_batcher(self):
+        """Returns the KVStoreBatcher of the checkpoints collection, created
+        once and shared by every input handled by this process. It has its own
+        connection, in the app's namespace."""
+        flush_seconds = self.load_settings()["kvstore_flush_seconds"]
+        with self._shared_lock:
+            if self._kvstore_batcher is None:
+                self._kvstore_batcher = KVStoreBatcher.connect(
+                    client.connect,
+                    self.session_key,
+                    APP_NAME,
+                    KVSTORE_COLLECTION,
+                    flush_seconds=flush_seconds,
+                )
+            return self._kvstore_batcher
+
+    def http_session(self, hostname, pool_size=None):
+        """Returns the keep-alive requests Session used for a GitHub host.
+        Inputs polling the same host share the session and its connection pool.
+        """
+        with self._shared_lock:
+            if hostname not in self._http_sessions:
+                self._http_sessions[hostname] = GitHub.create_session(
+                    pool_size or 10
+                )
+            return self._http_sessions[hostname]
+
+    def close_http_sessions(self):
+        """Closes the shared requests Sessions"""
+        with self._shared_lock:
+            for session in self._http_sessions.values():
+                session.close()
+            self._http_sessions.clear()
+
+    def spawn_worker(self):
+        """Creates an instance that handles one input on a worker thread while
+        sharing the splunkd connection, HTTP sessions and logger of this one
+        """
+        worker = MyScript()
+        worker.session_key = self.session_key
+        worker._input_definition = self._input_definition
+        worker.logging_handler = self.logging_handler
+        worker.splunk_service = self.splunk_service
+        worker.kvstore_batcher = self.kvstore_batcher
+        worker.http_session = self.http_session
+        worker._credentials = self._credentials
+        worker._stop = self._stop
+        worker._projections = self._projections
+        return worker
+
+    def state_file_path(self, file_name):
+        """Returns the path of a file in the app's state directory"""
+        return self.app_file_path("state/", file_name)
 
     def load_state(self, enterprise):
-        """Loads and parses the file that contains the script's state
+        """Loads the StateStore that contains the script's state
         The enterprise is used to create distinct state files as the module
         can be configured for multiple orgs.
         This is necessary to avoid race conditions when reading/writing
         state in the case of a multi-org configuration.
+        The state file of earlier versions, <enterprise>_state.conf, is
+        imported the first time. With checkpoint_backend = kvstore, the
+        state is mirrored to the KV Store, and taken from it when another
+        node committed a later page.
         """
-        file_name = "{}_state.conf".format(enterprise)
-        config_path = os.path.join(os.path.dirname(__file__), "..", "state/", file_name)
-        # If file doesn't exist -> create it
-        if not os.path.exists(config_path):
-            with open(config_path, "w") as inputs_file:
-                inputs_file.write(Utilities.empty_state_file())
-        # Read the configuration
-        config = configparser.ConfigParser()
-        config.read(config_path)
-        return config
+        path = self.state_file_path("{}_state".format(enterprise))
+        state = None
+        if self.load_settings()["checkpoint_backend"] == "kvstore":
+            try:
+                state = KVStoreStateStore(path, self.kvstore_batcher(), key=enterprise)
+            # pylint: disable=W0703
+            except Exception as error:
+                # The local state is the same with both backends
+                logging.warning(
+                    "load_state(): KV Store unavailable, using the local state: {}".format(
+                        error
+                    )
+                )
+        if state is None:
+            state = StateStore(path)
+        if not state.exists:
+            config = configparser.ConfigParser()
+            config_path = self.state_file_path("{}_state.conf".format(enterprise))
+            if os.path.exists(config_path):
+                config.read(config_path)
+                logging.info(
+                    "load_state(): Importing {} into the state store".format(config_path)
+                )
+            else:
+                config.read_string(Utilities.empty_state_file())
+            state.migrate(config)
+        return state.load()
 
-    def save_state(self, config, enterprise):
-        """Saves the provided configuration in the script's state file
+    def save_state(self, state, enterprise):
+        """Saves the provided StateStore: the changes since the last save
+        are appended to its journal
         The enterprise is used to create distinct state files as the module
         can be configured for multiple orgs.
         This is necessary to avoid race conditions when reading/writing
         state in the case of a multi-org configuration.
         """
-        file_name = "{}_state.conf".format(enterprise)
-        config_path = os.path.join(os.path.dirname(__file__), "..", "state/", file_name)
-        with open(config_path, "w") as inputs_file:
-            return config.write(inputs_file)
+        state.save()
 
     def enable_logger(self):
         """Adds a handler for the logger to enable writing logs to stderr"""
@@ -110,7 +324,7 @@ class MyScript(Script):
         scheme = Scheme("GitHub Enterprise Audit Log Monitoring")
         scheme.description = "GitHub Enterprise Audit Log Monitoring."
         scheme.use_external_validation = True
-        scheme.use_single_instance = False
+        scheme.use_single_instance = self.load_settings()["use_single_instance"]
         scheme.add_argument(
             Argument(
                 name="hostname",
@@ -198,6 +412,265 @@ class MyScript(Script):
                 required_on_edit=False,
             )
         )
+        scheme.add_argument(
+            Argument(
+                name="pool_size",
+                title="HTTP Connection Pool Size",
+                description="Number of keep-alive connections kept open to "
+                "the GitHub API. Defaults to 10.",
+                data_type=Argument.data_type_number,
+                required_on_create=False,
+                required_on_edit=False,
+            )
+        )
+        scheme.add_argument(
+            Argument(
+                name="connect_timeout",
+                title="Connect Timeout",
+                description="Seconds to wait for a connection to the GitHub "
+                "API. Defaults to 10.",
+                data_type=Argument.data_type_number,
+                required_on_create=False,
+                required_on_edit=False,
+            )
+        )
+        scheme.add_argument(
+            Argument(
+                name="read_timeout",
+                title="Read Timeout",
+                description="Seconds to wait for the GitHub API to send a "
+                "response. Defaults to 60.",
+                data_type=Argument.data_type_number,
+                required_on_create=False,
+                required_on_edit=False,
+            )
+        )
+        scheme.add_argument(
+            Argument(
+                name="streaming",
+                title="Streaming Mode",
+                description="If enabled, the next page is fetched on a "
+                "background thread while the current page is being written.",
+                data_type=Argument.data_type_boolean,
+                required_on_create=False,
+                required_on_edit=False,
+            )
+        )
+        scheme.add_argument(
+            Argument(
+                name="prefetch_pages",
+                title="Prefetch Pages",
+                description="Streaming mode only. Maximum number of pages "
+                "fetched ahead of the writer. Defaults to 2.",
+                data_type=Argument.data_type_number,
+                required_on_create=False,
+                required_on_edit=False,
+            )
+        )
+        scheme.add_argument(
+            Argument(
+                name="backfill_start",
+                title="Backfill Start Date",
+                description="Optional. Date (YYYY-MM-DD) from which to backfill "
+                "the audit log in parallel time windows before switching to "
+                "regular polling.",
+                data_type=Argument.data_type_string,
+                required_on_create=False,
+                required_on_edit=False,
+            )
+        )
+        scheme.add_argument(
+            Argument(
+                name="backfill_window_days",
+                title="Backfill Window Days",
+                description="Number of days covered by each backfill window. "
+                "Defaults to 7.",
+                data_type=Argument.data_type_number,
+                required_on_create=False,
+                required_on_edit=False,
+            )
+        )
+        scheme.add_argument(
+            Argument(
+                name="backfill_workers",
+                title="Backfill Workers",
+                description="Number of backfill windows fetched concurrently. "
+                "Defaults to 4.",
+                data_type=Argument.data_type_number,
+                required_on_create=False,
+                required_on_edit=False,
+            )
+        )
+        scheme.add_argument(
+            Argument(
+                name="rate_limit_max_wait",
+                title="Rate Limit Maximum Wait",
+                description="Maximum number of seconds to wait for the API "
+                "rate limit to reset before checkpointing and ending the "
+                "run. Defaults to 60.",
+                data_type=Argument.data_type_number,
+                required_on_create=False,
+                required_on_edit=False,
+            )
+        )
+        scheme.add_argument(
+            Argument(
+                name="rate_limit_reserve",
+                title="Rate Limit Reserve",
+                description="Number of API calls of the hourly budget left "
+                "untouched for other tools using the same token. Defaults to 0.",
+                data_type=Argument.data_type_number,
+                required_on_create=False,
+                required_on_edit=False,
+            )
+        )
+        scheme.add_argument(
+            Argument(
+                name="max_retries",
+                title="Maximum Retries",
+                description="Number of times a page is retried, with an "
+                "exponential backoff, after a network error, a 5xx or a "
+                "secondary rate limit response. Defaults to 5.",
+                data_type=Argument.data_type_number,
+                required_on_create=False,
+                required_on_edit=False,
+            )
+        )
+        scheme.add_argument(
+            Argument(
+                name="dedup_retention_hours",
+                title="Deduplication Retention Hours",
+                description="Number of hours the document ids written to "
+                "Splunk are remembered to skip entries fetched twice. "
+                "Defaults to 24.",
+                data_type=Argument.data_type_number,
+                required_on_create=False,
+                required_on_edit=False,
+            )
+        )
+        scheme.add_argument(
+            Argument(
+                name="max_buffer_mb",
+                title="Maximum Buffer Size (MB)",
+                description="Budget, in MB of API responses, for the audit "
+                "log pages held in memory at once: the pages fetched ahead in "
+                "streaming mode, the pages of the backfill windows. "
+                "Defaults to 64.",
+                data_type=Argument.data_type_number,
+                required_on_create=False,
+                required_on_edit=False,
+            )
+        )
+        scheme.add_argument(
+            Argument(
+                name="stream_json",
+                title="Incremental JSON Decoding",
+                description="Decode the audit log entries as the response "
+                "is read off the socket instead of loading the whole page "
+                "first. Keeps memory flat for pages with large entries. "
+                "Defaults to 1.",
+                data_type=Argument.data_type_boolean,
+                required_on_create=False,
+                required_on_edit=False,
+            )
+        )
+        scheme.add_argument(
+            Argument(
+                name="output_mode",
+                title="Output Mode",
+                description="Format of the events: kv writes key=value "
+                "pairs, json writes compact JSON, raw writes the JSON of each "
+                "entry as received from the API, without decoding and "
+                "re-serializing it. accepted values: [kv | json | raw]. "
+                "Defaults to kv.",
+                data_type=Argument.data_type_string,
+                required_on_create=False,
+                required_on_edit=False,
+            )
+        )
+        scheme.add_argument(
+            Argument(
+                name="projection",
+                title="Projection",
+                description="Name of the projection profile, a "
+                "[projection:<name>] stanza of ghe_audit_log_monitoring.conf, "
+                "selecting the fields of the entries written to Splunk. "
+                "Defaults to none: every field is written.",
+                required_on_create=False,
+                required_on_edit=False,
+            )
+        )
+        scheme.add_argument(
+            Argument(
+                name="spool",
+                title="Spool",
+                description="Append the pages fetched to an on-disk spool "
+                "before writing them, so pages fetched but not written are "
+                "written from disk by the next run instead of being fetched "
+                "again. Defaults to 0.",
+                data_type=Argument.data_type_boolean,
+                required_on_create=False,
+                required_on_edit=False,
+            )
+        )
+        scheme.add_argument(
+            Argument(
+                name="event_time",
+                title="Event Time",
+                description="Set the time of each event from its @timestamp "
+                "or created_at field, so Splunk doesn't extract it from the "
+                "text. Defaults to 1.",
+                data_type=Argument.data_type_boolean,
+                required_on_create=False,
+                required_on_edit=False,
+            )
+        )
+        scheme.add_argument(
+            Argument(
+                name="rollup",
+                title="Git Rollup",
+                description="Write the git.* events as counts per time bucket "
+                "by action, repo, actor and transport protocol instead of one "
+                "event per entry. Defaults to 0.",
+                data_type=Argument.data_type_boolean,
+                required_on_create=False,
+                required_on_edit=False,
+            )
+        )
+        scheme.add_argument(
+            Argument(
+                name="rollup_bucket_seconds",
+                title="Rollup Bucket Seconds",
+                description="Length in seconds of the time buckets of the git "
+                "rollup. Defaults to 60.",
+                data_type=Argument.data_type_number,
+                required_on_create=False,
+                required_on_edit=False,
+            )
+        )
+        scheme.add_argument(
+            Argument(
+                name="rollup_sample_ratio",
+                title="Rollup Sample Ratio",
+                description="Ratio, between 0 and 1, of the git events rolled "
+                "up that are also written as events. Defaults to 0.",
+                data_type=Argument.data_type_number,
+                required_on_create=False,
+                required_on_edit=False,
+            )
+        )
+        scheme.add_argument(
+            Argument(
+                name="rollup_index",
+                title="Rollup Index",
+                description="Metrics index the git rollup is written to. "
+                "Should be set when rollup is enabled: by default the "
+                "datapoints go to the index of the input, which only turns "
+                "them into metrics if it is a metrics index.",
+                required_on_create=False,
+                required_on_edit=False,
+            )
+        )
         return scheme
 
     # pylint: disable=W0613
@@ -212,8 +685,7 @@ class MyScript(Script):
         credential id in Splunk's storage
         """
         #if new_personal_access_token.startswith('ghe_'):
-        args = {"token": self.session_key}
-        service = client.connect(**args)
+        service = self.splunk_service()
         # Debug
         #logging.debug(
         #    "%s ::: encrypt_personal_access_token() personal_access_token: %s",
@@ -240,10 +712,29 @@ class MyScript(Script):
         #    cred.content,
         #)
 
+    def get_hec_token(self, credential_name):
+        """Returns the plain text HTTP Event Collector token stored in
+        Splunk's password storage under credential_name, the hec_credential
+        setting. Unlike the personal access tokens, the HEC token is never
+        written to a configuration file: it is stored by the administrator,
+        see the README.
+
+        Raises:
+            RuntimeError: No credential is stored under that name
+        """
+        service = self.splunk_service()
+        for storage_credential in service.storage_passwords:
+            if storage_credential.username == credential_name:
+                return storage_credential.content.clear_password
+        raise RuntimeError(
+            "No HTTP Event Collector token was found for the credential "
+            "'{}'. Fix: store the token under the hec_credential name or "
+            "check the app's permissions.".format(credential_name)
+        )
+
     def mask_personal_access_token(self, credential_id):
         """Replaces the personal access token with the credential_id"""
-        args = {"token": self.session_key}
-        service = client.connect(**args)
+        service = self.splunk_service()
         kind, input_name = self.input_name.split("://")
         item = service.inputs.__getitem__((input_name, kind))
         kwargs = {"personal_access_token": credential_id}
@@ -289,12 +780,13 @@ class MyScript(Script):
         #    "%s ::: get_personal_access_token() input_credential_id: %s", self.input_name, input_credential_id
         #)
         if credential_id == input_credential_id:
+            if credential_id in self._credentials:
+                return self._credentials[credential_id]
             logging.debug("%s ::: get_personal_access_token() trying to fetch " "plaintext PAT", self.input_name)
             # credential_id matches the one on file. Meaning no new PAT
             # was provided.
             # We fetch the PAT on record
-            args = {"token": self.session_key}
-            service = client.connect(**args)
+            service = self.splunk_service()
             for storage_credential in service.storage_passwords:
                 if storage_credential.username == input_credential_id:
                     # Debug
@@ -303,6 +795,9 @@ class MyScript(Script):
                     #    self.input_name,
                     #    storage_credential.content.clear_password,
                     #)
+                    self._credentials[
+                        credential_id
+                    ] = storage_credential.content.clear_password
                     return storage_credential.content.clear_password
             # If we loop through all the credentials and we don't find our
             # PAT - something is wrong.
@@ -319,24 +814,709 @@ class MyScript(Script):
         ).hexdigest()
         self.encrypt_personal_access_token(new_credential_id, new_personal_access_token)
         self.mask_personal_access_token(new_credential_id)
+        # The input now holds the credential_id, which is what later polls
+        # of a long running process must compare with the state file
+        self.input_items["personal_access_token"] = new_credential_id
+        self._credentials[new_credential_id] = new_personal_access_token
         return new_personal_access_token
 
+    def write_audit_log(self, audit_log, event_writer):
+        """Writes every entry of the AuditLog as an event in Splunk
+
+        Returns:
+            [int]: Number of events written
+        """
+        count = 0
+        output_mode = self.output_mode()
+        if self.raw_entries():
+            serialize = operator.attrgetter("raw")
+        elif output_mode != "kv":
+            # Projected entries are written as compact JSON in raw mode
+            serialize = Utilities.json_serialize
+        else:
+            serialize = Utilities.splunk_serialize
+        projection = self.load_projection()
+        if projection is not None:
+            write_fields, project = serialize, projection.project
+
+            def serialize(entry):
+                return write_fields(project(entry))
+
+        # JSON events get the sourcetype extracting their fields, unless the
+        # input sets its own
+        sourcetype = None
+        if output_mode != "kv" and not self.input_items.get("sourcetype"):
+            sourcetype = JSON_SOURCETYPE
+        entries = list(audit_log)
+        rollup = self.load_rollup()
+        if rollup is not None:
+            batch = (
+                audit_log.batch
+                if isinstance(audit_log, AuditLog)
+                else PageBatch.from_entries(entries)
+            )
+            entries, datapoints = rollup.split(batch)
+            count += self.write_datapoints(datapoints, event_writer)
+        # Converted for the whole page at once, so the indexers don't have to
+        # look for a timestamp in the text of every event
+        if Utilities.to_int(self.input_items.get("event_time"), 1):
+            times = Utilities.event_times(entries)
+        else:
+            times = [None] * len(entries)
+        for entry, event_time in zip(entries, times):
+            # Prepare the event
+            event = Event()
+            event.stanza = self.input_name
+            event.time = event_time
+            event.sourceType = sourcetype
+            event.data = serialize(entry)
+            event_writer.write_event(event)
+            count += 1
+        return count
+
+    def write_datapoints(self, datapoints, event_writer):
+        """Writes the Datapoints of a Rollup as events of the rollup sourcetype,
+        in the rollup_index if set
+
+        Returns:
+            [int]: Number of events written
+        """
+        index = self.input_items.get("rollup_index") or None
+        for datapoint in datapoints:
+            event = Event()
+            event.stanza = self.input_name
+            event.time = str(datapoint.time)
+            event.index = index
+            event.sourceType = ROLLUP_SOURCETYPE
+            event.data = Rollup.serialize(datapoint)
+            event_writer.write_event(event)
+        return len(datapoints)
+
+    def update_checkpoint(self, audit_log):
+        """Sets the page_cursor, last_document_id, last_count and etag of the
+        (last page of the) AuditLog in the state. The state still needs to be
+        saved by the caller.
+        """
+        # Update and save page_cursor value if it exists
+        if audit_log.page_cursor["next"] is not None:
+            self.state.set("input", "page_cursor", audit_log.page_cursor["next"])
+            logging.debug(
+                "{} ::: update_checkpoint(): Updating page_cursor: {}".format(
+                    self.input_name,
+                    audit_log.page_cursor["next"]
+                )
+            )
+        else:
+            self.state.set(
+                "input",
+                "page_cursor",
+                audit_log.page_cursor["last"]
+                if audit_log.page_cursor["last"] is not None
+                else "",
+            )
+            logging.debug(
+                "{} ::: update_checkpoint(): Updating page_cursor: {}".format(
+                    self.input_name,
+                    audit_log.page_cursor["last"]
+                )
+            )
+        # Update the last document_id and count fetched
+        logging.debug(
+            "{} ::: update_checkpoint(): Updating last_page: {} - {}".format(
+                self.input_name,
+                audit_log.last_page["_document_id"],
+                str(audit_log.last_page["count"]),
+            )
+        )
+        self.state.set(
+            "input", "last_document_id", audit_log.last_page["_document_id"]
+        )
+        self.state.set("input", "last_count", str(audit_log.last_page["count"]))
+        # The next run starts from this page only if it was the last one:
+        # its ETag then lets the API answer 304 when nothing changed. Not if
+        # the page is full though: newer entries go to the next page, the
+        # body of this one, and its ETag, stay the same and the API would
+        # answer 304 forever
+        self.state.set(
+            "input",
+            "etag",
+            audit_log.etag
+            if audit_log.page_cursor["next"] is None
+            and audit_log.etag
+            and audit_log.last_page["count"] < GitHub.PER_PAGE
+            else "",
+        )
+
+    def flush_events(self, event_writer):
+        """Makes sure the events written so far have left the process.
+        splunklib's EventWriter has no flush(): it flushes after every event.
+        """
+        if hasattr(event_writer, "flush"):
+            event_writer.flush()
+
+    @staticmethod
+    def props_stanza(sourcetype=None):
+        """Returns the props.conf stanza for the events of this modular input.
+        Events carry their time, so the indexers can skip timestamp
+        extraction altogether.
+
+        Args:
+            sourcetype ([str], optional): Sourcetype of the inputs. Defaults to
+                None, the stanza then matches the source of every input.
+
+        Returns:
+            [str]: props.conf stanza
+        """
+        return """[{}]
+# Event.time is set from @timestamp / created_at, see the event_time option
+DATETIME_CONFIG = NONE
+SHOULD_LINEMERGE = false
+""".format(
+            sourcetype or "source::ghe_audit_log_monitoring://*"
+        )
+
+    def output_mode(self):
+        """Format of the events: kv for key=value pairs (the default), json
+        for compact JSON, raw for the JSON of the entries exactly as received
+        from the API"""
+        mode = (self.input_items.get("output_mode") or "kv").strip().lower()
+        return mode if mode in ("kv", "json", "raw") else "kv"
+
+    def max_buffer_bytes(self):
+        """Byte budget of the audit log pages held in memory at once"""
+        return int(
+            Utilities.to_float(self.input_items.get("max_buffer_mb"), 64) * 1024 * 1024
+        )
+
+    def load_dedup_index(self):
+        """Returns the dedup index of the current enterprise. It is read from
+        state/<enterprise>_dedup.json once, then kept in memory."""
+        if self.enterprise not in self._dedup_indexes:
+            dedup_index = DedupIndex(
+                path=self.state_file_path("{}_dedup.json".format(self.enterprise)),
+                max_age=Utilities.to_float(
+                    self.input_items.get("dedup_retention_hours"), 24
+                )
+                * 3600,
+            ).load()
+            if isinstance(self.state, KVStoreStateStore) and self.state.restored:
+                # Failed over: the local index is as stale as the local state
+                saved = self.kvstore_batcher().fetch(
+                    "{}:dedup".format(self.enterprise)
+                )
+                if saved is not None:
+                    dedup_index.restore(saved["dedup"])
+            self._dedup_indexes[self.enterprise] = dedup_index
+        return self._dedup_indexes[self.enterprise]
+
+    def save_dedup_index(self, dedup_index):
+        """Saves the dedup index, and mirrors it to the KV Store with the
+        KV Store checkpoint backend"""
+        dedup_index.save()
+        if isinstance(self.state, KVStoreStateStore):
+            self.kvstore_batcher().stage(
+                {
+                    "_key": "{}:dedup".format(self.enterprise),
+                    "updated": time.time(),
+                    "dedup": dedup_index.to_dict(),
+                }
+            )
+
+    def load_projection(self):
+        """Returns the Projection of the profile named by the projection
+        option, read from the [projection:<name>] stanza of
+        ghe_audit_log_monitoring.conf once, None if the option is not set.
+
+        Raises:
+            ValueError: The profile does not exist
+        """
+        name = (self.input_items.get("projection") or "").strip()
+        if not name:
+            return None
+        if name not in self._projections:
+            config = configparser.ConfigParser()
+            config.read(
+                [
+                    self.app_file_path("default", "ghe_audit_log_monitoring.conf"),
+                    self.app_file_path("local", "ghe_audit_log_monitoring.conf"),
+                ]
+            )
+            section = "projection:{}".format(name)
+            if not config.has_section(section):
+                raise ValueError("Unknown projection profile: {}".format(name))
+            self._projections[name] = Projection.from_settings(
+                dict(config.items(section))
+            )
+        return self._projections[name]
+
+    def load_rollup(self):
+        """Returns the Rollup of the current input, None unless the rollup
+        option is enabled"""
+        if not Utilities.to_int(self.input_items.get("rollup"), 0):
+            return None
+        if self.input_name not in self._rollups:
+            if not self.input_items.get("rollup_index"):
+                logging.warning(
+                    "{} ::: load_rollup(): rollup_index is not set, the git "
+                    "rollup datapoints go to the index of the input".format(
+                        self.input_name
+                    )
+                )
+            self._rollups[self.input_name] = Rollup(
+                bucket_seconds=Utilities.to_int(
+                    self.input_items.get("rollup_bucket_seconds"), 60
+                ),
+                sample_ratio=Utilities.to_float(
+                    self.input_items.get("rollup_sample_ratio"), 0.0
+                ),
+            )
+        return self._rollups[self.input_name]
+
+    def raw_entries(self):
+        """Whether the entries are kept as the JSON text received, i.e. in
+        raw output mode, unless a projection or a rollup needs every field"""
+        return (
+            self.output_mode() == "raw"
+            and not self.input_items.get("projection")
+            and not Utilities.to_int(self.input_items.get("rollup"), 0)
+        )
+
+    def open_spool(self):
+        """Returns the spool of the current enterprise, in
+        state/spool/<enterprise>/, None unless the spool option is enabled"""
+        if not Utilities.to_int(self.input_items.get("spool"), 0):
+            return None
+        return Spool(self.state_file_path(os.path.join("spool", self.enterprise)))
+
+    def spool_position(self):
+        """Returns the spool position of the last page written to Splunk, None
+        if no spooled page was ever written"""
+        if not self.state.has_section("spool"):
+            return None
+        return (
+            Utilities.to_int(self.state.get("spool", "segment"), 0),
+            Utilities.to_int(self.state.get("spool", "offset"), 0),
+        )
+
+    def drain_spool(self, spool, event_writer, dedup_index=None):
+        """Writes the pages spooled after the last checkpointed position to
+        Splunk. The position of each page is committed to the state file
+        once its events are written and flushed.
+
+        Returns:
+            [int]: Number of events written
+        """
+        total = 0
+        position = None
+        raw = self.raw_entries()
+        for payload, position in spool.read(self.spool_position()):
+            page = AuditLog(type=self.type, enterprise=self.enterprise).loads(
+                payload.decode("utf-8"), raw=raw
+            )
+            # A page is spooled twice if the process died before its fetch
+            # checkpoint was saved
+            page.deduplicate(dedup_index)
+            total += self.write_audit_log(page, event_writer)
+            self.flush_events(event_writer)
+            if dedup_index is not None:
+                dedup_index.add_entries(page)
+            if not self.state.has_section("spool"):
+                self.state.add_section("spool")
+            self.state.set("spool", "segment", str(position[0]))
+            self.state.set("spool", "offset", str(position[1]))
+            self.save_state(self.state, self.enterprise)
+        if position is not None:
+            spool.release(position)
+        return total
+
+    def stream_audit_log(
+        self,
+        github,
+        page_cursor,
+        last_document_id,
+        etag,
+        event_writer,
+        dedup_index=None,
+        phrase=None,
+    ):
+        """Fetches the audit log page by page. The entries of each page are
+        written to Splunk and flushed, then the checkpoint (page_cursor,
+        last_document_id, last_count and etag) is committed to the state
+        file before moving on, so a crash costs at most one page of
+        duplicates and refetching.
+
+        Entries found in the dedup index have already been written and are
+        skipped. Pages are checked against the index on this thread, right
+        before they are written, after the entries of the previous page were
+        added to it. The document ids written are added to the index, which
+        is saved at the end of the run.
+
+        In streaming mode, pages are fetched on a background thread and
+        handed over through a bounded queue (backpressure) while the current
+        page is being written. Memory is bounded by the prefetch depth
+        instead of max_entries, and by max_buffer_mb: no page is fetched
+        while the pages fetched and not written yet add up to the budget.
+
+        With the spool enabled, each page is appended to the spool and its
+        checkpoint committed before it is written: pages fetched but not
+        written when the process dies are written from the spool by the next
+        run instead of being fetched again.
+
+        Returns:
+            [AuditLog]: The last page that was written, None if the page at
+            page_cursor was not modified
+        """
+        pages = github.iter_enterprise_audit_log(
+            type=self.type,
+            enterprise=self.enterprise,
+            page_cursor=page_cursor,
+            last_document_id=last_document_id,
+            phrase=phrase,
+            etag=etag,
+        )
+        if Utilities.to_int(self.input_items.get("streaming"), 0):
+            pages = Prefetcher(
+                pages,
+                max_pending=Utilities.to_int(
+                    self.input_items.get("prefetch_pages"), 2
+                ),
+                max_bytes=self.max_buffer_bytes(),
+                size=operator.attrgetter("byte_size"),
+            )
+        page = None
+        total = 0
+        spool = self.open_spool()
+        try:
+            if spool is not None:
+                # Pages spooled but not written by the previous run
+                total += self.drain_spool(spool, event_writer, dedup_index)
+            for page in pages:
+                if spool is not None:
+                    # Once the page is safe on disk, the next fetch starts
+                    # after it
+                    spool.append(page.dumps().encode("utf-8"))
+                    self.update_checkpoint(page)
+                    self.save_state(self.state, self.enterprise)
+                    total += self.drain_spool(spool, event_writer, dedup_index)
+                else:
+                    page.deduplicate(dedup_index)
+                    total += self.write_audit_log(page, event_writer)
+                    self.flush_events(event_writer)
+                    if dedup_index is not None:
+                        dedup_index.add_entries(page)
+                    self.update_checkpoint(page)
+                    self.save_state(self.state, self.enterprise)
+                if isinstance(pages, Prefetcher):
+                    # Written: the next pages can be fetched in its place
+                    pages.release()
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    logging.debug(
+                        "%s ::: stream_audit_log(): Actions: %s",
+                        self.input_name,
+                        page.batch.count_by("action"),
+                    )
+                if self._stop.is_set():
+                    # Shutting down: the next poll resumes after this page
+                    pages.close()
+                    break
+        finally:
+            if dedup_index is not None:
+                self.save_dedup_index(dedup_index)
+        logging.info("{} ::: stream_audit_log(): Wrote: {} events".format(self.input_name, total))
+        return page
+
+    def run_backfill(self, github, event_writer):
+        """Backfill mode: fetches the next batch of historical time windows
+        concurrently, writes their merged entries and checkpoints every
+        window. Once every window is exhausted the input resumes from the
+        last page of the open-ended window, with its search phrase.
+
+        Returns:
+            [bool]: False if the backfill is already completed
+        """
+        backfill = Backfill(
+            github,
+            self.state,
+            type=self.type,
+            enterprise=self.enterprise,
+            start=self.input_items["backfill_start"],
+            window_days=Utilities.to_int(
+                self.input_items.get("backfill_window_days"), 7
+            ),
+            workers=Utilities.to_int(self.input_items.get("backfill_workers"), 4),
+            max_entries=self.max_entries,
+            max_bytes=self.max_buffer_bytes(),
+        )
+        backfill.plan()
+        if backfill.completed:
+            return False
+        results = backfill.run()
+        logging.info(
+            "{} ::: run_backfill(): Fetched windows: {}".format(
+                self.input_name, [window for window, _ in results]
+            )
+        )
+        count = self.write_audit_log(Backfill.merge(results), event_writer)
+        head = backfill.checkpoint(results)
+        if head is not None:
+            # The regular polls go on with the phrase of the open-ended window:
+            # its after cursors belong to it, and so does the empty cursor of
+            # a window exhausted in a single page
+            self.state.set(
+                "input", "phrase", Backfill.phrase(backfill.windows()[-1])
+            )
+            self.update_checkpoint(head)
+            # The first poll reads the last page of the window again
+            dedup_index = self.load_dedup_index()
+            dedup_index.add_entries(head)
+            self.save_dedup_index(dedup_index)
+        self.save_state(self.state, self.enterprise)
+        logging.info(
+            "{} ::: run_backfill(): Wrote {} events, pending windows: {}".format(
+                self.input_name, count, len(backfill.pending())
+            )
+        )
+        return True
+
+    def poll_audit_log(self, github, event_writer):
+        """Writes the audit log entries of the current input from its
+        checkpoint on, or the next batch of its backfill until the backfill
+        is completed
+
+        Args:
+            github ([GitHub]): Client of the input's host
+            event_writer (EventWriter): Writer used to send the events to Splunk
+        """
+        if self.input_items.get("backfill_start") and self.run_backfill(
+            github, event_writer
+        ):
+            return
+        logging.debug("%s ::: poll_audit_log(): REQUESTING DATA", self.input_name)
+        page_cursor = self.state["input"]["page_cursor"]
+        last_document_id = self.state["input"]["last_document_id"]
+        # ETag of the page at page_cursor, if it was the last page
+        etag = self.state["input"].get("etag", "")
+        # Search phrase the page_cursor belongs to, handed off by the backfill
+        phrase = self.state["input"].get("phrase") or None
+        audit_log = self.stream_audit_log(
+            github,
+            page_cursor,
+            last_document_id,
+            etag,
+            event_writer,
+            dedup_index=self.load_dedup_index(),
+            phrase=phrase,
+        )
+        if github.not_modified:
+            # 304: nothing new and no rate limit budget used
+            logging.info(
+                "{} ::: poll_audit_log(): Not modified since the last run".format(
+                    self.input_name
+                )
+            )
+            return
+        logging.debug(
+            "{} ::: poll_audit_log(): Max entries reached: {}".format(
+                self.input_name,
+                github.max_entries_reached,
+            )
+        )
+        logging.info(
+            "{} ::: poll_audit_log(): API Rate limits: {} - rate limited: {} - throttled for: {:.2f}s".format(
+                self.input_name,
+                audit_log.api_rate_limits,
+                github.rate_limited,
+                github.rate_limiter.slept,
+            )
+        )
+        logging.info(
+            "{} ::: poll_audit_log(): Retries: {} - slept for: {:.2f}s".format(
+                self.input_name,
+                github.retry_stats["retries"],
+                github.retry_stats["sleep_seconds"],
+            )
+        )
+        if github.error is not None:
+            logging.error(
+                "{} ::: poll_audit_log(): Stopped at the last good page: {}".format(
+                    self.input_name, github.error
+                )
+            )
+
+    def group_inputs(self, inputs):
+        """Groups the inputs by enterprise. Inputs of the same enterprise share
+        a state file, so they must be handled one after the other by the same
+        worker.
+
+        Returns:
+            dict: Lists of (input_name, input_items) by enterprise
+        """
+        groups = {}
+        for input_name, input_items in sorted(inputs.inputs.items()):
+            groups.setdefault(input_items.get("enterprise"), []).append(
+                (input_name, input_items)
+            )
+        return groups
+
+    def configure_logger(self, inputs):
+        """The logger is global: set it up once, before the workers start,
+        in debug mode if any of the inputs is in debug mode"""
+        if any(bool(int(items.get("debug", 0))) for _, items in inputs.inputs.items()):
+            self.enable_logger()
+        else:
+            self.disable_logger()
+
+    def handle_stop_signals(self):
+        """Ends daemon mode when splunkd asks the process to stop"""
+
+        # pylint: disable=W0613
+        def stop(signum, frame):
+            logging.info("Received signal {}, stopping".format(signum))
+            self._stop.set()
+
+        for name in ("SIGTERM", "SIGINT", "SIGBREAK"):
+            if hasattr(signal, name):
+                try:
+                    signal.signal(getattr(signal, name), stop)
+                except ValueError:
+                    # Signal handlers can only be set from the main thread
+                    pass
+
     def stream_events(self, inputs, event_writer):
         """This function handles all the action: splunk calls this modular input
         without arguments, streams XML describing the inputs to stdin, and waits
         for XML on stdout describing events.
         If you set use_single_instance to True on the scheme in get_scheme, it
         will pass all the instances of this input to a single instance of this
-        script.
+        script. The inputs are then polled concurrently by a pool of worker
+        threads sharing the splunkd connection and the HTTP connection pools.
+        In daemon mode the process does not exit after polling the inputs, it
+        polls them again every poll_interval seconds.
+        """
+        self.session_key = self._input_definition.metadata["session_key"]
+        if not inputs.inputs:
+            # Right after installation, the inputs are not configured yet
+            # to avoid an exception in the logs, we skip this
+            logging.debug("%s ::: stream_events() skipping...",self.input_name)
+            return
+        settings = self.load_settings()
+        if isinstance(event_writer, HECEventWriter) and not event_writer.has_token:
+            event_writer.set_token(self.get_hec_token(settings["hec_credential"]))
+        if hasattr(event_writer, "add_input"):
+            # Writers that bypass splunkd need the index, sourcetype and host
+            # of the input stanzas
+            for input_name, input_items in inputs.inputs.items():
+                event_writer.add_input(input_name, input_items)
+        if settings["daemon"]:
+            self.run_daemon(inputs, event_writer, settings)
+            return
+        if len(inputs.inputs) == 1:
+            input_name, input_items = inputs.inputs.popitem()
+            try:
+                self.stream_input(input_name, input_items, event_writer)
+            finally:
+                self.close_http_sessions()
+            return
+        groups = self.group_inputs(inputs)
+        self.configure_logger(inputs)
+        writer = SynchronizedEventWriter(event_writer)
+        workers = settings["worker_threads"]
+        logging.info(
+            "stream_events(): Polling {} inputs with {} workers".format(
+                len(inputs.inputs), min(workers, len(groups))
+            )
+        )
+
+        def stream_group(group):
+            worker = self.spawn_worker()
+            for input_name, input_items in group:
+                worker.stream_input(input_name, input_items, writer)
+
+        try:
+            run_in_pool(stream_group, list(groups.values()), workers=workers)
+        finally:
+            self.close_http_sessions()
+
+    def run_daemon(self, inputs, event_writer, settings):
+        """Polls the inputs every poll_interval seconds until splunkd stops
+        the process (SIGTERM), stops reading its output (EPIPE) or exits.
+
+        Each group of inputs keeps its worker between polls, so the
+        interpreter start up, the splunkd connection, the HTTP connection
+        pools and the decrypted personal access tokens are paid for once.
+        The checkpoints are still committed to the state files after every
+        page, exactly like in the default mode.
+
+        Groups are handed to the pool as soon as they are due and
+        rescheduled as soon as their own poll ends: a slow or rate limited
+        enterprise does not hold back the polls of the others.
+
+        Args:
+            inputs (InputDefinition): Inputs to poll
+            event_writer (EventWriter): Writer used to send the events to Splunk
+            settings (dict): Settings returned by load_settings()
+        """
+        groups = self.group_inputs(inputs)
+        self.configure_logger(inputs)
+        self.handle_stop_signals()
+        writer = SynchronizedEventWriter(event_writer)
+        workers = dict((key, self.spawn_worker()) for key in groups)
+        scheduler = Scheduler(settings["poll_interval"])
+        for key in sorted(groups):
+            scheduler.add(key)
+        # stdin was read to the end when parsing the inputs, so splunkd going
+        # away is noticed through our parent process changing instead
+        parent_pid = os.getppid()
+        logging.info(
+            "run_daemon(): Polling {} inputs every {}s".format(
+                len(inputs.inputs), scheduler.interval
+            )
+        )
+
+        def poll(key):
+            started = time.time()
+            for input_name, input_items in groups[key]:
+                if self._stop.is_set():
+                    break
+                workers[key].stream_input(input_name, input_items, writer)
+            return started
+
+        pool = WorkerPool(poll, workers=settings["worker_threads"])
+        try:
+            while not self._stop.is_set():
+                # Groups being polled are out of the scheduler until their
+                # poll ends, so a group is never polled twice at once
+                for key in scheduler.pop_due():
+                    pool.submit(key)
+                wait_time = scheduler.wait_time()
+                # Wake up at least every second to check on splunkd
+                timeout = 1.0 if wait_time is None else min(wait_time, 1.0)
+                for key, started, error in pool.completed(timeout=timeout):
+                    if error is not None:
+                        logging.error(
+                            "run_daemon(): Polling {} failed: {}".format(key, error)
+                        )
+                        started = time.time()
+                    scheduler.reschedule(key, started)
+                if os.getppid() != parent_pid:
+                    logging.info("run_daemon(): splunkd exited, stopping")
+                    self._stop.set()
+        finally:
+            # The polls in progress stop after their current page
+            pool.close()
+            self.close_http_sessions()
+        logging.info("run_daemon(): Stopped")
+
+    def stream_input(self, input_name, input_items, event_writer):
+        """Polls the audit log of a single input and writes its events
+
+        Args:
+            input_name (str): Name of the input, e.g. ghe_audit_log_monitoring://name
+            input_items (dict): Parameters of the input
+            event_writer (EventWriter): Writer used to send the events to Splunk
         """
         try:
-            self.session_key = self._input_definition.metadata["session_key"]
-            if not inputs.inputs:
-                # Right after installation, the inputs are not configured yet
-                # to avoid an exception in the logs, we skip this
-                logging.debug("%s ::: stream_events() skipping...",self.input_name)
-                return
-            self.input_name, self.input_items = inputs.inputs.popitem()
+            self.input_name, self.input_items = input_name, input_items
             # The Argument.data_type_boolean is not actually a boolean it's
             # 0 or 1. Here we transform it to a boolean
             if bool(int(self.input_items["debug"])):
@@ -357,14 +1537,16 @@ class MyScript(Script):
             self.max_entries = self.input_items["max_entries"]
             # Capture the event types to fetch from the audit log.
             self.event_types = self.input_items["event_types"]
+            # Compiled before fetching anything, an unknown profile stops here
+            self.load_projection()
             # This script maintains the state in a config file: state/state.conf
             # everytime we need to process a new event we need to load the
             # latest state
             self.state = self.load_state(self.enterprise)
             # Debug
-            logging.debug("%s ::: stream_events() input_name: %s", self.input_name, self.input_name)
-            #logging.debug("%s ::: stream_events() input_items: %s", self.input_name, self.input_items)
-            #logging.debug("%s ::: stream_events() config: %s", self.input_name, self.state["input"])
+            logging.debug("%s ::: stream_input() input_name: %s", self.input_name, self.input_name)
+            #logging.debug("%s ::: stream_input() input_items: %s", self.input_name, self.input_items)
+            #logging.debug("%s ::: stream_input() config: %s", self.input_name, self.state["input"])
             self.hostname = self.input_items["hostname"]
             # If this is a GHES instance we need to manipulate the hostname
             # to build the appropriate GraphQL endpoint
@@ -381,122 +1563,94 @@ class MyScript(Script):
             self.personal_access_token = self.get_personal_access_token(
                 self.input_items["personal_access_token"]
             )
-            logging.debug("%s ::: stream_events() hostname: %s", self.input_name, self.hostname)
-            logging.debug("%s ::: stream_events() ignore_ssc: %s", self.input_name, self.ignore_ssc)
+            logging.debug("%s ::: stream_input() hostname: %s", self.input_name, self.hostname)
+            logging.debug("%s ::: stream_input() ignore_ssc: %s", self.input_name, self.ignore_ssc)
             # This section contains the logic for fetching the audit log entries.
             #
-            # It will make multiple calls to get_enterprise_audit_log() and handle
-            # the pagination logic.
+            # stream_audit_log() iterates over iter_enterprise_audit_log(),
+            # which handles the pagination logic and yields one AuditLog per
+            # page, parsed from the JSON received.
             #
-            # The output will be an AuditLog which will parse the JSON
-            # received from get_enterprise_audit_log() and create an Iterable object.
+            # The entries of each page are written as new events in Splunk.
             #
-            # Then we will iterate over the entries of the AuditLog and write
-            # each entry as a new event in Splunk.
-            #
-            # Eventually we will update the state file for the enterprise we
-            # have fetched the data for. The state file will be used to fetch
-            # only the fresh data in subsequent runs to avoid duplicates.
+            # Then the state file for the enterprise we have fetched the data
+            # for is updated before moving on to the next page. The state file
+            # will be used to fetch only the fresh data in subsequent runs to
+            # avoid duplicates.
+            pool_size = Utilities.to_int(self.input_items.get("pool_size"))
             github = GitHub(
                 api_url=self.hostname,
                 access_token=self.personal_access_token,
                 max_entries=self.max_entries,
+                pool_size=pool_size,
+                session=self.http_session(self.hostname, pool_size),
+                connect_timeout=Utilities.to_float(
+                    self.input_items.get("connect_timeout")
+                ),
+                read_timeout=Utilities.to_float(self.input_items.get("read_timeout")),
+                # Inputs sharing a personal access token share its rate limit
+                # budget through the same file
+                rate_limiter=RateLimitScheduler(
+                    path=self.state_file_path(
+                        "rate_limit_{}.json".format(
+                            self.state["input"]["pat_credential_id"]
+                        )
+                    ),
+                    reserve=Utilities.to_int(
+                        self.input_items.get("rate_limit_reserve"), 0
+                    ),
+                    max_wait=Utilities.to_float(
+                        self.input_items.get("rate_limit_max_wait"), 60
+                    ),
+                ),
+                max_retries=Utilities.to_int(self.input_items.get("max_retries")),
+                stream_json=Utilities.to_int(self.input_items.get("stream_json"), 1),
+                raw_json=self.raw_entries(),
             )
             github.set_event_types(self.event_types)
             logging.debug(
-                "{} ::: stream_events(): Loaded page_cursor from state file: {}".format(
+                "{} ::: stream_input(): Loaded page_cursor from state file: {}".format(
                     self.input_name,
                     self.state["input"]["page_cursor"]
                 )
             )
             logging.debug(
-                "{} ::: stream_events(): Loaded last_document_id from state file: {}".format(
+                "{} ::: stream_input(): Loaded last_document_id from state file: {}".format(
                     self.input_name,
                     self.state["input"]["last_document_id"]
                 )
             )
             logging.debug(
-                "{} ::: stream_events(): Loaded last_count from state file: {}".format(
+                "{} ::: stream_input(): Loaded last_count from state file: {}".format(
                     self.input_name,
                     self.state["input"]["last_count"]
                 )
             )
-            logging.debug("%s ::: stream_events(): REQUESTING DATA", self.input_name)
-            page_cursor = self.state["input"]["page_cursor"]
-            last_document_id = self.state["input"]["last_document_id"]
-            # last_count needs to be an integer and config_parser doesn't play
-            # well with integers
-            last_count = (
-                int(self.state["input"]["last_count"])
-                if not self.state["input"]["last_count"] == ""
-                else 0
-            )
-            audit_log = github.get_enterprise_audit_log(
-                type=self.type,
-                enterprise=self.enterprise,
-                page_cursor=page_cursor,
-                last_document_id=last_document_id,
-                last_count=last_count,
-            )
-            logging.debug("%s ::: stream_events(): Pushing data to splunk", self.input_name)
-            logging.info("{} ::: stream_events(): Fetched: {} events".format(self.input_name, audit_log.total))
-            for entry in audit_log:
-                # Prepare the event
-                event = Event()
-                event.stanza = self.input_name
-                event.data = Utilities.splunk_serialize(entry)
-                event_writer.write_event(event)
-            # Update and save page_cursor value if it exists
-            if audit_log.page_cursor["next"] is not None:
-                self.state.set("input", "page_cursor", audit_log.page_cursor["next"])
-                logging.debug(
-                    "{} ::: stream_events(): Updating page_cursor: {}".format(
-                        self.input_name,
-                        audit_log.page_cursor["next"]
-                    )
-                )
-            else:
-                self.state.set(
-                    "input",
-                    "page_cursor",
-                    audit_log.page_cursor["last"]
-                    if audit_log.page_cursor["last"] is not None
-                    else "",
-                )
-                logging.debug(
-                    "{} ::: stream_events(): Updating page_cursor: {}".format(
-                        self.input_name,
-                        audit_log.page_cursor["last"]
-                    )
-                )
-            logging.debug(
-                "{} ::: stream_events(): Max entries reached: {} with {} entries".format(
-                    self.input_name,
-                    github.max_entries_reached,
-                    audit_log.total,
-                )
-            )
-            logging.info(
-                "{} ::: stream_events(): API Rate limits: {}".format(self.input_name, audit_log.api_rate_limits)
-            )
-            # Update the last document_id and count fetched
-            logging.debug(
-                "{} ::: stream_events(): Updating last_page: {} - {}".format(
-                    self.input_name,
-                    audit_log.last_page["_document_id"],
-                    str(audit_log.last_page["count"]),
-                )
-            )
-            self.state.set(
-                "input", "last_document_id", audit_log.last_page["_document_id"]
-            )
-            self.state.set("input", "last_count", str(audit_log.last_page["count"]))
-            self.save_state(self.state, self.enterprise)
-            logging.info("{} ::: stream_events(): SUCCESS".format(self.input_name))
+            self.poll_audit_log(github, event_writer)
+            github.close()
+            logging.info("{} ::: stream_input(): SUCCESS".format(self.input_name))
+        except RateLimitExceeded as error:
+            # Nothing was fetched, the checkpoint is left untouched
+            logging.warning("{} ::: stream_input(): {}".format(self.input_name, error))
+        except EnvironmentError as error:
+            if error.errno != errno.EPIPE:
+                logging.error("Unexpected error: \n", exc_info=True)
+                return
+            # splunkd stopped reading our output, there is no point going on
+            logging.warning("{} ::: stream_input(): Output closed, stopping".format(self.input_name))
+            self._stop.set()
         # pylint: disable=W0702
         except:
             logging.error("Unexpected error: \n", exc_info=True)
+        finally:
+            if isinstance(self.state, KVStoreStateStore):
+                # The next node resumes at the last page committed by this run
+                self.kvstore_batcher().flush()
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--print-props":
+        # e.g. ghe_audit_log_monitoring.py --print-props github:audit >> local/props.conf
+        print(MyScript.props_stanza(sys.argv[2] if len(sys.argv) > 2 else None), end="")
+        sys.exit(0)
     sys.exit(MyScript().run(sys.argv))
@@ -0,0 +1,315 @@
+"""HTTP Event Collector event writer
+"""
+from __future__ import absolute_import, print_function
+import sys
+import json
+import gzip
+import time
+import uuid
+import threading
+import xml.etree.ElementTree as ET
+from io import BytesIO
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class HECError(RuntimeError):
+    """Raised by flush() when events could not be delivered (or, with
+    acknowledgements, were not acknowledged) by the HTTP Event Collector"""
+
+
+def _compress(body, level):
+    buffer = BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=level) as gzip_file:
+        gzip_file.write(body)
+    return buffer.getvalue()
+
+
+class HECEventWriter:
+    """Sends the events to a Splunk HTTP Event Collector instead of writing
+    them to stdout, as a drop-in replacement of splunklib's EventWriter.
+
+    Events are grouped in batches of batch_size events, sent as
+    newline-delimited JSON, gzip compressed, over a keep-alive connection
+    pool. Up to max_in_flight batches are posted concurrently; write_event()
+    blocks while that many are in flight. flush() returns once every batch
+    has been accepted, and with use_ack once the indexers have acknowledged
+    them, so a checkpoint committed after flush() never covers events that
+    could still be lost. It raises HECError otherwise.
+
+    splunkd fills in the index, sourcetype and host of the events written to
+    stdout from the input stanza. HEC does not know about the stanza, so the
+    inputs are registered with add_input() and their settings are sent along
+    with the events that don't set their own.
+    """
+
+    DEBUG = "DEBUG"
+    INFO = "INFO"
+    WARN = "WARN"
+    ERROR = "ERROR"
+    FATAL = "FATAL"
+
+    EVENT_PATH = "/services/collector/event"
+    ACK_PATH = "/services/collector/ack"
+
+    def __init__(
+        self,
+        url,
+        token=None,
+        output=sys.stdout,
+        error=sys.stderr,
+        batch_size=100,
+        max_in_flight=4,
+        use_ack=False,
+        ack_timeout=60.0,
+        verify=True,
+        timeout=30.0,
+        max_retries=3,
+        compress_level=6,
+        session=None,
+        sleep=time.sleep,
+        clock=time.time,
+    ):
+        url = url.rstrip("/")
+        if url.endswith(HECEventWriter.EVENT_PATH):
+            url = url[: -len(HECEventWriter.EVENT_PATH)]
+        self._url = url
+        self._out = output
+        self._err = error
+        self._batch_size = max(1, int(batch_size))
+        self._max_in_flight = max(1, int(max_in_flight))
+        self._use_ack = bool(use_ack)
+        self._ack_timeout = float(ack_timeout)
+        self._verify = verify
+        self._timeout = float(timeout)
+        self._max_retries = int(max_retries)
+        self._compress_level = int(compress_level)
+        self._sleep = sleep
+        self._clock = clock
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=1, pool_maxsize=self._max_in_flight
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self._session = session
+        self._headers = {
+            "Content-Encoding": "gzip",
+            "Content-Type": "application/json",
+            # Acknowledgements are tracked per channel
+            "X-Splunk-Request-Channel": str(uuid.uuid4()),
+        }
+        self._inputs = {}
+        self._batch = []
+        self._in_flight = threading.BoundedSemaphore(self._max_in_flight)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._errors = []
+        self._pending_acks = set()
+        self._stats = {"events": 0, "batches": 0, "retries": 0}
+        self.header_written = False
+        if token:
+            self.set_token(token)
+
+    @property
+    def stats(self):
+        """Number of events and batches sent, and of posts retried"""
+        return dict(self._stats)
+
+    @property
+    def has_token(self):
+        return "Authorization" in self._headers
+
+    def set_token(self, token):
+        """Sets the HEC token, e.g. once it has been read from splunkd's
+        password storage, before any event is written
+
+        Args:
+            token ([str]): HTTP Event Collector token
+        """
+        self._headers["Authorization"] = "Splunk {}".format(token)
+
+    def add_input(self, name, items):
+        """Registers the settings (index, sourcetype, host) of an input stanza
+
+        Args:
+            name ([str]): Name of the input stanza, the stanza of its events
+            items ([dict]): Settings of the input
+        """
+        metadata = {}
+        for key in ("index", "sourcetype", "host"):
+            value = items.get(key)
+            # "default" stands for the default index, i.e. the token's one
+            if value and value != "default":
+                metadata[key] = value
+        self._inputs[name] = metadata
+
+    def serialize(self, event):
+        """Returns the HEC JSON of an event
+
+        Raises:
+            ValueError: The event has no data
+        """
+        if event.data is None:
+            raise ValueError(
+                "Events must have at least the data field set to be written."
+            )
+        metadata = self._inputs.get(event.stanza, {})
+        payload = {}
+        if event.time is not None:
+            payload["time"] = event.time
+        for key, value in (
+            ("host", event.host),
+            ("source", event.source or event.stanza),
+            ("sourcetype", event.sourceType),
+            ("index", event.index),
+        ):
+            value = value or metadata.get(key)
+            if value:
+                payload[key] = value
+        # The data is sent as a string, it is indexed as is
+        payload["event"] = event.data
+        return json.dumps(payload, separators=(",", ":"))
+
+    def write_event(self, event):
+        """Adds an event to the current batch, sending the batch once full"""
+        self._batch.append(self.serialize(event))
+        if len(self._batch) >= self._batch_size:
+            self._send_batch()
+
+    def _send_batch(self):
+        if not self._batch:
+            return
+        body = "\n".join(self._batch).encode("utf-8")
+        count = len(self._batch)
+        self._batch = []
+        # Blocks while max_in_flight batches are being posted
+        self._in_flight.acquire()
+        thread = threading.Thread(target=self._post_batch, args=(body, count))
+        thread.daemon = True
+        self._threads.append(thread)
+        thread.start()
+
+    def _post_batch(self, body, count):
+        try:
+            response = self._post(
+                HECEventWriter.EVENT_PATH, _compress(body, self._compress_level)
+            )
+            with self._lock:
+                self._stats["events"] += count
+                self._stats["batches"] += 1
+                if self._use_ack:
+                    self._pending_acks.add(response.json()["ackId"])
+        # pylint: disable=W0703
+        except Exception as error:
+            with self._lock:
+                self._errors.append(error)
+        finally:
+            self._in_flight.release()
+
+    def _post(self, path, data):
+        """Posts to the collector, retrying connection errors, 429 and 5xx
+        responses with an exponential backoff
+
+        Raises:
+            HECError: The collector refused the request or is unreachable
+        """
+        attempt = 0
+        while True:
+            try:
+                response = self._session.post(
+                    self._url + path,
+                    data=data,
+                    headers=self._headers,
+                    verify=self._verify,
+                    timeout=self._timeout,
+                )
+                if response.ok:
+                    return response
+                error = HECError(
+                    "HEC error status_code: {} - url: {} - Response: {}".format(
+                        response.status_code, response.url, response.text
+                    )
+                )
+                retry = response.status_code == 429 or response.status_code >= 500
+            except requests.exceptions.RequestException as request_error:
+                error = HECError("HEC request failed: {}".format(request_error))
+                retry = True
+            if not retry or attempt >= self._max_retries:
+                raise error
+            with self._lock:
+                self._stats["retries"] += 1
+            self._sleep(min(2 ** attempt, 30))
+            attempt += 1
+
+    def _wait_for_acks(self):
+        """Polls the collector until every batch sent is acknowledged
+
+        Raises:
+            HECError: Some batches were not acknowledged within ack_timeout
+        """
+        deadline = self._clock() + self._ack_timeout
+        delay = 0.1
+        while self._pending_acks:
+            acks = sorted(self._pending_acks)
+            response = self._post(
+                HECEventWriter.ACK_PATH,
+                _compress(
+                    json.dumps({"acks": acks}).encode("utf-8"), self._compress_level
+                ),
+            )
+            statuses = response.json().get("acks", {})
+            for ack_id in acks:
+                if statuses.get(str(ack_id)):
+                    self._pending_acks.discard(ack_id)
+            if not self._pending_acks:
+                return
+            if self._clock() >= deadline:
+                pending = len(self._pending_acks)
+                # Acks are not polled again once given up on
+                self._pending_acks.clear()
+                raise HECError(
+                    "{} batches not acknowledged within {}s".format(
+                        pending, self._ack_timeout
+                    )
+                )
+            self._sleep(delay)
+            delay = min(delay * 2, 5.0)
+
+    def flush(self):
+        """Sends the current batch and waits until every batch is delivered,
+        and acknowledged when use_ack is enabled
+
+        Raises:
+            HECError: Some events could not be delivered
+        """
+        self._send_batch()
+        threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join()
+        with self._lock:
+            errors, self._errors = self._errors, []
+        if errors:
+            # The acks of the batches delivered are not waited for, the
+            # checkpoint is not committed anyway
+            self._pending_acks.clear()
+            raise errors[0]
+        if self._use_ack:
+            self._wait_for_acks()
+
+    def log(self, severity, message):
+        self._err.write("%s %s\n" % (severity, message))
+        self._err.flush()
+
+    def write_xml_document(self, document):
+        # --scheme and --validate-arguments still answer on stdout
+        self._out.write(ET.tostring(document).decode("utf-8"))
+        self._out.flush()
+
+    def close(self):
+        """Delivers the events left and releases the connections"""
+        try:
+            self.flush()
+        finally:
+            self._session.close()
@@ -0,0 +1,148 @@
+"""Incremental decoding of JSON arrays
+"""
+from __future__ import absolute_import, print_function
+import re
+import json
+import codecs
+
+# Size of the chunks read off the socket when streaming a response body
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class JSONArrayDecoder:
+    """Decodes a JSON array fed chunk by chunk (e.g. as it comes off the
+    socket) and returns its items as soon as they are complete.
+
+    Only the item being received is buffered, so memory stays flat however
+    big the array is, instead of holding the whole body and the whole list of
+    decoded items at once like response.json() does.
+
+    With raw=True each item is returned as an (item, text) pair, text being
+    the item's JSON exactly as it was received.
+    """
+
+    def __init__(self, encoding="utf-8", raw=False):
+        self._decoder = json.JSONDecoder()
+        self._raw = raw
+        # Multi-byte characters may be split across chunks
+        self._text_decoder = codecs.getincrementaldecoder(encoding)()
+        self._buffer = ""
+        self._started = False
+        self._done = False
+        self._count = 0
+
+    @property
+    def done(self):
+        return self._done
+
+    def feed(self, chunk):
+        """Decodes the items completed by a chunk
+
+        Args:
+            chunk ([bytes]): Next chunk of the body
+
+        Raises:
+            ValueError: The body is not a JSON array
+
+        Returns:
+            [list]: Items completed by this chunk, possibly none
+        """
+        if isinstance(chunk, bytes):
+            chunk = self._text_decoder.decode(chunk)
+        self._buffer += chunk
+        return self._decode(final=False)
+
+    def close(self):
+        """Decodes what is left once the body has been received
+
+        Raises:
+            ValueError: The body is truncated or is not a JSON array
+
+        Returns:
+            [list]: Remaining items
+        """
+        self._buffer += self._text_decoder.decode(b"", final=True)
+        items = self._decode(final=True)
+        if not self._done:
+            raise ValueError("Truncated JSON array")
+        return items
+
+    def _decode(self, final):
+        items = []
+        buffer = self._buffer
+        length = len(buffer)
+        whitespace = _WHITESPACE.match
+        # The C scanner behind raw_decode(), without its per call overhead
+        scan = self._decoder.scan_once
+        raw = self._raw
+        position = whitespace(buffer, 0).end()
+        if not self._started and position < length:
+            if buffer[position] != "[":
+                raise ValueError("Expected a JSON array")
+            self._started = True
+            position = whitespace(buffer, position + 1).end()
+        while self._started and not self._done and position < length:
+            if self._count == 0 and buffer[position] == "]":
+                # Empty array
+                self._done = True
+                position += 1
+                break
+            try:
+                item, end = scan(buffer, position)
+            except StopIteration:
+                if final:
+                    raise ValueError("Expecting value at position {}".format(position))
+                break
+            except ValueError:
+                if final:
+                    raise
+                # The item is not complete yet
+                break
+            # A number may continue in the next chunk: only accept an item
+            # once the delimiter following it has been received. GitHub sends
+            # compact JSON, so the delimiter nearly always follows right away.
+            delimiter = end
+            if delimiter >= length or buffer[delimiter] not in ",]":
+                delimiter = whitespace(buffer, end).end()
+                if delimiter >= length:
+                    if not final:
+                        break
+                    raise ValueError("Truncated JSON array")
+                if buffer[delimiter] not in ",]":
+                    raise ValueError(
+                        "Expected ',' or ']' at position {}".format(delimiter)
+                    )
+            items.append((item, buffer[position:end]) if raw else item)
+            self._count += 1
+            self._done = buffer[delimiter] == "]"
+            position = delimiter + 1
+            if position < length and buffer[position] in " \t\n\r":
+                position = whitespace(buffer, position).end()
+        # Drop what was decoded once per chunk, not once per item
+        self._buffer = buffer[position:]
+        return items
+
+
+def iter_json_array(chunks, encoding="utf-8", raw=False):
+    """Yields the items of a JSON array received in chunks
+
+    Args:
+        chunks ([iterable]): Chunks of the body, bytes or str
+        encoding ([str], optional): Encoding of the body. Defaults to "utf-8".
+        raw ([bool], optional): Yield (item, text) pairs, text being the JSON of
+            the item as received. Defaults to False.
+
+    Raises:
+        ValueError: The body is truncated or is not a JSON array
+
+    Yields:
+        [object]: Items of the array, one at a time
+    """
+    decoder = JSONArrayDecoder(encoding=encoding, raw=raw)
+    for chunk in chunks:
+        for item in decoder.feed(chunk):
+            yield item
+    for item in decoder.close():
+        yield item
@@ -0,0 +1,203 @@
+"""KVStoreBatcher and KVStoreStateStore classes
+"""
+from __future__ import absolute_import, print_function
+import time
+import logging
+import threading
+from state_store import StateStore
+
+
+class KVStoreBatcher:
+    """Documents waiting to be saved to a KV Store collection.
+
+    Staging a document only replaces the previous pending version of the
+    same _key in memory. The pending documents of every input of the process
+    are saved together, with a single batch_save request per MAX_DOCUMENTS
+    documents, once flush_seconds have passed since the last flush, and
+    whenever flush() is called. A failed flush keeps the documents pending
+    for the next one.
+    """
+
+    # Default max_documents_per_batch_save of limits.conf
+    MAX_DOCUMENTS = 1000
+
+    def __init__(self, collection, flush_seconds=30.0, clock=time.time):
+        """
+        Args:
+            collection ([KVStoreCollectionData]): Data of the collection
+            flush_seconds ([float], optional): Maximum delay before the
+                documents staged are saved. Defaults to 30.0.
+            clock ([callable], optional): Defaults to time.time.
+        """
+        self._collection = collection
+        self._flush_seconds = float(flush_seconds)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._last_flush = clock()
+        self._stats = {"documents": 0, "requests": 0, "errors": 0}
+
+    @classmethod
+    def connect(cls, connect, token, app, collection, flush_seconds=30.0):
+        """Returns the KVStoreBatcher of a collection of an app. The collection
+        is only visible in the namespace of its app, so splunkd is connected
+        to as owner nobody in that app.
+
+        Args:
+            connect ([callable]): splunklib.client.connect
+            token ([str]): Session key
+            app ([str]): Name of the app defining the collection
+            collection ([str]): Name of the collection
+            flush_seconds ([float], optional): Defaults to 30.0.
+
+        Returns:
+            KVStoreBatcher: The new batcher
+        """
+        service = connect(token=token, owner="nobody", app=app)
+        return cls(service.kvstore[collection].data, flush_seconds=flush_seconds)
+
+    @property
+    def collection(self):
+        return self._collection
+
+    @property
+    def stats(self):
+        """Number of documents saved, batch_save requests and failed flushes"""
+        return dict(self._stats)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def stage(self, document):
+        """Queues a document to be saved, flushing if flush_seconds have passed
+
+        Args:
+            document ([dict]): Document, with its _key
+        """
+        with self._lock:
+            self._pending[document["_key"]] = document
+            due = self._clock() - self._last_flush >= self._flush_seconds
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Saves the pending documents
+
+        Returns:
+            [int]: Number of documents saved
+        """
+        with self._lock:
+            documents = list(self._pending.values())
+            self._pending = {}
+            self._last_flush = self._clock()
+        saved = 0
+        try:
+            for start in range(0, len(documents), KVStoreBatcher.MAX_DOCUMENTS):
+                batch = documents[start : start + KVStoreBatcher.MAX_DOCUMENTS]
+                self._collection.batch_save(*batch)
+                self._stats["requests"] += 1
+                saved += len(batch)
+        # pylint: disable=W0703
+        except Exception as error:
+            self._stats["errors"] += 1
+            logging.warning(
+                "KVStoreBatcher.flush(): %d documents not saved, retrying later: %s",
+                len(documents) - saved,
+                error,
+            )
+            with self._lock:
+                # Newer versions staged meanwhile take precedence
+                for document in documents[saved:]:
+                    self._pending.setdefault(document["_key"], document)
+        self._stats["documents"] += saved
+        return saved
+
+    def fetch(self, key):
+        """Returns the document saved with a _key, None if there is none or
+        the KV Store can't be reached"""
+        with self._lock:
+            if key in self._pending:
+                return self._pending[key]
+        try:
+            return self._collection.query_by_id(key)
+        # pylint: disable=W0703
+        except Exception as error:
+            if getattr(error, "status", None) != 404:
+                logging.warning(
+                    "KVStoreBatcher.fetch(): Can't read %s: %s", key, error
+                )
+            return None
+
+
+class KVStoreStateStore(StateStore):
+    """StateStore mirrored to a KV Store collection, so the input can fail
+    over to another forwarder and resume at the last page committed there.
+
+    The local snapshot and journal remain the write-back cache: save()
+    commits to them first, then stages the whole state as the document
+    <key> of the collection, saved by the KVStoreBatcher along with the
+    states of the other inputs. Every save increments the sequence of the
+    state. load() adopts the document of the collection when its sequence
+    is higher than the local one, i.e. when another node got further.
+    """
+
+    SECTION = "checkpoint"
+
+    def __init__(self, path, batcher, key, compact_bytes=64 * 1024):
+        StateStore.__init__(self, path, compact_bytes=compact_bytes)
+        self._batcher = batcher
+        self._key = key
+        self._restored = False
+
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def restored(self):
+        """Whether the state was taken from the collection on load"""
+        return self._restored
+
+    @property
+    def sequence(self):
+        return int(self.get(KVStoreStateStore.SECTION, "sequence", fallback=0) or 0)
+
+    def load(self):
+        """Reads the local state, replaced by the collection's if newer
+
+        Returns:
+            KVStoreStateStore: Returns the current KVStoreStateStore instance
+        """
+        StateStore.load(self)
+        self._restored = False
+        document = self._batcher.fetch(self._key)
+        if document is not None and int(document.get("sequence", 0)) > self.sequence:
+            logging.info(
+                "KVStoreStateStore.load(): Resuming %s at sequence %s from the KV Store",
+                self._key,
+                document["sequence"],
+            )
+            self._sections = document["sections"]
+            self._restored = True
+            # The local cache starts over from the collection's state
+            self.compact()
+        return self
+
+    def save(self):
+        """Commits the changes locally, and stages the state to be saved to
+        the collection"""
+        if not self._changes():
+            return
+        sequence = self.sequence + 1
+        if not self.has_section(KVStoreStateStore.SECTION):
+            self.add_section(KVStoreStateStore.SECTION)
+        self.set(KVStoreStateStore.SECTION, "sequence", sequence)
+        StateStore.save(self)
+        self._batcher.stage(
+            {
+                "_key": self._key,
+                "sequence": sequence,
+                "updated": time.time(),
+                "sections": self._copy(),
+            }
+        )
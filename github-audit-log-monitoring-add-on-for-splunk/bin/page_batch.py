@@ -0,0 +1,122 @@
+"""PageBatch class
+"""
+from __future__ import absolute_import, print_function
+from array import array
+
+
+def _to_timestamp(value):
+    """Timestamps are numbers or numeric strings, anything else is NaN"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+class Symbols:
+    """Interns strings (actions, actors, orgs, repos, transport protocols)
+    into small integer codes. A single table is shared by the batches of an
+    AuditLog, so codes can be compared across pages. Code 0 stands for a
+    missing value.
+    """
+
+    def __init__(self):
+        self._codes = {None: 0}
+        self._names = [None]
+
+    def __len__(self):
+        return len(self._names)
+
+    def code(self, name):
+        """Returns the code of a name, assigning a new one if needed"""
+        code = self._codes.get(name)
+        if code is None:
+            code = len(self._names)
+            self._codes[name] = code
+            self._names.append(name)
+        return code
+
+    def name(self, code):
+        return self._names[code]
+
+
+class PageBatch:
+    """Columnar view of a page of audit log entries.
+
+    Timestamps are kept in a double array, actions, actors, orgs, repos and
+    transport protocols as interned codes in integer arrays and document ids
+    in a list, next to the entries themselves. The columns are built with a
+    plain Python loop over the entries. count_by() and the git Rollup group
+    the rows by these codes.
+    """
+
+    CODED_COLUMNS = ("action", "actor", "org", "repo", "transport_protocol_name")
+
+    def __init__(self, symbols=None):
+        self._symbols = symbols if symbols is not None else Symbols()
+        self._entries = []
+        self._timestamps = array("d")
+        self._document_ids = []
+        self._codes = dict((column, array("l")) for column in PageBatch.CODED_COLUMNS)
+
+    @classmethod
+    def from_entries(cls, entries, symbols=None):
+        """Builds the columns of a list of entries
+
+        Args:
+            entries ([list]): AuditLogEntry instances
+            symbols ([Symbols], optional): Shared symbols table. Defaults to None.
+
+        Returns:
+            PageBatch: The new batch
+        """
+        batch = cls(symbols)
+        batch._entries = list(entries)
+        code = batch._symbols.code
+        for entry in batch._entries:
+            batch._timestamps.append(_to_timestamp(entry.timestamp))
+            batch._document_ids.append(entry.document_id)
+            for column in PageBatch.CODED_COLUMNS:
+                batch._codes[column].append(code(getattr(entry, column)))
+        return batch
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    @property
+    def symbols(self):
+        return self._symbols
+
+    @property
+    def entries(self):
+        return self._entries
+
+    @property
+    def timestamps(self):
+        return self._timestamps
+
+    @property
+    def document_ids(self):
+        return self._document_ids
+
+    def codes(self, column):
+        """Returns the array of codes of a column: action, actor, org, repo or
+        transport_protocol_name"""
+        return self._codes[column]
+
+    def count_by(self, column):
+        """Counts the rows by value of a column
+
+        Args:
+            column ([str]): action, actor, org, repo or transport_protocol_name
+
+        Returns:
+            [dict]: Number of rows by value
+        """
+        counts = {}
+        for code in self._codes[column]:
+            counts[code] = counts.get(code, 0) + 1
+        name = self._symbols.name
+        return dict((name(code), count) for code, count in counts.items())
@@ -0,0 +1,252 @@
+"""Producer / consumer helpers used to overlap network and output work
+"""
+from __future__ import absolute_import, print_function
+import threading
+from collections import deque
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class Prefetcher:
+    """Iterates over a (slow) iterable on a background thread and hands the
+    items over through a bounded queue.
+
+    The producer can run at most max_pending items ahead of the consumer,
+    which keeps memory flat while the next item (e.g. the next audit log
+    page) is fetched as the current one is being written. Exceptions raised
+    by the producer are re-raised in the consumer.
+
+    With max_bytes, the items are also held to a byte budget, size(item)
+    giving the size of each item: the producer does not start on the next
+    item while the items it produced and the consumer did not release() yet
+    add up to max_bytes or more.
+    """
+
+    _DONE = object()
+
+    def __init__(self, iterable, max_pending=2, max_bytes=None, size=None):
+        self._iterable = iterable
+        self._queue = queue.Queue(maxsize=max(1, int(max_pending)))
+        self._stop = threading.Event()
+        self._thread = None
+        self._max_bytes = None if max_bytes is None else int(max_bytes)
+        self._size = size
+        # Sizes of the items produced and not released yet, oldest first
+        self._held = deque()
+        self._held_bytes = 0
+        self._released = threading.Condition()
+
+    @property
+    def held_bytes(self):
+        """Bytes of the items produced and not released yet"""
+        return self._held_bytes
+
+    def _wait_for_budget(self):
+        """Blocks until the items held are under the byte budget
+
+        Returns:
+            [bool]: False if the consumer has been closed
+        """
+        if self._max_bytes is None:
+            return True
+        with self._released:
+            while self._held_bytes >= self._max_bytes:
+                if self._stop.is_set():
+                    return False
+                self._released.wait(0.1)
+        return True
+
+    def _hold(self, item):
+        """Counts an item against the byte budget until it is released"""
+        if self._max_bytes is not None:
+            size = self._size(item)
+            with self._released:
+                self._held.append(size)
+                self._held_bytes += size
+
+    def release(self):
+        """Gives the budget of the oldest item handed over back to the
+        producer, once the consumer is done with it, e.g. once the events of
+        a page have been written"""
+        if self._max_bytes is None:
+            return
+        with self._released:
+            if self._held:
+                self._held_bytes -= self._held.popleft()
+                self._released.notify()
+
+    def _produce(self):
+        """Background thread body: push every item followed by a marker"""
+        try:
+            iterator = iter(self._iterable)
+            while True:
+                if not self._wait_for_budget():
+                    return
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                self._hold(item)
+                if not self._put(item):
+                    return
+            self._put(Prefetcher._DONE)
+        # pylint: disable=W0703
+        except Exception as error:
+            self._put(error)
+
+    def _put(self, item):
+        """Blocking put that gives up once the consumer has stopped
+
+        Returns:
+            [bool]: False if the consumer has been closed
+        """
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __iter__(self):
+        self._thread = threading.Thread(target=self._produce)
+        self._thread.daemon = True
+        self._thread.start()
+        try:
+            while True:
+                item = self._queue.get()
+                if item is Prefetcher._DONE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop the producer and release anything left in the queue. The
+        producer thread is a daemon and exits once its current item (e.g. an
+        in-flight request) completes.
+        """
+        self._stop.set()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+
+def run_in_pool(func, items, workers=4):
+    """Calls func(item) for every item on a bounded pool of threads
+
+    Args:
+        func (callable): Function to call with each item
+        items (list): Items to process
+        workers (int, optional): Maximum number of threads. Defaults to 4.
+
+    Raises:
+        Exception: The first exception raised by func, once every call has returned
+
+    Returns:
+        list: The results, in the order of the items
+    """
+    items = list(items)
+    results = [None] * len(items)
+    errors = []
+    pending = queue.Queue()
+    for position, item in enumerate(items):
+        pending.put((position, item))
+
+    def work():
+        while True:
+            try:
+                position, item = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                results[position] = func(item)
+            # pylint: disable=W0703
+            except Exception as error:
+                errors.append(error)
+
+    threads = [
+        threading.Thread(target=work) for _ in range(max(1, min(int(workers), len(items))))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return results
+
+
+class WorkerPool:
+    """Calls func(item) on a fixed set of threads for every item submitted.
+
+    Unlike run_in_pool(), submit() returns right away: items are handled as
+    soon as a thread is free, whatever the items submitted before them, and
+    completed() hands back each item as soon as its own call has returned.
+    """
+
+    _STOP = object()
+
+    def __init__(self, func, workers=4):
+        self._func = func
+        self._pending = queue.Queue()
+        self._completed = queue.Queue()
+        self._threads = [
+            threading.Thread(target=self._work) for _ in range(max(1, int(workers)))
+        ]
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def _work(self):
+        while True:
+            item = self._pending.get()
+            if item is WorkerPool._STOP:
+                return
+            result, error = None, None
+            try:
+                result = self._func(item)
+            # pylint: disable=W0703
+            except Exception as exception:
+                error = exception
+            self._completed.put((item, result, error))
+
+    def submit(self, item):
+        """Queues an item, to be handled by the next free thread"""
+        self._pending.put(item)
+
+    def completed(self, timeout=None):
+        """Waits up to timeout seconds for a call to return
+
+        Args:
+            timeout (float, optional): Seconds to wait for the first call to
+                return. Defaults to None, waiting as long as needed.
+
+        Returns:
+            list: (item, result, error) of every call returned since the last
+            call to completed(), error being the exception raised by func
+        """
+        try:
+            done = [self._completed.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                done.append(self._completed.get_nowait())
+            except queue.Empty:
+                return done
+
+    def close(self):
+        """Waits for the calls in progress and the items queued to be
+        handled, then stops the threads"""
+        for _ in self._threads:
+            self._pending.put(WorkerPool._STOP)
+        for thread in self._threads:
+            thread.join()
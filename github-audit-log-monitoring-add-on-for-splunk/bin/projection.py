@@ -0,0 +1,172 @@
+"""Projection class
+"""
+from __future__ import absolute_import, print_function
+import re
+import fnmatch
+
+# Plans are compiled per entry shape; past this bound plans are compiled for
+# every entry instead of being kept, like the shapes themselves
+MAX_PLANS = 4096
+
+_MISSING = object()
+
+
+def _tree(paths):
+    """Returns the dotted paths as a tree of dicts, None marking the end of a
+    path, e.g. {"actor_location": {"country_code": None}}. A path covers the
+    longer paths under it."""
+    tree = {}
+    for path in paths:
+        parts = path.split(".")
+        node = tree
+        for part in parts[:-1]:
+            if part in node and node[part] is None:
+                node = None
+                break
+            node = node.setdefault(part, {})
+        if node is not None:
+            node[parts[-1]] = None
+    return tree
+
+
+def _keep(value, tree):
+    """Returns the parts of a nested object under the paths of the tree,
+    _MISSING if there are none"""
+    if not isinstance(value, dict):
+        return _MISSING
+    kept = {}
+    for key, item in value.items():
+        if key not in tree:
+            continue
+        subtree = tree[key]
+        if subtree is not None:
+            item = _keep(item, subtree)
+            if item is _MISSING:
+                continue
+        kept[key] = item
+    return kept if kept else _MISSING
+
+
+def _drop(value, tree):
+    """Returns a nested object without the paths of the tree"""
+    if not isinstance(value, dict):
+        return value
+    kept = {}
+    for key, item in value.items():
+        if key in tree:
+            subtree = tree[key]
+            if subtree is None:
+                continue
+            item = _drop(item, subtree)
+        kept[key] = item
+    return kept
+
+
+class Projection:
+    """Selects the fields of the audit log entries written to Splunk.
+
+    keep lists the only fields written, drop the fields never written, both
+    as dotted paths reaching into nested objects, e.g.
+    actor_location.country_code. When actions is set, only the entries whose
+    action matches one of its patterns (e.g. git.*) are projected; the other
+    entries are written whole.
+
+    The entries of a given shape (see AuditLogEntry) all have the same keys,
+    so the top level fields to write are worked out once per shape, into a
+    plan of the positions to read. Only the nested objects under a keep or
+    drop path are walked for every entry.
+    """
+
+    def __init__(self, keep=None, drop=None, actions=None):
+        self._keep = _tree(keep) if keep else None
+        self._drop = _tree(drop) if drop else None
+        self._actions = (
+            re.compile("|".join(fnmatch.translate(pattern) for pattern in actions))
+            if actions
+            else None
+        )
+        self._applies = {}
+        self._plans = {}
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Builds a Projection from the keep, drop and actions comma separated
+        lists of a projection profile
+
+        Args:
+            settings ([dict]): Settings of the profile
+
+        Returns:
+            Projection: The new projection
+        """
+
+        def split(name):
+            return [
+                value.strip()
+                for value in (settings.get(name) or "").split(",")
+                if value.strip()
+            ]
+
+        return cls(keep=split("keep"), drop=split("drop"), actions=split("actions"))
+
+    def applies(self, action):
+        """Returns whether the entries of an action are projected"""
+        if self._actions is None:
+            return True
+        applies = self._applies.get(action)
+        if applies is None:
+            applies = self._actions.match(action or "") is not None
+            self._applies[action] = applies
+        return applies
+
+    def _compile(self, keys):
+        """Returns the plan of the entries with these keys: (key, position,
+        steps) of each field written, steps being the nested projections to
+        apply to its value, None if the value is written whole"""
+        plan = []
+        for position, key in enumerate(keys):
+            steps = []
+            if self._keep is not None:
+                if key not in self._keep:
+                    continue
+                if self._keep[key] is not None:
+                    steps.append((_keep, self._keep[key]))
+            if self._drop is not None and key in self._drop:
+                if self._drop[key] is None:
+                    continue
+                steps.append((_drop, self._drop[key]))
+            plan.append((key, position, tuple(steps) or None))
+        return tuple(plan)
+
+    def project(self, entry):
+        """Returns the fields of an entry to write, in the order they were
+        received
+
+        Args:
+            entry ([AuditLogEntry]): Audit log entry
+
+        Returns:
+            [dict]: Fields to write, or the entry itself when its action is
+            not projected
+        """
+        if self._actions is not None and not self.applies(entry.get("action")):
+            return entry
+        keys = entry.keys()
+        plan = self._plans.get(keys)
+        if plan is None:
+            plan = self._compile(keys)
+            if len(self._plans) < MAX_PLANS:
+                self._plans[keys] = plan
+        values = entry.values()
+        fields = {}
+        for key, position, steps in plan:
+            value = values[position]
+            if steps is not None:
+                for step, tree in steps:
+                    value = step(value, tree)
+                    if value is _MISSING:
+                        break
+                if value is _MISSING:
+                    continue
+            fields[key] = value
+        return fields
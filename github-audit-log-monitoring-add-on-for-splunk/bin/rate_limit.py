@@ -0,0 +1,197 @@
+"""RateLimitScheduler class
+"""
+from __future__ import absolute_import, print_function
+import os
+import json
+import time
+import logging
+
+from utilities import Utilities
+
+
+class RateLimitExceeded(RuntimeError):
+    """Raised when the API budget is exhausted and waiting for the reset
+    would take longer than allowed."""
+
+    def __init__(self, reset_timestamp):
+        super(RateLimitExceeded, self).__init__(
+            "API rate limit reached. Will not be able to fetch data until the rate limit refreshes on: {}".format(
+                reset_timestamp
+            )
+        )
+        self.reset_timestamp = reset_timestamp
+
+
+class RateLimitScheduler:
+    """Paces the API calls made with a personal access token so that its
+    hourly budget lasts until the rate limit window resets.
+
+    The X-RateLimit-* values of the last response are kept in memory, and
+    persisted in a small JSON file (when a path is provided) shared by every
+    run and every input using the same token, so inputs see each other's
+    consumption. The file is only rewritten when the budget changes in a way
+    the other inputs need to know about: a new rate limit window, or a
+    budget under pace_below, where every request counts and the requests
+    are spaced out anyway. save() persists the last values at the end of a
+    run. The file is read again when another input or run replaced it.
+
+    - While more than pace_below of the budget is left, requests go out
+      immediately.
+    - Below that, requests are spaced so the remaining budget is spread over
+      the time left until X-RateLimit-Reset.
+    - Once the budget (minus the reserve) is exhausted, the scheduler sleeps
+      until the reset, or raises RateLimitExceeded if that would take longer
+      than max_wait seconds so the caller can checkpoint and stop cleanly.
+    """
+
+    def __init__(
+        self,
+        path=None,
+        reserve=0,
+        max_wait=60,
+        pace_below=0.25,
+        clock=time.time,
+        sleep=time.sleep,
+    ):
+        self._path = path
+        self._reserve = int(reserve)
+        self._max_wait = float(max_wait)
+        self._pace_below = float(pace_below)
+        self._clock = clock
+        self._sleep = sleep
+        self._limits = {}
+        # Window (reset) of the limits last persisted, and identity of the
+        # file last read, so it is only read again once replaced
+        self._saved_reset = None
+        self._file_id = None
+        self._slept = 0.0
+
+    @property
+    def limits(self):
+        return self._limits
+
+    @property
+    def slept(self):
+        return self._slept
+
+    def load(self):
+        """Reads the limits persisted by the last run or another input, if the
+        file changed since it was last read. For the same window, the lowest
+        remaining count is kept.
+
+        Returns:
+            [dict]: limit, remaining, reset, used and last_request values
+        """
+        if self._path is None:
+            return self._limits
+        try:
+            stat = os.stat(self._path)
+        except OSError:
+            return self._limits
+        file_id = (stat.st_ino, stat.st_mtime, stat.st_size)
+        if file_id == self._file_id:
+            return self._limits
+        try:
+            with open(self._path, "r") as limits_file:
+                saved = json.load(limits_file)
+        except ValueError:
+            # A torn or corrupted file only costs us the pacing history
+            saved = {}
+        self._file_id = file_id
+        self._limits = RateLimitScheduler.merge(self._limits, saved)
+        return self._limits
+
+    @staticmethod
+    def merge(limits, other):
+        """Returns the limits of the later window of the two, with the lowest
+        remaining count of both if they are of the same window"""
+        if not other or not limits:
+            return limits or other
+        if limits["reset"] != other["reset"]:
+            return limits if limits["reset"] > other["reset"] else other
+        merged = dict(limits)
+        merged["remaining"] = min(limits["remaining"], other["remaining"])
+        merged["last_request"] = max(
+            limits.get("last_request", 0), other.get("last_request", 0)
+        )
+        return merged
+
+    def save(self):
+        """Persists the limits atomically (write to temp + rename), merged
+        with the ones persisted by the other inputs meanwhile"""
+        if self._path is None or not self._limits:
+            return
+        self.load()
+        Utilities.atomic_write(self._path, json.dumps(self._limits))
+        self._saved_reset = self._limits["reset"]
+        self._file_id = None
+
+    def update(self, response_headers):
+        """Records the rate limit headers of a response. They are persisted
+        when a new window starts or the budget is under pace_below.
+
+        Args:
+            response_headers ([dict]): Case-insensitive Dictionary of Response Headers.
+
+        Returns:
+            [dict]: The limits tracked by the scheduler
+        """
+        if "X-RateLimit-Remaining" not in response_headers:
+            return self._limits
+        limits = {
+            "limit": int(response_headers["X-RateLimit-Limit"]),
+            "remaining": int(response_headers["X-RateLimit-Remaining"]),
+            "reset": int(response_headers["X-RateLimit-Reset"]),
+            "used": int(response_headers.get("X-RateLimit-Used", 0)),
+            "last_request": self._clock(),
+        }
+        # Another input may have consumed more of the same window meanwhile
+        self._limits = RateLimitScheduler.merge(limits, self.load())
+        if (
+            self._limits["reset"] != self._saved_reset
+            or self._limits["remaining"] <= self._limits["limit"] * self._pace_below
+        ):
+            self.save()
+        return self._limits
+
+    def delay(self):
+        """Computes how long to wait before the next request
+
+        Raises:
+            RateLimitExceeded: The budget is exhausted for longer than max_wait
+
+        Returns:
+            [float]: Seconds to wait
+        """
+        limits = self.load()
+        now = self._clock()
+        if not limits or now >= limits["reset"]:
+            # No history or a fresh window
+            return 0.0
+        window_left = limits["reset"] - now
+        remaining = limits["remaining"] - self._reserve
+        if remaining <= 0:
+            # The reset timestamp has a one second resolution
+            if window_left + 1 > self._max_wait:
+                raise RateLimitExceeded(limits["reset"])
+            return window_left + 1
+        if remaining > limits["limit"] * self._pace_below:
+            return 0.0
+        spacing = window_left / remaining
+        return max(0.0, spacing - (now - limits.get("last_request", 0)))
+
+    def wait(self):
+        """Sleeps until the next request is allowed to go out
+
+        Raises:
+            RateLimitExceeded: The budget is exhausted for longer than max_wait
+
+        Returns:
+            [float]: Seconds slept
+        """
+        delay = self.delay()
+        if delay > 0:
+            logging.debug("RateLimitScheduler.wait(): sleeping %.2fs", delay)
+            self._sleep(delay)
+            self._slept += delay
+        return delay
@@ -4,25 +4,144 @@ from __future__ import absolute_import, print_function
 import warnings
 import requests
 import time
+import random
+import logging
+import threading
+from email.utils import parsedate_tz, mktime_tz
+from requests.adapters import HTTPAdapter
 
 from audit_log import AuditLog
+from rate_limit import RateLimitScheduler, RateLimitExceeded
 
 
 class GitHub:
     """[summary]"""
 
-    def __init__(self, api_url, access_token, max_entries=None):
+    # Status codes worth retrying: GitHub / GHES hiccups and throttling
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+    # Entries per page requested
+    PER_PAGE = 100
+
+    def __init__(
+        self,
+        api_url,
+        access_token,
+        max_entries=None,
+        pool_size=None,
+        connect_timeout=None,
+        read_timeout=None,
+        session=None,
+        rate_limiter=None,
+        max_retries=None,
+        backoff_factor=None,
+        max_backoff=None,
+        sleep=time.sleep,
+        stream_json=False,
+        raw_json=False,
+    ):
         self._headers = None
         self._api_url = "https://"+api_url
         self._access_token = access_token
         self._max_entries = 1000 if max_entries is None else int(max_entries)
         self._max_entries_reached = False
         self._event_types = "all"
+        self._pool_size = 10 if pool_size is None else int(pool_size)
+        self._timeout = (
+            10.0 if connect_timeout is None else float(connect_timeout),
+            60.0 if read_timeout is None else float(read_timeout),
+        )
+        # A session passed in is shared with other clients and is left open
+        self._owns_session = session is None
+        self._session = (
+            session if session is not None else GitHub.create_session(self._pool_size)
+        )
+        self._rate_limiter = (
+            rate_limiter if rate_limiter is not None else RateLimitScheduler()
+        )
+        self._rate_limited = False
+        self._max_retries = 5 if max_retries is None else int(max_retries)
+        # Decode the pages as they are read off the socket
+        self._stream_json = bool(stream_json)
+        # Keep the JSON text of the entries instead of decoding all their fields
+        self._raw_json = bool(raw_json)
+        self._backoff_factor = 1.0 if backoff_factor is None else float(backoff_factor)
+        self._max_backoff = 60.0 if max_backoff is None else float(max_backoff)
+        self._sleep = sleep
+        # Backfill windows are fetched by several threads with the same
+        # client: the counters and the error are updated under this lock
+        self._lock = threading.Lock()
+        self._retry_stats = {"retries": 0, "sleep_seconds": 0.0}
+        self._error = None
+        self._not_modified = False
+        self._auth_headers = {
+            "Accept": "application/vnd.github.v3+json",
+            "Content-Type": "application/json",
+            "Authorization": "Bearer {}".format(self._access_token),
+        }
 
     @property
     def max_entries_reached(self):
         return self._max_entries_reached
 
+    @property
+    def rate_limited(self):
+        return self._rate_limited
+
+    @property
+    def rate_limiter(self):
+        return self._rate_limiter
+
+    @property
+    def retry_stats(self):
+        with self._lock:
+            return dict(self._retry_stats)
+
+    @property
+    def error(self):
+        return self._error
+
+    @property
+    def not_modified(self):
+        return self._not_modified
+
+    @property
+    def session(self):
+        return self._session
+
+    @property
+    def timeout(self):
+        return self._timeout
+
+    @staticmethod
+    def create_session(pool_size=10):
+        """Create a requests Session backed by a keep-alive connection pool.
+        Reusing the session across pages (and across runs or inputs when the
+        session is shared) avoids a new TCP + TLS handshake for every API call.
+
+        Args:
+            pool_size (int, optional): Number of connections kept alive. Defaults to 10.
+
+        Returns:
+            requests.Session: Session with the HTTPS adapter mounted
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        return session
+
+    def _set_error(self, error):
+        """Records the error that stopped the last iteration"""
+        with self._lock:
+            self._error = error
+
+    def close(self):
+        """Persist the rate limit budget left, and release the pooled
+        connections held by the session, unless the session was provided by
+        (and is shared with) the caller"""
+        self._rate_limiter.save()
+        if self._owns_session:
+            self._session.close()
+
     def headers(self, headers=None):
         """Get / Set request headers
 
@@ -82,13 +201,298 @@ class GitHub:
         self._event_types = event_types
         return self._event_types
 
+    def request_audit_log_page(
+        self, type=None, enterprise=None, page_cursor=None, phrase=None, etag=None
+    ):
+        """Requests a single page of the audit log through the pooled session
+
+        Args:
+            type ([str], optional): Account type, enterprises or orgs. Defaults to None.
+            enterprise ([str], optional): Enterprise or organization name. Defaults to None.
+            page_cursor ([str], optional): after cursor of the page to fetch. Defaults to None.
+            phrase ([str], optional): Search phrase, e.g. created:2021-01-01..2021-01-07. Defaults to None.
+            etag ([str], optional): ETag of the last response for the same page. When
+                the page is unchanged the API answers 304 Not Modified, which does
+                not count against the rate limit. Defaults to None.
+
+        Raises:
+            RateLimitExceeded: The API budget is exhausted until after the scheduler's max_wait
+
+        Returns:
+            [requests.Response]: Response of the audit log API call
+        """
+        slug = "/{type}/{enterprise}/audit-log".replace(
+            "{type}", type
+        ).replace(
+            "{enterprise}", enterprise
+        )
+        params = {
+            "phrase": "" if phrase is None else phrase,
+            "include": self._event_types,
+            "after": ""
+            if page_cursor is None or page_cursor == ""
+            else page_cursor,
+            "before": "",
+            "order": "asc",
+            "per_page": str(GitHub.PER_PAGE),
+        }
+        headers = None if not etag else {"If-None-Match": etag}
+        return self.get_with_retries(
+            "{}{}".format(self._api_url, slug), params, headers=headers
+        )
+
+    def classify(self, response=None, error=None):
+        """Classifies the outcome of a request
+
+        Args:
+            response ([requests.Response], optional): Response received. Defaults to None.
+            error ([Exception], optional): Exception raised by requests. Defaults to None.
+
+        Returns:
+            [str]: "ok", "retry" for transient failures (network errors, 5xx,
+            429, secondary rate limits), "rate_limit" when the primary rate
+            limit is exhausted or "fail" for anything else
+        """
+        if error is not None:
+            if isinstance(
+                error,
+                (
+                    requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError,
+                ),
+            ):
+                return "retry"
+            return "fail"
+        if response.ok:
+            return "ok"
+        if response.status_code in GitHub.RETRY_STATUS_CODES:
+            return "retry"
+        if response.status_code == 403:
+            if response.headers.get("X-RateLimit-Remaining") == "0":
+                return "rate_limit"
+            if "Retry-After" in response.headers or "secondary rate limit" in (
+                response.text or ""
+            ).lower():
+                return "retry"
+        return "fail"
+
+    def backoff(self, attempt, response=None):
+        """Seconds to wait before the next attempt: exponential backoff with
+        full jitter, but never less than the Retry-After header asks for.
+
+        Args:
+            attempt ([int]): Number of the attempt that failed, starting at 0
+            response ([requests.Response], optional): Failed response. Defaults to None.
+
+        Returns:
+            [float]: Seconds to wait
+        """
+        delay = random.uniform(
+            0, min(self._max_backoff, self._backoff_factor * (2 ** attempt))
+        )
+        retry_after = None if response is None else response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                # HTTP-date form
+                parsed = parsedate_tz(retry_after)
+                if parsed is not None:
+                    delay = max(delay, mktime_tz(parsed) - time.time())
+        return delay
+
+    def get_with_retries(self, url, params, headers=None):
+        """GET through the pooled session, paced by the rate limiter and
+        retried on transient failures (see classify()). Every retry is
+        counted in retry_stats along with the time spent sleeping.
+
+        Args:
+            url ([str]): URL to request
+            params ([dict]): Query string parameters
+            headers ([dict], optional): Headers sent on top of the auth headers. Defaults to None.
+
+        Raises:
+            RateLimitExceeded: The API budget is exhausted until after the scheduler's max_wait
+            requests.exceptions.RequestException: Network errors, once the retries are exhausted
+
+        Returns:
+            [requests.Response]: The last response received. Callers close it
+            when they don't read its body, e.g. on a non-2xx status code.
+        """
+        request_headers = (
+            self._auth_headers if not headers else dict(self._auth_headers, **headers)
+        )
+        attempt = 0
+        while True:
+            self._rate_limiter.wait()
+            response = None
+            error = None
+            try:
+                response = self._session.get(
+                    url,
+                    headers=request_headers,
+                    params=params,
+                    timeout=self._timeout,
+                    stream=self._stream_json,
+                )
+                self._rate_limiter.update(response.headers)
+            except requests.exceptions.RequestException as request_error:
+                error = request_error
+            outcome = self.classify(response=response, error=error)
+            if outcome == "rate_limit" and attempt < self._max_retries:
+                # The scheduler now knows the budget is exhausted: the next
+                # wait() sleeps until the reset or raises RateLimitExceeded
+                response.close()
+                attempt += 1
+                continue
+            if outcome != "retry" or attempt >= self._max_retries:
+                if error is not None:
+                    raise error
+                return response
+            delay = self.backoff(attempt, response)
+            logging.warning(
+                "GitHub.get_with_retries(): attempt %s failed (%s), retrying in %.2fs",
+                attempt + 1,
+                error if error is not None else response.status_code,
+                delay,
+            )
+            with self._lock:
+                self._retry_stats["retries"] += 1
+                self._retry_stats["sleep_seconds"] += delay
+            if response is not None:
+                # Give the unread connection back before retrying
+                response.close()
+            self._sleep(delay)
+            attempt += 1
+
+    def iter_enterprise_audit_log(
+        self,
+        type=None,
+        enterprise=None,
+        page_cursor=None,
+        last_document_id=None,
+        phrase=None,
+        max_entries=None,
+        etag=None,
+        max_bytes=None,
+    ):
+        """Streaming counterpart of get_enterprise_audit_log(). Instead of
+        buffering every page into a single AuditLog it yields one AuditLog per
+        page as soon as the page is loaded, so callers can write the entries
+        of a page while the next one is being fetched.
+
+        The run resumes from page_cursor, which is the last page of the
+        previous run when that run reached the end of the audit log. The
+        entries of that page up to and including last_document_id have
+        already been written and are dropped from the first page. The pages
+        may be produced on another thread (see Prefetcher), so checking the
+        entries against the dedup index is left to the caller, right before
+        they are written.
+
+        When the API budget runs out (rate_limited is set), or a page keeps
+        failing once its retries are exhausted (error is set), after at least
+        one page was yielded, the iteration stops cleanly so the caller can
+        checkpoint the pages it already has.
+
+        Args:
+            type ([str], optional): Account type, enterprises or orgs. Defaults to None.
+            enterprise ([str], optional): Enterprise or organization name. Defaults to None.
+            page_cursor ([str], optional): after cursor to resume from. Defaults to None.
+            last_document_id ([str], optional): _document_id of the last item fetched. Defaults to None.
+            phrase ([str], optional): Search phrase to filter the entries with. Defaults to None.
+            max_entries ([int], optional): Overrides the client's max_entries for this
+                iteration only, e.g. for a backfill window. Defaults to None.
+            etag ([str], optional): ETag of the page at page_cursor. Nothing is yielded
+                (and not_modified is set) if the page did not change. Defaults to None.
+            max_bytes ([int], optional): Stops once the response bodies of the pages
+                yielded add up to max_bytes, for callers holding on to the pages.
+                Defaults to None.
+
+        Raises:
+            RateLimitExceeded: The API budget is exhausted before the first page
+            RuntimeError: The first page could not be fetched
+
+        Yields:
+            [AuditLog]: AuditLog holding the entries of a single page
+        """
+        limit = self._max_entries if max_entries is None else int(max_entries)
+        total = 0
+        total_bytes = 0
+        first_page = True
+        while True:
+            try:
+                response = self.request_audit_log_page(
+                    type=type,
+                    enterprise=enterprise,
+                    page_cursor=page_cursor,
+                    phrase=phrase,
+                    etag=etag if first_page else None,
+                )
+            except RateLimitExceeded:
+                if first_page:
+                    raise
+                self._rate_limited = True
+                return
+            except requests.exceptions.RequestException as error:
+                if first_page:
+                    raise
+                self._set_error(str(error))
+                return
+            if not response.ok:
+                error = "Could not fetch audit log data. Please check your configuration, access token scope / correctness and API rate limits. status_code: {} - url: {} - Response: {}".format(
+                    response.status_code, response.url, response.text
+                )
+                response.close()
+                self._set_error(error)
+                if first_page:
+                    raise RuntimeError(error)
+                # Keep what was yielded, the next run resumes from the
+                # last good page
+                return
+            if response.status_code == 304:
+                # Nothing new since the last poll
+                self._not_modified = True
+                response.close()
+                return
+            page = AuditLog(type=type, enterprise=enterprise).load(
+                response, stream=self._stream_json, raw=self._raw_json
+            )
+            if first_page and last_document_id:
+                page.drop_through(last_document_id)
+            first_page = False
+            total += page.total
+            total_bytes += page.byte_size
+            yield page
+            if total >= limit:
+                if max_entries is None:
+                    self._max_entries_reached = True
+                return
+            if max_bytes is not None and total_bytes >= max_bytes:
+                return
+            if not page.has_next_page:
+                return
+            page_cursor = page.page_cursor["next"]
+
     def get_enterprise_audit_log(
-        self, type=None, enterprise=None, page_cursor=None, last_document_id=None, last_count=None
+        self,
+        type=None,
+        enterprise=None,
+        page_cursor=None,
+        last_document_id=None,
+        last_count=None,
+        etag=None,
+        dedup_index=None,
     ):
         """Calls the GHE Audit Log REST API to fetch audit log entries.
         It creates an instance of the AuditLog iterable and passes the
         HTTP response to it.
 
+        Legacy: the modular input fetches the audit log page by page with
+        iter_enterprise_audit_log(), checkpointing every page. This method
+        buffers the whole run into a single AuditLog instead, it is kept for
+        the callers of earlier versions.
+
         If page_cursor is passed, this method will fetch the entries after that
         page_cursor and will make subsequent API calls until has_next_page is False.
 
@@ -100,45 +504,54 @@ class GitHub:
             page_cursor ([str], optional): [description]. Defaults to None.
             last_document_id ([str], optional): _document_id of the last item fetched. Defaults to None.
             last_count ([int], optional): number of items fetched in the last page. Defaults to None.
+            dedup_index ([DedupIndex], optional): Document ids already written. When
+                given, the entries already written are dropped one by one instead
+                of guessing from last_document_id and last_count. Defaults to None.
+
+        If the API budget runs out, the entries loaded so far are returned
+        (rate_limited is set) and the page_cursor points at the next page.
+        The same goes for a page that still fails once its retries are
+        exhausted (error is set).
+
+        Raises:
+            RateLimitExceeded: The API budget is exhausted before the first page
+            RuntimeError: The first page could not be fetched
 
         Returns:
             [AuditLog]: AuditLog: Returns an AuditLog instance
         """
         audit_log = AuditLog(type=type,enterprise=enterprise)
+        first_page = True
         while audit_log.has_next_page:
-            slug = "/{type}/{enterprise}/audit-log".replace(
-                "{type}", type
-            ).replace(
-                "{enterprise}", enterprise
-            )
-            headers = {
-                "Accept": "application/vnd.github.v3+json",
-                "Content-Type": "application/json",
-                "Authorization": "Bearer {}".format(self._access_token),
-            }
-            params = {
-                "phrase": "",
-                "include": self._event_types,
-                "after": ""
-                if page_cursor is None or page_cursor == ""
-                else page_cursor,
-                "before": "",
-                "order": "asc",
-                "per_page": "100",
-            }
-            response = requests.get(
-                "{}{}".format(self._api_url, slug), headers=headers, params=params
-            )
+            try:
+                response = self.request_audit_log_page(
+                    type=type,
+                    enterprise=enterprise,
+                    page_cursor=page_cursor,
+                    etag=etag if first_page else None,
+                )
+            except RateLimitExceeded:
+                if first_page:
+                    raise
+                self._rate_limited = True
+                break
+            except requests.exceptions.RequestException as error:
+                if first_page:
+                    raise
+                self._set_error(str(error))
+                break
+            if response.status_code == 304:
+                # Nothing new since the last poll, skip the parsing and the
+                # pagination edge cases altogether
+                self._not_modified = True
+                response.close()
+                break
             # Returns True if status_code is less than 400, False if not.
             if response.ok:
-                audit_log.load(response)
-                # Check API rate limits
-                if audit_log.api_rate_limits["x_rl_remainig"] == 0:
-                    raise RuntimeError(
-                        "API rate limit reached. Will not be able to fetch data until the rate limit refreshes on: {}".format(
-                            audit_log.api_rate_limits["x_rl_reset_timestamp"]
-                        )
-                    )
+                first_page = False
+                audit_log.load(
+                    response, stream=self._stream_json, raw=self._raw_json
+                )
                 # Stop loading and return results if we exceed the max
                 # entries limit
                 if audit_log.total >= self._max_entries:
@@ -146,8 +559,13 @@ class GitHub:
                     break
                 # Check if there are further pages
                 if not audit_log.has_next_page:
-                    # This is where we deal with pagination edge cases
-                    if last_document_id is not None and last_count is not None:
+                    # This is where we deal with pagination edge cases,
+                    # unless the entries are checked against the dedup index
+                    if (
+                        dedup_index is None
+                        and last_document_id is not None
+                        and last_count is not None
+                    ):
                         # Case 1: If the number of items on the last page is
                         # equal to the value in our checkpoint and we are on the
                         # same last page as in our checkpoint then we don't have
@@ -187,9 +605,15 @@ class GitHub:
                 else:
                     page_cursor = audit_log.page_cursor["next"]
             else:
-                raise RuntimeError(
-                    "Could not fetch audit log data. Please check your configuration, access token scope / correctness and API rate limits. status_code: {} - url: {} - Response: {}".format(
-                        response.status_code, response.url, response.text
-                    )
+                error = "Could not fetch audit log data. Please check your configuration, access token scope / correctness and API rate limits. status_code: {} - url: {} - Response: {}".format(
+                    response.status_code, response.url, response.text
                 )
+                response.close()
+                self._set_error(error)
+                if first_page:
+                    raise RuntimeError(error)
+                # Keep the pages loaded so far, the next run resumes from
+                # the last good page
+                break
+        audit_log.deduplicate(dedup_index)
         return audit_log
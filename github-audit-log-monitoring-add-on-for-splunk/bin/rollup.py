@@ -0,0 +1,126 @@
+"""Rollup class
+"""
+from __future__ import absolute_import, print_function
+import re
+import zlib
+import fnmatch
+from collections import namedtuple
+
+# Count of events of a time bucket, time being the start of the bucket in
+# seconds since the epoch
+Datapoint = namedtuple(
+    "Datapoint", ("time", "action", "repo", "actor", "transport_protocol_name", "count")
+)
+
+# Sample ratios are applied with this resolution
+_SAMPLE_SCALE = 10000
+
+
+class Rollup:
+    """Aggregates the git events of a page into metric datapoints.
+
+    The entries whose action matches one of the patterns (git.* by default)
+    are counted per time bucket by action, repo, actor and transport
+    protocol. split() is a per-row Python loop over the columns of the
+    page's PageBatch, keyed on their interned codes.
+    They are not written as events, except for a sample of sample_ratio of
+    them, picked by the crc32 of their document id: the same entries are
+    sampled when a page is written twice. The other entries are written as
+    usual.
+    """
+
+    METRIC_NAME = "github.git.events"
+    DIMENSIONS = ("action", "repo", "actor", "transport_protocol_name")
+
+    def __init__(self, bucket_seconds=60, sample_ratio=0.0, actions=("git.*",)):
+        self._bucket_seconds = max(1, int(bucket_seconds))
+        self._threshold = int(
+            round(min(max(float(sample_ratio), 0.0), 1.0) * _SAMPLE_SCALE)
+        )
+        self._actions = re.compile(
+            "|".join(fnmatch.translate(pattern) for pattern in actions)
+        )
+        self._rolled_up = {}
+
+    @property
+    def bucket_seconds(self):
+        return self._bucket_seconds
+
+    def rolled_up(self, action):
+        """Returns whether the entries of an action are rolled up"""
+        rolled_up = self._rolled_up.get(action)
+        if rolled_up is None:
+            rolled_up = self._actions.match(action or "") is not None
+            self._rolled_up[action] = rolled_up
+        return rolled_up
+
+    def sampled(self, document_id):
+        """Returns whether a rolled up entry is also written as an event"""
+        if self._threshold >= _SAMPLE_SCALE:
+            return True
+        if self._threshold <= 0:
+            return False
+        checksum = zlib.crc32((document_id or "").encode("utf-8")) & 0xFFFFFFFF
+        return checksum % _SAMPLE_SCALE < self._threshold
+
+    def split(self, batch):
+        """Rolls up the entries of a page
+
+        Args:
+            batch ([PageBatch]): Columnar view of the page
+
+        Returns:
+            [tuple]: The entries still written as events, in order, and the
+            Datapoints of the entries rolled up, by time bucket
+        """
+        name = batch.symbols.name
+        # Per action code, for the symbols table of this batch
+        rolled_up = {}
+        bucket_ms = self._bucket_seconds * 1000.0
+        document_ids = batch.document_ids
+        entries = batch.entries
+        written = []
+        counts = {}
+        for position, (timestamp, action, repo, actor, protocol) in enumerate(
+            zip(
+                batch.timestamps,
+                batch.codes("action"),
+                batch.codes("repo"),
+                batch.codes("actor"),
+                batch.codes("transport_protocol_name"),
+            )
+        ):
+            matched = rolled_up.get(action)
+            if matched is None:
+                matched = rolled_up[action] = self.rolled_up(name(action))
+            # Entries without a timestamp have no bucket
+            if not matched or timestamp != timestamp:
+                written.append(entries[position])
+                continue
+            key = (int(timestamp // bucket_ms), action, repo, actor, protocol)
+            counts[key] = counts.get(key, 0) + 1
+            if self._threshold and self.sampled(document_ids[position]):
+                written.append(entries[position])
+        datapoints = [
+            Datapoint(
+                bucket * self._bucket_seconds,
+                name(action),
+                name(repo),
+                name(actor),
+                name(protocol),
+                count,
+            )
+            for (bucket, action, repo, actor, protocol), count in sorted(counts.items())
+        ]
+        return written, datapoints
+
+    @staticmethod
+    def serialize(datapoint):
+        """Returns the text of the event of a datapoint: the metric, then the
+        dimensions as key=value pairs. Missing dimensions are left out."""
+        fields = ["{}={}".format(Rollup.METRIC_NAME, datapoint.count)]
+        for dimension in Rollup.DIMENSIONS:
+            value = getattr(datapoint, dimension)
+            if value is not None and value != "":
+                fields.append("{}={}".format(dimension, value))
+        return " ".join(fields)
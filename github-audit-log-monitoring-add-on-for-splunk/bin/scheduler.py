@@ -0,0 +1,67 @@
+"""Scheduler class
+"""
+from __future__ import absolute_import, print_function
+import heapq
+import time
+
+
+class Scheduler:
+    """Keeps track of when each input is due in daemon mode.
+
+    Every key (an input, or a group of inputs sharing a state file) is polled
+    every interval seconds. The next poll is scheduled from the start of the
+    previous one, so a slow poll delays the next one instead of stacking up.
+    """
+
+    def __init__(self, interval=60, clock=time.time):
+        self._interval = float(interval)
+        self._clock = clock
+        self._queue = []
+
+    def __len__(self):
+        return len(self._queue)
+
+    @property
+    def interval(self):
+        return self._interval
+
+    def add(self, key, due=None):
+        """Schedules a key
+
+        Args:
+            key (str): Key to schedule
+            due (float, optional): Timestamp of the poll. Defaults to now.
+        """
+        heapq.heappush(self._queue, (self._clock() if due is None else due, key))
+
+    def pop_due(self):
+        """Removes and returns the keys that are due, earliest first
+
+        Returns:
+            list: Keys due now
+        """
+        now = self._clock()
+        due = []
+        while self._queue and self._queue[0][0] <= now:
+            due.append(heapq.heappop(self._queue)[1])
+        return due
+
+    def reschedule(self, key, started):
+        """Schedules the next poll of a key one interval after the start of
+        its last poll, or now if the poll took longer than the interval
+
+        Args:
+            key (str): Key to schedule
+            started (float): Timestamp of the start of the last poll
+        """
+        self.add(key, max(started + self._interval, self._clock()))
+
+    def wait_time(self):
+        """Returns the number of seconds until the next key is due
+
+        Returns:
+            float: Seconds to wait, None if nothing is scheduled
+        """
+        if not self._queue:
+            return None
+        return max(0.0, self._queue[0][0] - self._clock())
@@ -0,0 +1,176 @@
+"""Spool class
+"""
+from __future__ import absolute_import, print_function
+import os
+import mmap
+import zlib
+import struct
+import logging
+
+# Record header: payload length and crc32 of the payload
+_HEADER = struct.Struct(">II")
+
+
+class Spool:
+    """Append-only, crash-safe queue of records on disk.
+
+    Records are appended to numbered segment files, each prefixed with its
+    length and crc32, and fsynced. They are read back through read-only
+    memory maps of the segments. A position, (segment, offset), points right
+    after a record: the reader checkpoints the position of the last record
+    it handled and resumes from there. Segments entirely before the position
+    are deleted by release(). A record torn by a crash mid-append is cut off
+    when the spool is opened.
+    """
+
+    SUFFIX = ".spool"
+
+    def __init__(self, directory, segment_bytes=16 * 1024 * 1024, fsync=True):
+        self._directory = directory
+        self._segment_bytes = int(segment_bytes)
+        self._fsync = fsync
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._segments = sorted(
+            int(name[: -len(Spool.SUFFIX)])
+            for name in os.listdir(directory)
+            if name.endswith(Spool.SUFFIX) and name[: -len(Spool.SUFFIX)].isdigit()
+        )
+        self._recover()
+
+    @property
+    def directory(self):
+        return self._directory
+
+    @property
+    def segments(self):
+        return list(self._segments)
+
+    def _path(self, segment):
+        return os.path.join(self._directory, "{:010d}{}".format(segment, Spool.SUFFIX))
+
+    def _records(self, segment, offset):
+        """Yields (payload, end offset) for the valid records of a segment
+        from offset on, stopping at the first torn or corrupt one"""
+        path = self._path(segment)
+        size = os.path.getsize(path)
+        if size <= offset:
+            return
+        with open(path, "rb") as segment_file:
+            mapped = mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                while offset + _HEADER.size <= size:
+                    length, crc = _HEADER.unpack_from(mapped, offset)
+                    start = offset + _HEADER.size
+                    end = start + length
+                    if end > size:
+                        return
+                    payload = mapped[start:end]
+                    if zlib.crc32(payload) & 0xFFFFFFFF != crc:
+                        return
+                    offset = end
+                    yield payload, offset
+            finally:
+                mapped.close()
+
+    def _valid_size(self, segment):
+        end = 0
+        for _, end in self._records(segment, 0):
+            pass
+        return end
+
+    def _recover(self):
+        """Cuts off the tail of the last segment after its last valid record,
+        left behind by a crash mid-append"""
+        if not self._segments:
+            return
+        path = self._path(self._segments[-1])
+        valid = self._valid_size(self._segments[-1])
+        if valid < os.path.getsize(path):
+            logging.warning(
+                "Spool._recover(): truncating %s to %d bytes", path, valid
+            )
+            with open(path, "r+b") as segment_file:
+                segment_file.truncate(valid)
+
+    def append(self, payload):
+        """Appends a record, and fsyncs it before returning
+
+        Args:
+            payload ([bytes]): Content of the record
+
+        Returns:
+            [tuple]: Position (segment, offset) right after the record
+        """
+        if not self._segments:
+            self._segments.append(0)
+        segment = self._segments[-1]
+        path = self._path(segment)
+        if os.path.exists(path) and os.path.getsize(path) >= self._segment_bytes:
+            segment += 1
+            self._segments.append(segment)
+            path = self._path(segment)
+        with open(path, "ab") as segment_file:
+            segment_file.write(
+                _HEADER.pack(len(payload), zlib.crc32(payload) & 0xFFFFFFFF)
+            )
+            segment_file.write(payload)
+            segment_file.flush()
+            if self._fsync:
+                os.fsync(segment_file.fileno())
+            end = segment_file.tell()
+        return (segment, end)
+
+    def read(self, position=None):
+        """Yields the records after a position, oldest first
+
+        Args:
+            position ([tuple], optional): (segment, offset) returned with the
+                last record handled. Defaults to None, the start of the spool.
+
+        Raises:
+            ValueError: A record before the end of the spool is corrupt
+
+        Yields:
+            [tuple]: (payload, position) of each record
+        """
+        segment, offset = position if position is not None else (-1, 0)
+        for current in list(self._segments):
+            if current < segment:
+                continue
+            start = offset if current == segment else 0
+            end = start
+            for payload, end in self._records(current, start):
+                yield payload, (current, end)
+            if end < os.path.getsize(self._path(current)):
+                raise ValueError(
+                    "Corrupt spool record in {} at offset {}".format(
+                        self._path(current), end
+                    )
+                )
+
+    def release(self, position):
+        """Deletes the segments entirely read, i.e. before the position's one
+
+        Args:
+            position ([tuple]): (segment, offset) of the last record handled
+
+        Returns:
+            [int]: Number of segments deleted
+        """
+        released = 0
+        while len(self._segments) > 1 and self._segments[0] < position[0]:
+            os.remove(self._path(self._segments.pop(0)))
+            released += 1
+        return released
+
+    def pending(self, position=None):
+        """Returns the number of bytes spooled after a position"""
+        segment, offset = position if position is not None else (-1, 0)
+        total = 0
+        for current in self._segments:
+            if current < segment:
+                continue
+            size = os.path.getsize(self._path(current))
+            total += size - offset if current == segment else size
+        return max(0, total)
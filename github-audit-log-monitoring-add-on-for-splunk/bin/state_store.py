@@ -0,0 +1,231 @@
+"""StateStore class
+"""
+from __future__ import absolute_import, print_function
+import os
+import json
+import logging
+import configparser
+from utilities import Utilities
+
+_UNSET = object()
+
+
+class StateStore:
+    """Checkpoint state of an enterprise: sections of options, read and
+    written through the subset of the ConfigParser API the modular input
+    uses (has_section, add_section, get, set, options, state[section][option]
+    ...), so it can stand in for the state files it replaces.
+
+    The state is kept in two files next to each other: a JSON snapshot,
+    <path>.json, and a journal, <path>.journal. save() appends the options
+    changed since the last save to the journal as a single JSON line, and
+    fsyncs it, instead of rewriting the whole state after every page. Once
+    the journal grows past compact_bytes, the state is written to a new
+    snapshot, renamed over the old one, and the journal is emptied.
+    Loading replays the journal over the snapshot; a line torn by a crash
+    mid-append is ignored, as if that save never happened. Replaying a
+    journal over a snapshot that already has its changes is harmless, so a
+    crash between the snapshot and the journal truncation loses nothing.
+    """
+
+    def __init__(self, path, compact_bytes=64 * 1024):
+        self._snapshot_path = path + ".json"
+        self._journal_path = path + ".journal"
+        self._compact_bytes = int(compact_bytes)
+        self._sections = {}
+        # Copy of the state as of the last save, to journal the differences
+        self._saved = {}
+        self._journal_bytes = 0
+
+    @property
+    def exists(self):
+        """Whether the state was ever saved"""
+        return os.path.exists(self._snapshot_path) or os.path.exists(
+            self._journal_path
+        )
+
+    def load(self):
+        """Reads the snapshot and replays the journal
+
+        Returns:
+            StateStore: Returns the current StateStore instance
+        """
+        self._sections = {}
+        if os.path.exists(self._snapshot_path):
+            with open(self._snapshot_path, "r") as snapshot_file:
+                self._sections = json.load(snapshot_file)["sections"]
+        self._journal_bytes = 0
+        if os.path.exists(self._journal_path):
+            with open(self._journal_path, "rb") as journal_file:
+                content = journal_file.read()
+            for line in content.split(b"\n")[:-1]:
+                try:
+                    changes = json.loads(line.decode("utf-8"))
+                except ValueError:
+                    logging.warning(
+                        "StateStore.load(): Skipping a corrupt line of %s",
+                        self._journal_path,
+                    )
+                    continue
+                self._apply(changes)
+            # Torn line left by a crash mid-append
+            self._journal_bytes = len(content) - len(content.split(b"\n")[-1])
+            if self._journal_bytes < len(content):
+                with open(self._journal_path, "r+b") as journal_file:
+                    journal_file.truncate(self._journal_bytes)
+        self._saved = self._copy()
+        return self
+
+    def migrate(self, config):
+        """Replaces the state with the sections of a ConfigParser, e.g. read
+        from a state file of an earlier version, and saves it
+
+        Args:
+            config ([ConfigParser]): State to import
+        """
+        self._sections = dict(
+            (section, dict(config.items(section, raw=True)))
+            for section in config.sections()
+        )
+        self.compact()
+
+    def _copy(self):
+        return dict(
+            (section, dict(options)) for section, options in self._sections.items()
+        )
+
+    def _apply(self, changes):
+        for section in changes.get("drop", ()):
+            self._sections.pop(section, None)
+        for section, options in changes.get("set", {}).items():
+            self._sections.setdefault(section, {}).update(options)
+        for section, options in changes.get("unset", {}).items():
+            for option in options:
+                self._sections.get(section, {}).pop(option, None)
+
+    def _changes(self):
+        """Returns the differences with the last save: the options set by
+        section (new sections included), the options removed by section and
+        the sections removed"""
+        changed = {}
+        removed = {}
+        for section, options in self._sections.items():
+            saved = self._saved.get(section)
+            if saved is None:
+                changed[section] = dict(options)
+                continue
+            values = dict(
+                (option, value)
+                for option, value in options.items()
+                if option not in saved or saved[option] != value
+            )
+            if values:
+                changed[section] = values
+            options_removed = [option for option in saved if option not in options]
+            if options_removed:
+                removed[section] = options_removed
+        changes = {}
+        if changed:
+            changes["set"] = changed
+        if removed:
+            changes["unset"] = removed
+        dropped = [section for section in self._saved if section not in self._sections]
+        if dropped:
+            changes["drop"] = dropped
+        return changes
+
+    def save(self):
+        """Journals the changes made since the last save, compacting the
+        journal once it is larger than compact_bytes"""
+        changes = self._changes()
+        if not changes:
+            return
+        line = (json.dumps(changes, separators=(",", ":")) + "\n").encode("utf-8")
+        with open(self._journal_path, "ab") as journal_file:
+            journal_file.write(line)
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        self._journal_bytes += len(line)
+        self._saved = self._copy()
+        if self._journal_bytes > self._compact_bytes:
+            self.compact()
+
+    def compact(self):
+        """Writes the whole state to a new snapshot and empties the journal"""
+        Utilities.atomic_write(
+            self._snapshot_path,
+            json.dumps({"version": 1, "sections": self._sections}, separators=(",", ":")),
+        )
+        with open(self._journal_path, "wb") as journal_file:
+            os.fsync(journal_file.fileno())
+        self._journal_bytes = 0
+        self._saved = self._copy()
+
+    # ConfigParser API
+
+    def sections(self):
+        return list(self._sections)
+
+    def has_section(self, section):
+        return section in self._sections
+
+    def add_section(self, section):
+        if section in self._sections:
+            raise configparser.DuplicateSectionError(section)
+        self._sections[section] = {}
+
+    def remove_section(self, section):
+        return self._sections.pop(section, None) is not None
+
+    def options(self, section):
+        if section not in self._sections:
+            raise configparser.NoSectionError(section)
+        return list(self._sections[section])
+
+    def has_option(self, section, option):
+        return option in self._sections.get(section, {})
+
+    def get(self, section, option, fallback=_UNSET, **kwargs):
+        """Returns the value of an option. ConfigParser's raw and vars
+        arguments are accepted and ignored.
+
+        Raises:
+            NoSectionError: The section does not exist and there is no fallback
+            NoOptionError: The option does not exist and there is no fallback
+        """
+        options = self._sections.get(section)
+        if options is None:
+            if fallback is _UNSET:
+                raise configparser.NoSectionError(section)
+            return fallback
+        if option not in options:
+            if fallback is _UNSET:
+                raise configparser.NoOptionError(option, section)
+            return fallback
+        return options[option]
+
+    def set(self, section, option, value=None):
+        """Sets the value of an option. Values are kept as given, they only
+        need to be JSON serializable.
+
+        Raises:
+            NoSectionError: The section does not exist
+        """
+        if section not in self._sections:
+            raise configparser.NoSectionError(section)
+        self._sections[section][option] = value
+
+    def remove_option(self, section, option):
+        if section not in self._sections:
+            raise configparser.NoSectionError(section)
+        return self._sections[section].pop(option, _UNSET) is not _UNSET
+
+    def items(self, section):
+        return list(self._sections[section].items())
+
+    def __getitem__(self, section):
+        # The options of the section, changes to it are saved like set()'s
+        return self._sections[section]
+
+    def __contains__(self, section):
+        return section in self._sections
@@ -1,6 +1,13 @@
 """Utilities class
 """
 from __future__ import absolute_import, print_function
+import os
+import json
+import tempfile
+
+# Shared by every event written in the json output mode: compact, and
+# without escaping non-ASCII characters
+_json_encoder = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False)
 
 
 class Utilities:
@@ -13,13 +20,81 @@ pat_credential_id =
 page_cursor =
 last_document_id =
 last_count =
+etag =
 """
 
+    @staticmethod
+    def atomic_write(path, content):
+        """Writes the content to a temporary file, fsyncs it and renames it
+        over path, so readers only ever see the old or the new content.
+        """
+        # A unique temporary file per writer: concurrent inputs may save the
+        # same file (e.g. a shared rate limit budget) at the same time
+        handle, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path) or ".", prefix=os.path.basename(path), suffix=".tmp"
+        )
+        with os.fdopen(handle, "w") as temp_file:
+            temp_file.write(content)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        # os.replace is atomic on Windows too, os.rename is the py2 fallback
+        getattr(os, "replace", os.rename)(temp_path, path)
+
+    @staticmethod
+    def to_int(value, default=None):
+        """Casts an optional input parameter to an integer. Optional
+        parameters are missing or empty on inputs created before they were
+        introduced, in which case the default is returned.
+        """
+        if value is None or str(value).strip() == "":
+            return default
+        return int(value)
+
+    @staticmethod
+    def to_float(value, default=None):
+        """Casts an optional input parameter to a float. See to_int()."""
+        if value is None or str(value).strip() == "":
+            return default
+        return float(value)
+
+    @staticmethod
+    def event_times(entries):
+        """Returns the Event.time of each entry: its @timestamp, or its
+        created_at, converted from epoch milliseconds to seconds with 3
+        decimals. None for an entry with neither, Splunk then extracts its
+        time from the text.
+
+        Args:
+            entries ([list]): AuditLogEntry instances, e.g. a page
+
+        Returns:
+            [list]: Event times, in the order of the entries
+        """
+        times = []
+        for entry in entries:
+            value = entry.timestamp
+            if value is None:
+                value = entry.created_at
+            try:
+                times.append("%.3f" % (float(value) / 1000))
+            except (TypeError, ValueError):
+                times.append(None)
+        return times
+
     @staticmethod
     def splunk_serialize(obj=None):
         if obj is None:
             return ""
-        output = ""
-        for property, value in list(vars(obj).items()):
-            output += "{}={} ".format(property, value)
-        return output
+        # AuditLogEntry has no __dict__, it exposes its fields through items()
+        items = obj.items() if hasattr(obj, "items") else vars(obj).items()
+        return "".join(["{}={} ".format(property, value) for property, value in items])
+
+    @staticmethod
+    def json_serialize(obj=None):
+        """Serializes an entry as compact JSON, keeping the order of its
+        fields. Nested objects stay JSON, unlike in splunk_serialize().
+        """
+        if obj is None:
+            return ""
+        items = obj.items() if hasattr(obj, "items") else vars(obj).items()
+        return _json_encoder.encode(dict(items))
@@ -0,0 +1,72 @@
+"""Stand-ins shared by the unit tests
+"""
+import json
+
+AUDIT_LOG_URL = "https://api.github.com/enterprises/poizen-inc/audit-log"
+
+
+class MockEvent:
+    """Same attributes as splunklib's Event"""
+
+    def __init__(self, data=None, stanza=None, time=None, sourcetype=None, done=True, unbroken=True):
+        self.data = data
+        self.stanza = stanza
+        self.time = time
+        self.sourceType = sourcetype
+        self.source = None
+        self.index = None
+        self.host = None
+        self.done = done
+        self.unbroken = unbroken
+
+
+class MockClock:
+    """Clock moved forward by the tests"""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class MockResponse:
+    """Minimal stand-in for requests.Response, answering with a page of
+    entries. Keyword arguments replace the attributes built from them."""
+
+    def __init__(self, entries=(), after=None, next_cursor=None, status_code=200, **attributes):
+        self.url = "{}?after={}".format(AUDIT_LOG_URL, after or "")
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.encoding = None
+        self.text = json.dumps(list(entries))
+        self.content = self.text.encode("utf-8")
+        self.headers = {
+            "X-RateLimit-Limit": "5000",
+            "X-RateLimit-Remaining": "4955",
+            "X-RateLimit-Reset": "1615036681",
+            "X-RateLimit-Used": "45",
+        }
+        self.links = {"first": {"url": "{}?after=".format(AUDIT_LOG_URL), "rel": "first"}}
+        if next_cursor is not None:
+            self.links["next"] = {
+                "url": "{}?after={}".format(AUDIT_LOG_URL, next_cursor),
+                "rel": "next",
+            }
+        self.closed = False
+        if "content" in attributes and "text" not in attributes:
+            attributes["text"] = attributes["content"]
+        self.__dict__.update(attributes)
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size=1):
+        content = self.content
+        if not isinstance(content, bytes):
+            content = content.encode("utf-8")
+        for index in range(0, len(content), chunk_size):
+            yield content[index : index + chunk_size]
+
+    def close(self):
+        self.closed = True
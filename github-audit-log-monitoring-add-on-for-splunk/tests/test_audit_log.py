@@ -6,16 +6,7 @@ import configparser
 import json
 import hashlib
 from bin.audit_log import AuditLog
-
-
-class MockResponse:
-    """[summary]"""
-
-    def __init__(self, **args):
-        self.__dict__.update(args)
-
-    def json(self):
-        return json.loads(self.content)
+from mocks import MockResponse
 
 
 class TestAuditLog(unittest.TestCase):
@@ -171,6 +162,15 @@ class TestAuditLog(unittest.TestCase):
         for audit_log_entry in audit_log:
             self.assertIn(audit_log_entry.id, expected_entries)
 
+    def test_drop_through(self):
+        self._audit_log.load(self._mock_response)
+        self.assertEqual(self._audit_log.drop_through("45S66REXBCQ9NoQBPDwaGg"), 6)
+        self.assertEqual(self._audit_log.total, 4)
+        self.assertEqual(next(iter(self._audit_log)).id, "1614692663825 - repo.create")
+        # Unknown document ids leave the entries untouched
+        self.assertEqual(self._audit_log.drop_through("unknown"), 0)
+        self.assertEqual(self._audit_log.total, 4)
+
     def test_empty(self):
         self._audit_log.load(self._mock_response)
         audit_log = iter(self._audit_log.empty())
@@ -200,6 +200,77 @@ class TestAuditLog(unittest.TestCase):
         self.assertTrue(audit_log.has_next_page)
         self.assertEqual(audit_log.last_page, expected_last_page)
 
+    def test_etag(self):
+        self.assertIsNone(self._audit_log.etag)
+        self._audit_log.load(self._mock_response)
+        self.assertEqual(self._audit_log.etag, 'W/"randomfuzz"')
+
+    def test_load_stream(self):
+        self._mock_response.encoding = "utf-8"
+        expected = [entry.hash for entry in AuditLog().load(self._mock_response)]
+        audit_log = AuditLog().load(self._mock_response, stream=True)
+        self.assertEqual(audit_log.total, 10)
+        self.assertListEqual([entry.hash for entry in audit_log], expected)
+        self.assertTrue(self._mock_response.closed)
+
+    def test_load_raw(self):
+        self._mock_response.encoding = "utf-8"
+        expected = [entry.document_id for entry in AuditLog().load(self._mock_response)]
+        items = json.loads(self._mock_response.content)
+        for stream in (False, True):
+            audit_log = AuditLog().load(self._mock_response, stream=stream, raw=True)
+            self.assertListEqual([entry.document_id for entry in audit_log], expected)
+            self.assertListEqual([json.loads(entry.raw) for entry in audit_log], items)
+        self.assertEqual(audit_log.byte_size, len(self._mock_response.content))
+
+    def test_dumps_loads(self):
+        self._mock_response.encoding = "utf-8"
+        items = json.loads(self._mock_response.content)
+        for raw in (False, True):
+            audit_log = AuditLog().load(self._mock_response, raw=raw)
+            text = audit_log.dumps()
+            copy = AuditLog().loads(text, raw=raw)
+            self.assertEqual(copy.total, 10)
+            self.assertEqual(copy.byte_size, len(text))
+            self.assertIsNone(copy.page_cursor["next"])
+            self.assertListEqual(
+                [entry.document_id for entry in copy],
+                [entry.document_id for entry in audit_log],
+            )
+        # Raw entries are spooled exactly as received
+        self.assertListEqual(json.loads(text), items)
+
+    def test_batch(self):
+        audit_log = AuditLog().load(self._mock_response)
+        self.assertEqual(len(audit_log.batch), 10)
+        self.assertEqual(audit_log.batch.count_by("action")["git.fetch"], 4)
+        removed = audit_log.deduplicate(set(["647L4QpGUkUrVOlFf5VWEQ==", "wDFUFkZDYEac1CtSfJ61zg"]))
+        self.assertEqual(removed, 2)
+        self.assertEqual(audit_log.total, 8)
+        # Rebuilt after the entries changed
+        self.assertEqual(len(audit_log.batch), 8)
+        # Iterating still yields the entries
+        self.assertEqual(len(list(audit_log)), 8)
+
+    def test_pages(self):
+        audit_log = AuditLog()
+        audit_log.load(self._mock_response)
+        audit_log.load(self._mock_response)
+        page_size = len(self._mock_response.content)
+        self.assertEqual(audit_log.page_count, 2)
+        self.assertEqual(audit_log.total, 20)
+        self.assertEqual(audit_log.byte_size, 2 * page_size)
+        # Whole pages are popped, only the page the cut falls in is sliced
+        self.assertEqual(audit_log.drop_from_start(13), 13)
+        self.assertEqual(audit_log.page_count, 1)
+        self.assertEqual(audit_log.total, 7)
+        self.assertEqual(audit_log.byte_size, page_size * 7 // 10)
+        self.assertEqual(next(iter(audit_log)).id, "1614692691041 - git.clone")
+        self.assertEqual(len(audit_log.pop_page()), 7)
+        self.assertEqual(audit_log.total, 0)
+        self.assertEqual(audit_log.byte_size, 0)
+        self.assertIsNone(audit_log.pop_page())
+
     def test_loop_iterator(self):
         audit_log = iter(self._audit_log)
         audit_log.load(self._mock_response)
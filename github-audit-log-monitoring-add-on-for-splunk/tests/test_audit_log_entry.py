@@ -20,3 +20,59 @@ class TestAuditLogEntry(unittest.TestCase):
         expected_output = "wSuRpMciieZn4qkaR4YUtg"
         entry = AuditLogEntry(**mock_entry)
         self.assertEqual(entry.document_id, expected_output)
+
+    def test_fields(self):
+        mock_entry = {
+            "@timestamp": 1614693008148,
+            "actor": "Link-",
+            "business": "poizen-inc",
+            "action": "org.update_member",
+            "user": "Link-",
+            "_document_id": "m-_x7LGec_iesTK56lXGgQ",
+        }
+        entry = AuditLogEntry.from_dict(mock_entry)
+        self.assertEqual(entry.timestamp, 1614693008148)
+        self.assertEqual(entry.actor, "Link-")
+        self.assertEqual(entry.org, "poizen-inc")
+        self.assertIsNone(entry.repo)
+        self.assertEqual(entry.business, "poizen-inc")
+        self.assertEqual(entry["user"], "Link-")
+        self.assertIn("user", entry)
+        self.assertEqual(repr(entry), "1614693008148 - org.update_member")
+        with self.assertRaises(AttributeError):
+            entry.repository
+        # Keys keep the order they were received in
+        self.assertListEqual(list(entry.items()), list(mock_entry.items()))
+        self.assertDictEqual(entry.to_dict(), mock_entry)
+
+    def test_shared_shape(self):
+        first = AuditLogEntry.from_dict({"action": "git.clone", "_document_id": "a"})
+        second = AuditLogEntry.from_dict({"action": "git.fetch", "_document_id": "b"})
+        self.assertIs(first._shape, second._shape)
+        self.assertFalse(hasattr(first, "__dict__"))
+        self.assertEqual(second.document_id, "b")
+
+    def test_hash_cached(self):
+        mock_entry = {"@timestamp": "1614697638660", "action": "git.fetch", "repo": "org-demo/public-repo"}
+        entry = AuditLogEntry.from_dict(mock_entry)
+        self.assertIsNone(entry._hash)
+        expected_output = hashlib.md5(
+            json.dumps(mock_entry, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        self.assertEqual(entry.document_id, expected_output)
+        self.assertEqual(entry._hash, expected_output)
+        self.assertEqual(entry.hash, expected_output)
+
+    def test_from_raw(self):
+        mock_entry = {"@timestamp": 1614697638660, "action": "git.fetch", "repo": "org-demo/public-repo"}
+        raw = json.dumps(mock_entry)
+        entry = AuditLogEntry.from_raw(mock_entry, raw)
+        self.assertEqual(entry.raw, raw)
+        self.assertEqual(entry.id, "1614697638660 - git.fetch")
+        self.assertNotIn("repo", entry)
+        # The fallback document id is the one of the whole entry
+        self.assertEqual(entry.document_id, AuditLogEntry.from_dict(mock_entry).document_id)
+        entry = AuditLogEntry.from_raw(dict(mock_entry, _document_id="a"), raw)
+        self.assertEqual(entry.document_id, "a")
+        self.assertIsNone(AuditLogEntry.from_dict(mock_entry).raw)
+
@@ -0,0 +1,100 @@
+"""Unit tests for the backfill class
+"""
+import datetime
+import unittest
+import configparser
+import requests
+from bin.audit_log import AuditLog
+from bin.backfill import Backfill
+from mocks import MockResponse
+
+
+class MockGitHub:
+    """Serves two pages per window: the first one with a next cursor"""
+
+    def __init__(self):
+        self.calls = []
+        # Error raised by the first page of a window, by window
+        self.errors = {}
+
+    def iter_enterprise_audit_log(self, page_cursor=None, phrase=None, **kwargs):
+        self.calls.append((phrase, page_cursor))
+        window = phrase.split(":", 1)[1]
+        if window in self.errors:
+            raise self.errors[window]
+        entries = [
+            {"@timestamp": 1, "action": "repo.create", "_document_id": "{}-{}".format(window, i)}
+            for i in range(3)
+        ]
+        # Windows overlap on their boundaries
+        entries.append({"@timestamp": 1, "action": "repo.create", "_document_id": "boundary"})
+        if page_cursor is None:
+            yield AuditLog().load(MockResponse(entries, next_cursor="{}-next".format(window)))
+        else:
+            yield AuditLog().load(MockResponse(entries, after=page_cursor))
+
+
+class TestBackfill(unittest.TestCase):
+    """Set of unit tests for the Backfill class"""
+
+    def setUp(self):
+        self.state = configparser.ConfigParser()
+        self.state.read_string("[input]\npage_cursor =\n")
+        self.github = MockGitHub()
+        self.backfill = Backfill(
+            self.github, self.state, start="2021-01-01", window_days=7, workers=2
+        )
+
+    def test_plan(self):
+        windows = self.backfill.plan(today=datetime.date(2021, 1, 20))
+        self.assertListEqual(
+            windows,
+            ["2021-01-01..2021-01-07", "2021-01-08..2021-01-14", "2021-01-15..*"],
+        )
+        self.assertFalse(self.backfill.completed)
+        # The plan is kept for the same start date
+        self.assertListEqual(self.backfill.plan(today=datetime.date(2021, 3, 1)), windows)
+
+    def test_run_until_completed(self):
+        self.backfill.plan(today=datetime.date(2021, 1, 20))
+        results = self.backfill.run()
+        self.assertListEqual(
+            [window for window, _ in results],
+            ["2021-01-01..2021-01-07", "2021-01-08..2021-01-14"],
+        )
+        entries = [entry.document_id for entry in Backfill.merge(results)]
+        self.assertEqual(len(entries), 7)
+        self.assertEqual(entries.count("boundary"), 1)
+        self.assertIsNone(self.backfill.checkpoint(results))
+        self.assertEqual(
+            self.state.get("backfill", "2021-01-01..2021-01-07"),
+            "2021-01-01..2021-01-07-next",
+        )
+        heads = []
+        while not self.backfill.completed:
+            heads.append(self.backfill.checkpoint(self.backfill.run()))
+        self.assertIn(("created:2021-01-08..2021-01-14", "2021-01-08..2021-01-14-next"), self.github.calls)
+        head = [page for page in heads if page is not None][0]
+        self.assertEqual(head.page_cursor["last"], "2021-01-15..*-next")
+        self.assertListEqual(self.backfill.pending(), [])
+
+    def test_failed_window(self):
+        self.backfill = Backfill(
+            self.github, self.state, start="2021-01-01", window_days=7, workers=3
+        )
+        self.backfill.plan(today=datetime.date(2021, 1, 20))
+        self.github.errors["2021-01-01..2021-01-07"] = RuntimeError("status_code: 502")
+        self.github.errors["2021-01-15..*"] = requests.exceptions.ConnectionError()
+        results = self.backfill.run()
+        self.assertListEqual([len(pages) for _, pages in results], [0, 1, 0])
+        self.assertIsNone(self.backfill.checkpoint(results))
+        # The other window is checkpointed, the failed one is retried
+        self.assertEqual(
+            self.state.get("backfill", "2021-01-08..2021-01-14"),
+            "2021-01-08..2021-01-14-next",
+        )
+        self.assertListEqual(
+            self.backfill.pending(),
+            ["2021-01-01..2021-01-07", "2021-01-08..2021-01-14", "2021-01-15..*"],
+        )
+        self.assertEqual(self.state.get("backfill", "2021-01-01..2021-01-07"), "")
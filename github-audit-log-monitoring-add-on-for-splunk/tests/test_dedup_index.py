@@ -0,0 +1,82 @@
+"""Unit tests for the DedupIndex class
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from bin.dedup_index import DedupIndex
+from mocks import MockClock
+
+
+class MockEntry:
+    def __init__(self, document_id):
+        self.document_id = document_id
+
+
+class TestDedupIndex(unittest.TestCase):
+    """Set of unit tests for the DedupIndex class"""
+
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+        self._path = os.path.join(self._directory, "poizen-inc_dedup.json")
+        self._clock = MockClock(36000.0)
+
+    def tearDown(self):
+        shutil.rmtree(self._directory)
+
+    def test_add(self):
+        dedup_index = DedupIndex(clock=self._clock)
+        self.assertEqual(dedup_index.add_entries([MockEntry("a"), MockEntry("b")]), 2)
+        dedup_index.add("c")
+        self.assertIn("a", dedup_index)
+        self.assertIn("c", dedup_index)
+        self.assertNotIn("d", dedup_index)
+        self.assertEqual(len(dedup_index), 3)
+
+    def test_evict_by_age(self):
+        dedup_index = DedupIndex(max_age=7200, clock=self._clock)
+        dedup_index.add("old")
+        self._clock.now += 3600
+        dedup_index.add("recent")
+        # Written again: the id moves to the newest bucket
+        dedup_index.add("old")
+        self._clock.now += 3600
+        dedup_index.add("new")
+        self._clock.now += 3600
+        self.assertEqual(dedup_index.evict(), 0)
+        self._clock.now += 3600
+        self.assertEqual(dedup_index.evict(), 2)
+        self.assertListEqual(sorted(dedup_index._ids), ["new"])
+
+    def test_evict_by_size(self):
+        dedup_index = DedupIndex(max_ids=3, clock=self._clock)
+        dedup_index.add("a")
+        self._clock.now += 3600
+        dedup_index.add("b")
+        dedup_index.add("c")
+        self._clock.now += 3600
+        dedup_index.add("d")
+        # Whole buckets are evicted, oldest first
+        self.assertEqual(dedup_index.evict(), 1)
+        self.assertListEqual(sorted(dedup_index._ids), ["b", "c", "d"])
+
+    def test_save_load(self):
+        dedup_index = DedupIndex(path=self._path, clock=self._clock)
+        dedup_index.add_entries([MockEntry("a"), MockEntry("b")])
+        dedup_index.save()
+        loaded = DedupIndex(path=self._path, clock=self._clock).load()
+        self.assertIn("a", loaded)
+        self.assertIn("b", loaded)
+        # Expired once loaded a day later
+        self._clock.now += 86400 + 3600
+        self.assertEqual(len(DedupIndex(path=self._path, clock=self._clock).load()), 0)
+
+    def test_load_missing_or_corrupt(self):
+        self.assertEqual(len(DedupIndex(path=self._path).load()), 0)
+        with open(self._path, "w") as index_file:
+            index_file.write('{"buckets": {"10": ["a", ')
+        self.assertEqual(len(DedupIndex(path=self._path).load()), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+"""Unit tests for the event writers
+"""
+import io
+import threading
+import unittest
+from bin.event_writers import SynchronizedEventWriter, BufferedEventWriter
+from mocks import MockEvent
+
+
+class MockEventWriter:
+    """Fails if two threads write at the same time"""
+
+    def __init__(self):
+        self.events = []
+        self.flushes = 0
+        self.active = 0
+        self.overlaps = 0
+
+    def write_event(self, event):
+        self.active += 1
+        if self.active > 1:
+            self.overlaps += 1
+        # Yield to the other threads while "writing"
+        threading.Event().wait(0.001)
+        self.events.append(event)
+        self.active -= 1
+
+    def flush(self):
+        self.flushes += 1
+
+
+class TestSynchronizedEventWriter(unittest.TestCase):
+    """Set of unit tests for the SynchronizedEventWriter class"""
+
+    def test_write_event(self):
+        event_writer = MockEventWriter()
+        writer = SynchronizedEventWriter(event_writer)
+
+        def write(prefix):
+            for index in range(20):
+                writer.write_event("{}-{}".format(prefix, index))
+            writer.flush()
+
+        threads = [threading.Thread(target=write, args=(name,)) for name in "abcd"]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(event_writer.events), 80)
+        self.assertEqual(event_writer.overlaps, 0)
+        self.assertEqual(event_writer.flushes, 4)
+
+
+class MockOutput(io.StringIO):
+    def __init__(self):
+        io.StringIO.__init__(self)
+        self.flushes = 0
+
+    def flush(self):
+        self.flushes += 1
+
+
+class TestBufferedEventWriter(unittest.TestCase):
+    """Set of unit tests for the BufferedEventWriter class"""
+
+    def setUp(self):
+        self._now = [0.0]
+        self._output = MockOutput()
+        self._writer = BufferedEventWriter(
+            output=self._output, max_bytes=1024, max_delay=5, clock=lambda: self._now[0]
+        )
+
+    def test_render(self):
+        # Same XML as Event.write_to()
+        event = MockEvent(
+            data='a<b & "c" \u00e9',
+            stanza='ghe_audit_log_monitoring://poizen "inc"',
+            time="1614692646.036",
+            sourcetype="ghe_audit_log_monitoring:json",
+        )
+        self.assertEqual(
+            self._writer.render(event),
+            '<event stanza="ghe_audit_log_monitoring://poizen &quot;inc&quot;" unbroken="1">'
+            "<time>1614692646.036</time><sourcetype>ghe_audit_log_monitoring:json</sourcetype>"
+            '<data>a&lt;b &amp; "c" &#233;</data><done /></event>',
+        )
+        self.assertEqual(
+            self._writer.render(MockEvent(data="", done=False, unbroken=False)),
+            '<event unbroken="0"><data /></event>',
+        )
+        with self.assertRaises(ValueError):
+            self._writer.render(MockEvent(stanza="s"))
+
+    def test_flush_by_size(self):
+        for index in range(20):
+            self._writer.write_event(MockEvent(data="x" * 90, stanza="s"))
+        # 20 events of ~130 characters, written once 1024 are buffered
+        self.assertEqual(self._output.flushes, 2)
+        self.assertTrue(0 < self._writer.buffered < 1024)
+        self._writer.close()
+        self.assertEqual(self._writer.buffered, 0)
+        output = self._output.getvalue()
+        self.assertTrue(output.startswith("<stream><event "))
+        self.assertTrue(output.endswith("</event></stream>"))
+        self.assertEqual(output.count("<event "), 20)
+
+    def test_flush_by_time(self):
+        self._writer.write_event(MockEvent(data="a", stanza="s"))
+        self.assertEqual(self._output.flushes, 0)
+        self._now[0] = 5.0
+        self._writer.write_event(MockEvent(data="b", stanza="s"))
+        self.assertEqual(self._output.flushes, 1)
+        self.assertEqual(self._output.getvalue().count("<event "), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,261 @@
+"""Unit tests for the checkpoints of the modular input, polling an in-memory
+stand-in for the audit log API
+"""
+import os
+import json
+import shutil
+import hashlib
+import calendar
+import datetime
+import tempfile
+import unittest
+from bin.ghe_audit_log_monitoring import MyScript
+from bin.rest_client import GitHub
+from mocks import MockResponse
+
+
+class MockAuditLogAPI:
+    """Session answering the audit log requests like the REST API: per_page
+    entries a page, oldest first, filtered by the created: qualifier of the
+    phrase. The after cursors are only valid with the phrase they were
+    returned for, and the ETag covers the body of the page."""
+
+    def __init__(self):
+        self.entries = []
+        self.calls = []
+
+    def add(self, day, count):
+        """Appends count entries created on day"""
+        timestamp = calendar.timegm(day.timetuple()) * 1000
+        for index in range(len(self.entries), len(self.entries) + count):
+            self.entries.append(
+                {
+                    "@timestamp": timestamp + index,
+                    "action": "repo.create",
+                    "_document_id": "doc-{}".format(index),
+                    "created": day.isoformat(),
+                }
+            )
+
+    def select(self, phrase):
+        if not phrase:
+            return self.entries
+        start, end = phrase[len("created:") :].split("..")
+        return [
+            entry
+            for entry in self.entries
+            if entry["created"] >= start and (end == "*" or entry["created"] <= end)
+        ]
+
+    def get(self, url, params=None, headers=None, **kwargs):
+        self.calls.append(dict(params))
+        phrase = params["phrase"]
+        entries = self.select(phrase)
+        document_ids = [entry["_document_id"] for entry in entries]
+        position = 0
+        if params["after"]:
+            cursor_phrase, _, document_id = params["after"].rpartition("|")
+            if cursor_phrase != phrase or document_id not in document_ids:
+                return MockResponse(status_code=422, after=params["after"])
+            position = document_ids.index(document_id) + 1
+        end = position + int(params["per_page"])
+        page = entries[position:end]
+        next_cursor = None
+        if end < len(entries):
+            next_cursor = "{}|{}".format(phrase, page[-1]["_document_id"])
+        response = MockResponse(page, after=params["after"], next_cursor=next_cursor)
+        response.headers["ETag"] = '"{}"'.format(
+            hashlib.md5(response.content).hexdigest()
+        )
+        if (headers or {}).get("If-None-Match") == response.headers["ETag"]:
+            return MockResponse(status_code=304, after=params["after"])
+        return response
+
+    def close(self):
+        pass
+
+
+class MockCrash(Exception):
+    pass
+
+
+class MockEventWriter:
+    """Records the document ids of the events written. Writing the event of
+    crash_at fails, once, like a process killed mid-page."""
+
+    def __init__(self, crash_at=None):
+        self.document_ids = []
+        self.crash_at = crash_at
+
+    def write_event(self, event):
+        document_id = json.loads(event.data)["_document_id"]
+        if document_id == self.crash_at:
+            self.crash_at = None
+            raise MockCrash(document_id)
+        self.document_ids.append(document_id)
+
+    def flush(self):
+        pass
+
+
+class TestMyScript(unittest.TestCase):
+    """Set of unit tests for the polls of the MyScript class"""
+
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+        self.api = MockAuditLogAPI()
+        self.writer = MockEventWriter()
+        self.today = datetime.datetime.utcnow().date()
+        self._crashed = 0
+
+    def tearDown(self):
+        shutil.rmtree(self._directory)
+
+    def script(self, **input_items):
+        """MyScript polling poizen-inc, as a new process would"""
+        script = MyScript()
+        script.state_file_path = lambda file_name: os.path.join(
+            self._directory, file_name
+        )
+        script.input_name = "ghe_audit_log_monitoring://poizen-inc"
+        script.input_items = dict({"output_mode": "json"}, **input_items)
+        script.type = "enterprises"
+        script.enterprise = "poizen-inc"
+        script.max_entries = 1000
+        return script
+
+    def poll(self, script):
+        """Polls once, returns the state of the enterprise"""
+        script.state = script.load_state(script.enterprise)
+        github = GitHub(
+            "api.github.com",
+            "token",
+            max_entries=script.max_entries,
+            session=self.api,
+            sleep=lambda seconds: None,
+        )
+        script.poll_audit_log(github, self.writer)
+        return script.state
+
+    def test_backfill_single_page_head(self):
+        # More history than a page before the backfill start
+        self.api.add(self.today - datetime.timedelta(days=30), 150)
+        self.api.add(self.today - datetime.timedelta(days=1), 5)
+        start = (self.today - datetime.timedelta(days=3)).isoformat()
+        script = self.script(backfill_start=start)
+        state = self.poll(script)
+        self.assertEqual(state.get("backfill", "completed"), "1")
+        self.assertListEqual(
+            self.writer.document_ids, ["doc-{}".format(i) for i in range(150, 155)]
+        )
+        # Nothing new
+        state = self.poll(self.script(backfill_start=start))
+        self.assertEqual(len(self.writer.document_ids), 5)
+        self.assertEqual(self.api.calls[-1]["phrase"], "created:{}..*".format(start))
+        self.api.add(self.today, 3)
+        self.poll(self.script(backfill_start=start))
+        self.assertListEqual(
+            self.writer.document_ids, ["doc-{}".format(i) for i in range(150, 158)]
+        )
+
+    def test_etag(self):
+        self.api.add(self.today, 5)
+        state = self.poll(self.script())
+        self.assertTrue(state.get("input", "etag"))
+        # Not modified
+        self.poll(self.script())
+        self.assertEqual(len(self.writer.document_ids), 5)
+        self.api.add(self.today, 1)
+        self.poll(self.script())
+        self.assertEqual(self.writer.document_ids[-1], "doc-5")
+
+    def test_etag_full_last_page(self):
+        self.api.add(self.today, GitHub.PER_PAGE)
+        state = self.poll(self.script())
+        # Newer entries won't change this page
+        self.assertEqual(state.get("input", "etag"), "")
+        self.api.add(self.today, 5)
+        self.poll(self.script())
+        self.assertListEqual(
+            self.writer.document_ids,
+            ["doc-{}".format(i) for i in range(GitHub.PER_PAGE + 5)],
+        )
+
+    def resumed(self):
+        """Document ids written since the last crash"""
+        return self.writer.document_ids[self._crashed :]
+
+    def crash(self, script, document_id):
+        """Polls until writing the event of document_id fails"""
+        self.writer.crash_at = document_id
+        with self.assertRaises(MockCrash):
+            self.poll(script)
+        self._crashed = len(self.writer.document_ids)
+        self.api.calls = []
+
+    def test_crash_between_pages(self):
+        self.api.add(self.today, 250)
+        self.crash(self.script(), "doc-150")
+        self.poll(self.script())
+        # Resumed after the last page committed: the page in flight is
+        # written again, and only that one
+        self.assertEqual(self.api.calls[0]["after"], "|doc-99")
+        self.assertListEqual(
+            self.resumed(), ["doc-{}".format(i) for i in range(100, 250)]
+        )
+
+    def test_spool_replay(self):
+        self.api.add(self.today, 250)
+        self.crash(self.script(spool="1"), "doc-150")
+        state = self.poll(self.script(spool="1"))
+        # The page spooled is written from the spool, not fetched again
+        self.assertEqual(self.api.calls[0]["after"], "|doc-199")
+        self.assertListEqual(
+            self.resumed(), ["doc-{}".format(i) for i in range(100, 250)]
+        )
+        self.assertTrue(state.has_section("spool"))
+        self.poll(self.script(spool="1"))
+        self.assertEqual(len(self.resumed()), 150)
+
+    def test_import_state_conf(self):
+        self.api.add(self.today, 150)
+        with open(os.path.join(self._directory, "poizen-inc_state.conf"), "w") as conf:
+            conf.write(
+                "[input]\npat_credential_id = pat\npage_cursor = |doc-99\n"
+                "last_document_id = doc-119\nlast_count = 100\netag =\n"
+            )
+        state = self.poll(self.script())
+        self.assertEqual(self.api.calls[0]["after"], "|doc-99")
+        self.assertListEqual(
+            self.writer.document_ids, ["doc-{}".format(i) for i in range(120, 150)]
+        )
+        self.assertEqual(state.get("input", "pat_credential_id"), "pat")
+        self.assertTrue(
+            os.path.exists(os.path.join(self._directory, "poizen-inc_state.json"))
+        )
+        # Imported once, the state store takes over
+        self.api.add(self.today, 1)
+        self.poll(self.script())
+        self.assertEqual(self.writer.document_ids[-1], "doc-150")
+        self.assertEqual(len(self.writer.document_ids), 31)
+
+    def test_backfill_handoff(self):
+        self.api.add(self.today - datetime.timedelta(days=30), 150)
+        self.api.add(self.today - datetime.timedelta(days=20), 30)
+        self.api.add(self.today - datetime.timedelta(days=1), 150)
+        start = (self.today - datetime.timedelta(days=20)).isoformat()
+        script = self.script(backfill_start=start, backfill_window_days="7")
+        while not self.poll(script).get("backfill", "completed") == "1":
+            script = self.script(backfill_start=start, backfill_window_days="7")
+        self.api.add(self.today, 3)
+        self.poll(self.script(backfill_start=start, backfill_window_days="7"))
+        # The regular poll resumes on the second page of the head window
+        self.assertTrue(self.api.calls[-1]["after"].endswith("|doc-279"))
+        self.assertListEqual(
+            sorted(self.writer.document_ids, key=lambda id: int(id[4:])),
+            ["doc-{}".format(i) for i in range(150, 333)],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,193 @@
+"""Unit tests for the HTTP Event Collector event writer, against a local
+stand-in collector
+"""
+import gzip
+import json
+import threading
+import time
+import unittest
+from bin.hec import HECEventWriter, HECError
+from mocks import MockEvent
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+
+class MockCollector(ThreadingMixIn, HTTPServer):
+    """Records the batches posted, answers with an ackId per batch and
+    acknowledges the batches once acked_after ack queries were made"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ("127.0.0.1", 0), MockCollectorHandler)
+        self.lock = threading.Lock()
+        self.batches = []
+        self.headers = []
+        self.statuses = []
+        self.ack_queries = 0
+        self.acked_after = 0
+        self.delay = 0
+        self.active = 0
+        self.max_active = 0
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self.server_address[1])
+
+
+class MockCollectorHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body):
+        content = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        with server.lock:
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        time.sleep(server.delay)
+        with server.lock:
+            server.active -= 1
+            if self.path.startswith("/services/collector/ack"):
+                server.ack_queries += 1
+                acked = server.ack_queries > server.acked_after
+                acks = json.loads(body.decode("utf-8"))["acks"]
+                return self.reply(200, {"acks": dict((str(ack), acked) for ack in acks)})
+            if server.statuses:
+                status = server.statuses.pop(0)
+                return self.reply(status, {"text": "Server is busy", "code": 9})
+            server.headers.append(dict(self.headers))
+            events = [json.loads(line) for line in body.decode("utf-8").split("\n")]
+            server.batches.append(events)
+            return self.reply(200, {"text": "Success", "code": 0, "ackId": len(server.batches) - 1})
+
+
+class TestHECEventWriter(unittest.TestCase):
+    """Set of unit tests for the HECEventWriter class"""
+
+    def setUp(self):
+        self._collector = MockCollector()
+        self._thread = threading.Thread(target=self._collector.serve_forever, args=(0.01,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def tearDown(self):
+        self._collector.shutdown()
+        self._collector.server_close()
+
+    def writer(self, **kwargs):
+        kwargs.setdefault("sleep", lambda seconds: None)
+        return HECEventWriter(self._collector.url, "00000000-token", **kwargs)
+
+    def test_batches(self):
+        writer = self.writer(batch_size=3)
+        writer.add_input("ghe_audit_log_monitoring://poizen-inc", {"index": "github", "sourcetype": "ghe", "host": "hf1"})
+        writer.add_input("ghe_audit_log_monitoring://other", {"index": "default"})
+        for index in range(7):
+            writer.write_event(
+                MockEvent(
+                    data='{"action":"git.fetch","n":%d}' % index,
+                    stanza="ghe_audit_log_monitoring://poizen-inc",
+                    time="1614692646.%03d" % index,
+                )
+            )
+        writer.write_event(MockEvent(data="action=git.clone ", stanza="ghe_audit_log_monitoring://other"))
+        writer.close()
+        batches = self._collector.batches
+        self.assertListEqual(sorted(len(batch) for batch in batches), [2, 3, 3])
+        self.assertEqual(writer.stats["events"], 8)
+        events = sorted(
+            (event for batch in batches for event in batch), key=lambda event: event["event"]
+        )
+        self.assertDictEqual(
+            events[-1],
+            {
+                "time": "1614692646.006",
+                "host": "hf1",
+                "source": "ghe_audit_log_monitoring://poizen-inc",
+                "sourcetype": "ghe",
+                "index": "github",
+                "event": '{"action":"git.fetch","n":6}',
+            },
+        )
+        # The default index is the token's one
+        self.assertDictEqual(
+            events[0], {"source": "ghe_audit_log_monitoring://other", "event": "action=git.clone "}
+        )
+        headers = self._collector.headers[0]
+        self.assertEqual(headers["Authorization"], "Splunk 00000000-token")
+        self.assertEqual(headers["Content-Encoding"], "gzip")
+
+    def test_set_token(self):
+        writer = HECEventWriter(self._collector.url)
+        self.assertFalse(writer.has_token)
+        # Read from the password storage once the session key is known
+        writer.set_token("11111111-token")
+        self.assertTrue(writer.has_token)
+        writer.write_event(MockEvent(data="a", stanza="s"))
+        writer.flush()
+        self.assertEqual(self._collector.headers[0]["Authorization"], "Splunk 11111111-token")
+
+    def test_in_flight(self):
+        self._collector.delay = 0.05
+        writer = self.writer(batch_size=1, max_in_flight=2)
+        for index in range(6):
+            writer.write_event(MockEvent(data=str(index), stanza="s"))
+        writer.flush()
+        self.assertEqual(len(self._collector.batches), 6)
+        self.assertEqual(self._collector.max_active, 2)
+
+    def test_retries(self):
+        self._collector.statuses = [503, 503]
+        writer = self.writer()
+        writer.write_event(MockEvent(data="a", stanza="s"))
+        writer.flush()
+        self.assertEqual(len(self._collector.batches), 1)
+        self.assertEqual(writer.stats["retries"], 2)
+        # Client errors are not retried
+        self._collector.statuses = [400]
+        writer.write_event(MockEvent(data="b", stanza="s"))
+        with self.assertRaises(HECError):
+            writer.flush()
+        self.assertEqual(len(self._collector.batches), 1)
+
+    def test_acks(self):
+        self._collector.acked_after = 2
+        writer = self.writer(batch_size=2, use_ack=True)
+        for index in range(5):
+            writer.write_event(MockEvent(data=str(index), stanza="s"))
+        writer.flush()
+        self.assertEqual(self._collector.ack_queries, 3)
+        self.assertEqual(len(self._collector.batches), 3)
+
+    def test_ack_timeout(self):
+        self._collector.acked_after = 1000
+        now = [0.0]
+
+        def sleep(seconds):
+            now[0] += seconds
+
+        writer = self.writer(use_ack=True, ack_timeout=10, sleep=sleep, clock=lambda: now[0])
+        writer.write_event(MockEvent(data="a", stanza="s"))
+        with self.assertRaises(HECError):
+            writer.flush()
+        self.assertGreaterEqual(now[0], 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
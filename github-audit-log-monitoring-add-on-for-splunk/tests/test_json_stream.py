@@ -0,0 +1,69 @@
+"""Unit tests for the incremental JSON decoder
+"""
+import json
+import unittest
+from bin.json_stream import JSONArrayDecoder, iter_json_array
+
+
+def chunked(body, size):
+    return [body[index : index + size] for index in range(0, len(body), size)]
+
+
+class TestJSONStream(unittest.TestCase):
+    """Set of unit tests for the json_stream module"""
+
+    def setUp(self):
+        self._items = [
+            {
+                "@timestamp": 1614692646036 + index,
+                "action": "git.clone",
+                "actor": "béatrice-☃",
+                "_document_id": "doc-{}".format(index),
+                "nested": {"list": [1, 2.5, None, True], "text": "a,b]c"},
+            }
+            for index in range(25)
+        ]
+        self._body = json.dumps(self._items, ensure_ascii=False).encode("utf-8")
+
+    def test_chunk_sizes(self):
+        # Chunks of 1 byte split the multi-byte characters
+        for size in (1, 7, 64, len(self._body)):
+            self.assertListEqual(
+                list(iter_json_array(chunked(self._body, size))), self._items
+            )
+
+    def test_yields_incrementally(self):
+        decoder = JSONArrayDecoder()
+        half = len(self._body) // 2
+        first = decoder.feed(self._body[:half])
+        self.assertTrue(0 < len(first) < len(self._items))
+        self.assertListEqual(first + decoder.feed(self._body[half:]) + decoder.close(), self._items)
+        self.assertTrue(decoder.done)
+
+    def test_numbers_split_across_chunks(self):
+        self.assertListEqual(list(iter_json_array([b"[12", b"34, 5", b"6]"])), [1234, 56])
+
+    def test_empty(self):
+        self.assertListEqual(list(iter_json_array([b" [", b" ] "])), [])
+
+    def test_truncated(self):
+        with self.assertRaises(ValueError):
+            list(iter_json_array(chunked(self._body[:-10], 16)))
+        with self.assertRaises(ValueError):
+            list(iter_json_array([b""]))
+
+    def test_raw(self):
+        body = b'[ {"a": 1,  "b": "\xc3\xa9"} ,{"a":2}]'
+        pairs = list(iter_json_array(chunked(body, 3), raw=True))
+        self.assertListEqual(
+            pairs,
+            [({"a": 1, "b": u"\u00e9"}, u'{"a": 1,  "b": "\u00e9"}'), ({"a": 2}, u'{"a":2}')],
+        )
+
+    def test_not_an_array(self):
+        with self.assertRaises(ValueError):
+            list(iter_json_array([b'{"message": "Not Found"}']))
+
+
+if __name__ == "__main__":
+    unittest.main()
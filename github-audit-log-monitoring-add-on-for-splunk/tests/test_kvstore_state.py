@@ -0,0 +1,198 @@
+"""Unit tests for the KVStoreBatcher and KVStoreStateStore classes, against
+an in-memory stand-in for splunklib's KVStoreCollectionData
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from bin.kvstore_state import KVStoreBatcher, KVStoreStateStore
+from mocks import MockClock
+
+
+class MockHTTPError(Exception):
+    def __init__(self, status):
+        Exception.__init__(self, "HTTP {}".format(status))
+        self.status = status
+
+
+class MockCollectionData:
+    """Same batch_save and query_by_id as KVStoreCollectionData"""
+
+    def __init__(self):
+        self.documents = {}
+        self.requests = 0
+        self.down = False
+
+    def batch_save(self, *documents):
+        if self.down:
+            raise MockHTTPError(503)
+        self.requests += 1
+        for document in documents:
+            self.documents[document["_key"]] = dict(document)
+        return []
+
+    def query_by_id(self, id):
+        if self.down:
+            raise MockHTTPError(503)
+        if id not in self.documents:
+            raise MockHTTPError(404)
+        return dict(self.documents[id])
+
+
+class MockService:
+    """kvstore of a splunklib Service, whose app-scoped collections are only
+    found in the namespace of their app"""
+
+    def __init__(self, collections, owner=None, app=None):
+        self._collections = collections
+        self._namespace = (owner, app)
+
+    @property
+    def kvstore(self):
+        return dict(
+            (name, collection)
+            for (name, namespace), collection in self._collections.items()
+            if namespace == self._namespace
+        )
+
+
+class MockCollection:
+    def __init__(self, data):
+        self.data = data
+
+
+class TestKVStoreStateStore(unittest.TestCase):
+    """Set of unit tests for the KVStoreStateStore class"""
+
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+        self._collection = MockCollectionData()
+        self._clock = MockClock()
+
+    def tearDown(self):
+        shutil.rmtree(self._directory)
+
+    def node(self, name):
+        """State store of poizen-inc on a node with its own state directory"""
+        directory = os.path.join(self._directory, name)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        batcher = KVStoreBatcher(self._collection, flush_seconds=30, clock=self._clock)
+        state = KVStoreStateStore(os.path.join(directory, "poizen-inc_state"), batcher, "poizen-inc")
+        if not state.exists:
+            state.compact()
+        return state.load(), batcher
+
+    def test_batched_commits(self):
+        state, batcher = self.node("hf1")
+        state.add_section("input")
+        for index in range(5):
+            state.set("input", "page_cursor", "c{}".format(index))
+            state.save()
+        # Committed locally, not saved to the KV Store yet
+        self.assertEqual(self._collection.requests, 0)
+        self.assertEqual(len(batcher), 1)
+        self._clock.now = 31
+        state.set("input", "page_cursor", "c5")
+        state.save()
+        self.assertEqual(self._collection.requests, 1)
+        document = self._collection.documents["poizen-inc"]
+        self.assertEqual(document["sequence"], 6)
+        self.assertEqual(document["sections"]["input"]["page_cursor"], "c5")
+        # Nothing changed, nothing staged
+        state.save()
+        self.assertEqual(len(batcher), 0)
+
+    def test_failover(self):
+        state, batcher = self.node("hf1")
+        state.add_section("input")
+        state.set("input", "page_cursor", "c1")
+        state.save()
+        state.set("input", "page_cursor", "c2")
+        state.save()
+        batcher.flush()
+        # hf1 commits one more page that never reaches the KV Store
+        state.set("input", "page_cursor", "c3")
+        state.save()
+        other, _ = self.node("hf2")
+        self.assertTrue(other.restored)
+        self.assertEqual(other.get("input", "page_cursor"), "c2")
+        other.set("input", "page_cursor", "c4")
+        other.save()
+        # Taken from the local cache on the next load
+        other, _ = self.node("hf2")
+        self.assertFalse(other.restored)
+        self.assertEqual(other.get("input", "page_cursor"), "c4")
+        # Failing back: hf1 is behind once hf2's commits are saved
+        other.set("input", "page_cursor", "c5")
+        other.save()
+        _.flush()
+        state, _ = self.node("hf1")
+        self.assertTrue(state.restored)
+        self.assertEqual(state.get("input", "page_cursor"), "c5")
+
+    def test_kvstore_down(self):
+        state, batcher = self.node("hf1")
+        self._collection.down = True
+        state.add_section("input")
+        state.set("input", "page_cursor", "c1")
+        state.save()
+        self.assertEqual(batcher.flush(), 0)
+        self.assertEqual(batcher.stats["errors"], 1)
+        self.assertEqual(len(batcher), 1)
+        # The local state is still loaded
+        state, _ = self.node("hf1")
+        self.assertEqual(state.get("input", "page_cursor"), "c1")
+        self._collection.down = False
+        self.assertEqual(batcher.flush(), 1)
+        self.assertEqual(self._collection.documents["poizen-inc"]["sequence"], 1)
+
+    def test_batch_size(self):
+        batcher = KVStoreBatcher(self._collection, clock=self._clock)
+        for index in range(2500):
+            batcher.stage({"_key": "enterprise-{}".format(index)})
+        self.assertEqual(batcher.flush(), 2500)
+        self.assertEqual(self._collection.requests, 3)
+        self.assertIsNone(batcher.fetch("missing"))
+
+    def test_connect(self):
+        collections = {
+            (
+                "ghe_audit_log_monitoring_checkpoints",
+                ("nobody", "ghe_audit_log_monitoring"),
+            ): MockCollection(self._collection)
+        }
+        connections = []
+
+        def connect(**kwargs):
+            connections.append(kwargs)
+            return MockService(
+                collections, owner=kwargs.get("owner"), app=kwargs.get("app")
+            )
+
+        batcher = KVStoreBatcher.connect(
+            connect,
+            "session-key",
+            "ghe_audit_log_monitoring",
+            "ghe_audit_log_monitoring_checkpoints",
+            flush_seconds=5,
+        )
+        self.assertEqual(
+            connections,
+            [
+                {
+                    "token": "session-key",
+                    "owner": "nobody",
+                    "app": "ghe_audit_log_monitoring",
+                }
+            ],
+        )
+        self.assertIs(batcher.collection, self._collection)
+        # Not visible from the namespace of the session
+        self.assertNotIn(
+            "ghe_audit_log_monitoring_checkpoints", MockService(collections).kvstore
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
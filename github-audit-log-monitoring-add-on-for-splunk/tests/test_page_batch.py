@@ -0,0 +1,49 @@
+"""Unit tests for the PageBatch class
+"""
+import unittest
+from bin.audit_log_entry import AuditLogEntry
+from bin.page_batch import PageBatch, Symbols
+
+
+class TestPageBatch(unittest.TestCase):
+    """Set of unit tests for the PageBatch class"""
+
+    def setUp(self):
+        self._entries = [
+            AuditLogEntry.from_dict(item)
+            for item in [
+                {"@timestamp": 1000, "action": "git.clone", "actor": "a", "repo": "o/r", "_document_id": "d0"},
+                {"@timestamp": 2000, "action": "git.fetch", "actor": "b", "repo": "o/r", "_document_id": "d1"},
+                {"@timestamp": 3000, "action": "git.clone", "actor": "a", "business": "poizen-inc", "_document_id": "d2"},
+                {"action": "repo.create", "actor": "c", "org": "o", "_document_id": "d3"},
+            ]
+        ]
+        self._batch = PageBatch.from_entries(self._entries)
+
+    def test_columns(self):
+        self.assertEqual(len(self._batch), 4)
+        self.assertListEqual(self._batch.document_ids, ["d0", "d1", "d2", "d3"])
+        self.assertListEqual(list(self._batch.timestamps)[:3], [1000.0, 2000.0, 3000.0])
+        actions = self._batch.codes("action")
+        self.assertEqual(actions[0], actions[2])
+        self.assertNotEqual(actions[0], actions[1])
+        # org falls back to business, missing values are code 0
+        self.assertEqual(self._batch.symbols.name(self._batch.codes("org")[2]), "poizen-inc")
+        self.assertEqual(self._batch.codes("org")[0], 0)
+
+    def test_count_by(self):
+        self.assertDictEqual(
+            self._batch.count_by("action"),
+            {"git.clone": 2, "git.fetch": 1, "repo.create": 1},
+        )
+        self.assertDictEqual(self._batch.count_by("repo"), {"o/r": 2, None: 2})
+
+    def test_shared_symbols(self):
+        symbols = Symbols()
+        first = PageBatch.from_entries(self._entries[:2], symbols)
+        second = PageBatch.from_entries(self._entries[2:], symbols)
+        self.assertEqual(first.codes("action")[0], second.codes("action")[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+"""Unit tests for the pipeline helpers
+"""
+import time
+import threading
+import unittest
+from bin.pipeline import Prefetcher, WorkerPool, run_in_pool
+
+
+class TestPrefetcher(unittest.TestCase):
+    """Set of unit tests for the Prefetcher class"""
+
+    def test_yields_in_order(self):
+        output = list(Prefetcher(iter(range(50)), max_pending=3))
+        self.assertListEqual(output, list(range(50)))
+
+    def test_producer_exception(self):
+        def producer():
+            yield 1
+            raise RuntimeError("fetch failed")
+
+        output = []
+        with self.assertRaises(RuntimeError):
+            for item in Prefetcher(producer()):
+                output.append(item)
+        self.assertListEqual(output, [1])
+
+    def test_backpressure(self):
+        produced = []
+
+        def producer():
+            for item in range(10):
+                produced.append(item)
+                yield item
+
+        prefetcher = Prefetcher(producer(), max_pending=2)
+        iterator = iter(prefetcher)
+        self.assertEqual(next(iterator), 0)
+        time.sleep(0.3)
+        # One item handed over, two queued and one blocked on the full queue
+        self.assertLessEqual(len(produced), 4)
+        iterator.close()
+
+    def test_byte_budget(self):
+        produced = []
+
+        def producer():
+            for item in range(10):
+                produced.append(item)
+                yield "x" * 40
+
+        prefetcher = Prefetcher(producer(), max_pending=5, max_bytes=100, size=len)
+        iterator = iter(prefetcher)
+        next(iterator)
+        time.sleep(0.3)
+        # Three items add up to the budget, none was released
+        self.assertEqual(len(produced), 3)
+        self.assertEqual(prefetcher.held_bytes, 120)
+        prefetcher.release()
+        time.sleep(0.3)
+        self.assertEqual(len(produced), 4)
+        for _ in iterator:
+            prefetcher.release()
+        self.assertEqual(len(produced), 10)
+        self.assertEqual(prefetcher.held_bytes, 0)
+
+
+class TestRunInPool(unittest.TestCase):
+    """Set of unit tests for run_in_pool()"""
+
+    def test_results_in_order(self):
+        output = run_in_pool(lambda item: item * 2, range(20), workers=4)
+        self.assertListEqual(output, [item * 2 for item in range(20)])
+
+    def test_exception(self):
+        def work(item):
+            if item == 3:
+                raise ValueError("boom")
+            return item
+
+        with self.assertRaises(ValueError):
+            run_in_pool(work, range(5), workers=2)
+
+
+class TestWorkerPool(unittest.TestCase):
+    """Set of unit tests for the WorkerPool class"""
+
+    def test_slow_item(self):
+        release = threading.Event()
+
+        def work(item):
+            if item == "slow":
+                release.wait(5)
+            return item.upper()
+
+        pool = WorkerPool(work, workers=2)
+        pool.submit("slow")
+        pool.submit("fast")
+        # Handed back while the slow item is still running
+        self.assertListEqual(pool.completed(timeout=5), [("fast", "FAST", None)])
+        pool.submit("again")
+        self.assertListEqual(pool.completed(timeout=5), [("again", "AGAIN", None)])
+        self.assertListEqual(pool.completed(timeout=0.05), [])
+        release.set()
+        self.assertListEqual(pool.completed(timeout=5), [("slow", "SLOW", None)])
+        pool.close()
+
+    def test_exception(self):
+        error = ValueError("boom")
+
+        def work(item):
+            raise error
+
+        pool = WorkerPool(work, workers=1)
+        pool.submit(1)
+        self.assertListEqual(pool.completed(timeout=5), [(1, None, error)])
+        pool.close()
@@ -0,0 +1,87 @@
+"""Unit tests for the Projection class
+"""
+import unittest
+from bin.audit_log_entry import AuditLogEntry
+from bin.projection import Projection
+
+
+def make_entry(action="git.fetch", **fields):
+    item = {
+        "@timestamp": 1614692646036,
+        "action": action,
+        "actor": "octocat",
+        "actor_location": {"country_code": "US", "region": {"code": "CA", "name": "California"}},
+        "hashed_token": "abc=",
+        "repo": "org-demo/public-repo",
+        "_document_id": "doc",
+    }
+    item.update(fields)
+    return AuditLogEntry.from_dict(item)
+
+
+class TestProjection(unittest.TestCase):
+    """Set of unit tests for the Projection class"""
+
+    def test_keep(self):
+        projection = Projection(keep=["action", "actor_location.region.code", "repo", "missing.path"])
+        self.assertListEqual(
+            list(projection.project(make_entry()).items()),
+            [
+                ("action", "git.fetch"),
+                ("actor_location", {"region": {"code": "CA"}}),
+                ("repo", "org-demo/public-repo"),
+            ],
+        )
+        # Nothing left of a nested object, or not an object: the field is omitted
+        self.assertDictEqual(
+            projection.project(make_entry(actor_location="US")),
+            {"action": "git.fetch", "repo": "org-demo/public-repo"},
+        )
+        # A path covers the longer ones under it
+        projection = Projection(keep=["actor_location.region.code", "actor_location"])
+        self.assertDictEqual(projection.project(make_entry()), {"actor_location": make_entry().actor_location})
+
+    def test_drop(self):
+        projection = Projection(drop=["hashed_token", "actor_location.region", "_document_id"])
+        self.assertDictEqual(
+            projection.project(make_entry()),
+            {
+                "@timestamp": 1614692646036,
+                "action": "git.fetch",
+                "actor": "octocat",
+                "actor_location": {"country_code": "US"},
+                "repo": "org-demo/public-repo",
+            },
+        )
+        # The entry is left untouched
+        self.assertEqual(make_entry().actor_location["region"]["code"], "CA")
+
+    def test_keep_drop(self):
+        projection = Projection(keep=["action", "actor_location"], drop=["actor_location.region.name"])
+        self.assertDictEqual(
+            projection.project(make_entry()),
+            {"action": "git.fetch", "actor_location": {"country_code": "US", "region": {"code": "CA"}}},
+        )
+
+    def test_actions(self):
+        projection = Projection.from_settings({"actions": "git.*, repo.create", "keep": "action, repo"})
+        self.assertDictEqual(projection.project(make_entry()), {"action": "git.fetch", "repo": "org-demo/public-repo"})
+        self.assertDictEqual(
+            projection.project(make_entry("repo.create")), {"action": "repo.create", "repo": "org-demo/public-repo"}
+        )
+        entry = make_entry("org.add_member")
+        self.assertIs(projection.project(entry), entry)
+        self.assertTrue(projection.applies("git.clone"))
+        self.assertFalse(projection.applies(None))
+
+    def test_shapes(self):
+        projection = Projection(drop=["hashed_token"])
+        first = projection.project(make_entry())
+        second = projection.project(make_entry(extra=1))
+        self.assertNotIn("hashed_token", first)
+        self.assertEqual(second["extra"], 1)
+        self.assertNotIn("hashed_token", second)
+
+
+if __name__ == "__main__":
+    unittest.main()
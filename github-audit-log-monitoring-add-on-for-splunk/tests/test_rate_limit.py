@@ -0,0 +1,100 @@
+"""Unit tests for the rate limit scheduler
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from bin.rate_limit import RateLimitScheduler, RateLimitExceeded
+
+
+def mock_headers(remaining, reset=1000, limit=5000):
+    return {
+        "X-RateLimit-Limit": str(limit),
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset": str(reset),
+        "X-RateLimit-Used": str(limit - remaining),
+    }
+
+
+class TestRateLimitScheduler(unittest.TestCase):
+    """Set of unit tests for the RateLimitScheduler class"""
+
+    def setUp(self):
+        self.now = 400.0
+        self.sleeps = []
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "rate_limit.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def scheduler(self, **kwargs):
+        return RateLimitScheduler(
+            path=self.path,
+            clock=lambda: self.now,
+            sleep=self.sleeps.append,
+            **kwargs
+        )
+
+    def test_no_history(self):
+        self.assertEqual(self.scheduler().wait(), 0)
+        self.assertListEqual(self.sleeps, [])
+
+    def test_plenty_of_budget(self):
+        scheduler = self.scheduler()
+        scheduler.update(mock_headers(4000))
+        self.assertEqual(scheduler.delay(), 0)
+
+    def test_pacing(self):
+        scheduler = self.scheduler()
+        scheduler.update(mock_headers(600))
+        # 600 seconds left for 600 calls
+        self.assertAlmostEqual(scheduler.delay(), 1.0)
+        self.now += 0.25
+        self.assertAlmostEqual(scheduler.delay(), 599.75 / 600 - 0.25)
+
+    def test_exhausted_waits_for_reset(self):
+        scheduler = self.scheduler(max_wait=1000)
+        scheduler.update(mock_headers(0))
+        self.assertEqual(scheduler.wait(), 601)
+        self.assertEqual(scheduler.slept, 601)
+        # A new window starts after the reset
+        self.now = 1001
+        self.assertEqual(scheduler.delay(), 0)
+
+    def test_exhausted_raises(self):
+        scheduler = self.scheduler(max_wait=60)
+        scheduler.update(mock_headers(10))
+        scheduler = self.scheduler(max_wait=60, reserve=10)
+        with self.assertRaises(RateLimitExceeded):
+            scheduler.wait()
+
+    def test_shared_between_inputs(self):
+        input_a = self.scheduler()
+        input_b = self.scheduler()
+        input_a.update(mock_headers(100))
+        # input_b sees a stale value for the same window and keeps the lowest
+        input_b.update(mock_headers(300))
+        self.assertEqual(input_a.load()["remaining"], 100)
+        input_b.update(mock_headers(4999, reset=5000))
+        self.assertEqual(input_a.load()["remaining"], 4999)
+
+    def test_saved_when_it_matters(self):
+        scheduler = self.scheduler()
+        # A new window is saved, the requests above pace_below are not
+        scheduler.update(mock_headers(4000))
+        os.utime(self.path, (0, 0))
+        scheduler.update(mock_headers(3999))
+        scheduler.update(mock_headers(1251))
+        self.assertEqual(os.stat(self.path).st_mtime, 0)
+        self.assertEqual(self.scheduler().load()["remaining"], 4000)
+        # Under pace_below, every request is saved
+        scheduler.update(mock_headers(1250))
+        self.assertEqual(self.scheduler().load()["remaining"], 1250)
+        # A new window is saved
+        scheduler.update(mock_headers(5000, reset=5000))
+        self.assertEqual(self.scheduler().load()["reset"], 5000)
+        # The end of the run saves the last values
+        scheduler.update(mock_headers(4900, reset=5000))
+        scheduler.save()
+        self.assertEqual(self.scheduler().load()["remaining"], 4900)
@@ -3,7 +3,70 @@
 import os
 import unittest
 import configparser
+import requests
 from bin.rest_client import GitHub
+from bin.rate_limit import RateLimitExceeded
+from bin.dedup_index import DedupIndex
+from bin.audit_log_entry import AuditLogEntry
+from mocks import MockResponse
+
+
+class MockSession:
+    """Records the requests made and replays the queued responses"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def get(self, url, **kwargs):
+        self.calls.append(dict(kwargs, url=url))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def close(self):
+        self.closed = True
+
+
+class MockRateLimiter:
+    """Lets `budget` requests through, then reports an exhausted budget"""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.slept = 0
+
+    def wait(self):
+        if self.budget == 0:
+            raise RateLimitExceeded(1615036681)
+        self.budget -= 1
+
+    def update(self, response_headers):
+        pass
+
+    def save(self):
+        pass
+
+
+def mock_error(status_code, headers=None, text=""):
+    """Build a failed MockResponse"""
+    response = MockResponse([], status_code=status_code)
+    response.text = text
+    response.headers.update(headers or {})
+    return response
+
+
+def mock_page(count, start=0, next_cursor=None):
+    """Build a MockResponse with `count` entries and an optional next link"""
+    entries = [
+        {
+            "@timestamp": 1614692646036 + i,
+            "action": "git.fetch",
+            "_document_id": "doc-{}".format(i),
+        }
+        for i in range(start, start + count)
+    ]
+    return MockResponse(entries, next_cursor=next_cursor)
 
 
 class TestRestClient(unittest.TestCase):
@@ -34,6 +97,306 @@ class TestRestClient(unittest.TestCase):
         # Happy flow
         self.assertDictEqual(self.GitHub.headers(mock_headers), mock_headers)
 
+    def test_session_pool(self):
+        github = GitHub(
+            api_url="api.github.com",
+            access_token="12345",
+            pool_size=4,
+            connect_timeout=3,
+            read_timeout=30,
+        )
+        adapter = github.session.get_adapter("https://api.github.com")
+        self.assertEqual(adapter._pool_connections, 4)
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertEqual(github.timeout, (3.0, 30.0))
+        github.close()
+
+    def test_get_enterprise_audit_log_reuses_session(self):
+        session = MockSession(
+            [mock_page(100, next_cursor="cursor-1"), mock_page(20, start=100)]
+        )
+        github = GitHub(api_url="api.github.com", access_token="12345", session=session)
+        audit_log = github.get_enterprise_audit_log(
+            type="enterprises", enterprise="poizen-inc"
+        )
+        self.assertEqual(audit_log.total, 120)
+        self.assertEqual(len(session.calls), 2)
+        self.assertEqual(session.calls[1]["params"]["after"], "cursor-1")
+        for call in session.calls:
+            self.assertEqual(call["headers"]["Authorization"], "Bearer 12345")
+            self.assertEqual(call["timeout"], github.timeout)
+
+    def test_shared_session(self):
+        session = MockSession([])
+        github = GitHub(api_url="api.github.com", access_token="12345", session=session)
+        github.close()
+        # A session provided by the caller is shared and left open
+        self.assertFalse(getattr(session, "closed", False))
+
+    def test_iter_enterprise_audit_log(self):
+        session = MockSession(
+            [mock_page(100, next_cursor="cursor-1"), mock_page(20, start=100)]
+        )
+        github = GitHub(api_url="api.github.com", access_token="12345", session=session)
+        pages = list(
+            github.iter_enterprise_audit_log(
+                type="enterprises",
+                enterprise="poizen-inc",
+                page_cursor="cursor-0",
+                last_document_id="doc-9",
+            )
+        )
+        self.assertEqual(len(pages), 2)
+        # The entries already written by the previous run are dropped
+        self.assertEqual(pages[0].total, 90)
+        self.assertEqual(pages[1].total, 20)
+        self.assertFalse(pages[1].has_next_page)
+        self.assertEqual(session.calls[0]["params"]["after"], "cursor-0")
+        self.assertEqual(session.calls[1]["params"]["after"], "cursor-1")
+
+    def test_iter_enterprise_audit_log_dedup_index(self):
+        session = MockSession(
+            [mock_page(100, next_cursor="cursor-1"), mock_page(20, start=100)]
+        )
+        github = GitHub(api_url="api.github.com", access_token="12345", session=session)
+        dedup_index = DedupIndex()
+        dedup_index.add_entries(
+            AuditLogEntry(_document_id="doc-{}".format(i)) for i in range(95, 105)
+        )
+        pages = list(
+            github.iter_enterprise_audit_log(
+                type="enterprises",
+                enterprise="poizen-inc",
+                page_cursor="cursor-0",
+                # The page shifted: the checkpointed entry is gone
+                last_document_id="doc-missing",
+            )
+        )
+        # The index is left to the consumer of the pages
+        self.assertEqual(pages[0].total, 100)
+        self.assertEqual(pages[0].deduplicate(dedup_index), 5)
+        self.assertEqual(pages[1].deduplicate(dedup_index), 5)
+        self.assertEqual(pages[0].total, 95)
+        self.assertEqual(pages[1].total, 15)
+
+    def test_get_enterprise_audit_log_dedup_index(self):
+        session = MockSession([mock_page(10, start=0)])
+        github = GitHub(api_url="api.github.com", access_token="12345", session=session)
+        dedup_index = DedupIndex()
+        dedup_index.add_entries(
+            AuditLogEntry(_document_id="doc-{}".format(i)) for i in range(7)
+        )
+        audit_log = github.get_enterprise_audit_log(
+            type="enterprises",
+            enterprise="poizen-inc",
+            last_document_id="doc-9",
+            last_count=10,
+            dedup_index=dedup_index,
+        )
+        # The count heuristics would have emptied the page
+        self.assertListEqual(
+            [entry.document_id for entry in audit_log], ["doc-7", "doc-8", "doc-9"]
+        )
+
+    def test_iter_enterprise_audit_log_max_bytes(self):
+        session = MockSession(
+            [
+                mock_page(100, next_cursor="cursor-1"),
+                mock_page(100, start=100, next_cursor="cursor-2"),
+                mock_page(100, start=200),
+            ]
+        )
+        github = GitHub(api_url="api.github.com", access_token="12345", session=session)
+        page_size = len(mock_page(100).content)
+        pages = list(
+            github.iter_enterprise_audit_log(
+                type="enterprises", enterprise="poizen-inc", max_bytes=page_size + 1
+            )
+        )
+        self.assertEqual(len(pages), 2)
+        self.assertFalse(github.max_entries_reached)
+
+    def test_iter_enterprise_audit_log_max_entries(self):
+        session = MockSession(
+            [mock_page(100, next_cursor="cursor-1"), mock_page(100, next_cursor="cursor-2")]
+        )
+        github = GitHub(
+            api_url="api.github.com", access_token="12345", max_entries=100, session=session
+        )
+        pages = list(
+            github.iter_enterprise_audit_log(type="enterprises", enterprise="poizen-inc")
+        )
+        self.assertEqual(len(pages), 1)
+        self.assertTrue(github.max_entries_reached)
+        self.assertEqual(pages[0].page_cursor["next"], "cursor-1")
+
+    def test_get_enterprise_audit_log_rate_limited(self):
+        session = MockSession(
+            [mock_page(100, next_cursor="cursor-1"), mock_page(100, next_cursor="cursor-2")]
+        )
+        github = GitHub(
+            api_url="api.github.com",
+            access_token="12345",
+            session=session,
+            rate_limiter=MockRateLimiter(1),
+        )
+        audit_log = github.get_enterprise_audit_log(
+            type="enterprises", enterprise="poizen-inc"
+        )
+        # The loaded page is kept and the cursor points at the next one
+        self.assertTrue(github.rate_limited)
+        self.assertEqual(audit_log.total, 100)
+        self.assertEqual(audit_log.page_cursor["next"], "cursor-1")
+        # Nothing to return when the budget is exhausted from the start
+        github = GitHub(
+            api_url="api.github.com",
+            access_token="12345",
+            session=MockSession([]),
+            rate_limiter=MockRateLimiter(0),
+        )
+        with self.assertRaises(RateLimitExceeded):
+            github.get_enterprise_audit_log(type="enterprises", enterprise="poizen-inc")
+
+    def test_iter_enterprise_audit_log_rate_limited(self):
+        session = MockSession(
+            [mock_page(100, next_cursor="cursor-1"), mock_page(100, next_cursor="cursor-2")]
+        )
+        github = GitHub(
+            api_url="api.github.com",
+            access_token="12345",
+            session=session,
+            rate_limiter=MockRateLimiter(1),
+        )
+        pages = list(
+            github.iter_enterprise_audit_log(type="enterprises", enterprise="poizen-inc")
+        )
+        self.assertEqual(len(pages), 1)
+        self.assertTrue(github.rate_limited)
+
+    def test_classify(self):
+        github = GitHub(api_url="api.github.com", access_token="12345", session=MockSession([]))
+        self.assertEqual(github.classify(response=mock_page(1)), "ok")
+        self.assertEqual(github.classify(response=mock_error(502)), "retry")
+        self.assertEqual(github.classify(response=mock_error(429)), "retry")
+        self.assertEqual(
+            github.classify(response=mock_error(403, text="You have exceeded a secondary rate limit")),
+            "retry",
+        )
+        self.assertEqual(
+            github.classify(response=mock_error(403, {"X-RateLimit-Remaining": "0"})),
+            "rate_limit",
+        )
+        self.assertEqual(github.classify(response=mock_error(401)), "fail")
+        self.assertEqual(
+            github.classify(error=requests.exceptions.ConnectionError()), "retry"
+        )
+
+    def test_retries(self):
+        sleeps = []
+        session = MockSession(
+            [
+                mock_error(502),
+                requests.exceptions.ReadTimeout(),
+                mock_error(403, {"Retry-After": "30"}),
+                mock_page(20),
+            ]
+        )
+        github = GitHub(
+            api_url="api.github.com",
+            access_token="12345",
+            session=session,
+            sleep=sleeps.append,
+        )
+        audit_log = github.get_enterprise_audit_log(
+            type="enterprises", enterprise="poizen-inc", page_cursor="cursor-0"
+        )
+        self.assertEqual(audit_log.total, 20)
+        self.assertEqual(github.retry_stats["retries"], 3)
+        self.assertAlmostEqual(github.retry_stats["sleep_seconds"], sum(sleeps))
+        # Retry-After is honoured
+        self.assertGreaterEqual(sleeps[2], 30)
+        # Every attempt asks for the same page
+        for call in session.calls:
+            self.assertEqual(call["params"]["after"], "cursor-0")
+
+    def test_retries_exhausted(self):
+        session = MockSession(
+            [mock_page(100, next_cursor="cursor-1"), mock_error(502), mock_error(502)]
+        )
+        github = GitHub(
+            api_url="api.github.com",
+            access_token="12345",
+            session=session,
+            max_retries=1,
+            sleep=lambda delay: None,
+        )
+        audit_log = github.get_enterprise_audit_log(
+            type="enterprises", enterprise="poizen-inc"
+        )
+        # The first page is kept and the next run resumes from the failed one
+        self.assertEqual(audit_log.total, 100)
+        self.assertEqual(audit_log.page_cursor["next"], "cursor-1")
+        self.assertIn("status_code: 502", github.error)
+        # Failing on the first page still raises
+        github = GitHub(
+            api_url="api.github.com",
+            access_token="12345",
+            session=MockSession([mock_error(401)]),
+        )
+        with self.assertRaises(RuntimeError):
+            github.get_enterprise_audit_log(type="enterprises", enterprise="poizen-inc")
+
+    def test_responses_closed(self):
+        exhausted = mock_error(403, {"X-RateLimit-Remaining": "0"})
+        failed = mock_error(401)
+        session = MockSession([exhausted, failed])
+        github = GitHub(
+            api_url="api.github.com",
+            access_token="12345",
+            session=session,
+            stream_json=True,
+        )
+        with self.assertRaises(RuntimeError):
+            list(
+                github.iter_enterprise_audit_log(
+                    type="enterprises", enterprise="poizen-inc"
+                )
+            )
+        # Neither the response retried nor the one failing hold a connection
+        self.assertTrue(exhausted.closed)
+        self.assertTrue(failed.closed)
+
+    def test_conditional_request(self):
+        not_modified = mock_error(304)
+        not_modified.ok = True
+        session = MockSession([not_modified])
+        github = GitHub(api_url="api.github.com", access_token="12345", session=session)
+        audit_log = github.get_enterprise_audit_log(
+            type="enterprises",
+            enterprise="poizen-inc",
+            page_cursor="cursor-0",
+            last_document_id="doc-9",
+            last_count=10,
+            etag='W/"fuzz"',
+        )
+        self.assertTrue(github.not_modified)
+        self.assertEqual(audit_log.total, 0)
+        self.assertEqual(session.calls[0]["headers"]["If-None-Match"], 'W/"fuzz"')
+        # The ETag only applies to the first page
+        session = MockSession(
+            [mock_page(100, next_cursor="cursor-1"), mock_page(20, start=100)]
+        )
+        github = GitHub(api_url="api.github.com", access_token="12345", session=session)
+        pages = list(
+            github.iter_enterprise_audit_log(
+                type="enterprises", enterprise="poizen-inc", etag='W/"fuzz"'
+            )
+        )
+        self.assertFalse(github.not_modified)
+        self.assertEqual(len(pages), 2)
+        self.assertIn("If-None-Match", session.calls[0]["headers"])
+        self.assertNotIn("If-None-Match", session.calls[1]["headers"])
+
     def test_set_max_entries(self):
         # Fail max_entries not int
         mock_max_entries = "ABC"
@@ -0,0 +1,74 @@
+"""Unit tests for the Rollup class
+"""
+import unittest
+from bin.audit_log_entry import AuditLogEntry
+from bin.page_batch import PageBatch
+from bin.rollup import Datapoint, Rollup
+
+
+def make_batch(rows):
+    return PageBatch.from_entries(
+        [
+            AuditLogEntry.from_dict(
+                {
+                    "@timestamp": timestamp,
+                    "action": action,
+                    "actor": actor,
+                    "repo": "org-demo/public-repo",
+                    "transport_protocol_name": "http",
+                    "_document_id": "doc-{}".format(index),
+                }
+            )
+            for index, (timestamp, action, actor) in enumerate(rows)
+        ]
+    )
+
+
+class TestRollup(unittest.TestCase):
+    """Set of unit tests for the Rollup class"""
+
+    def test_split(self):
+        batch = make_batch(
+            [
+                (1614692646036, "git.fetch", "octocat"),
+                (1614692650000, "git.fetch", "octocat"),
+                (1614692659999, "git.fetch", "hubot"),
+                (1614692700000, "git.fetch", "octocat"),
+                (1614692701000, "org.add_member", "octocat"),
+                (None, "git.clone", "octocat"),
+                (1614692702000, "git.clone", "octocat"),
+            ]
+        )
+        entries, datapoints = Rollup(bucket_seconds=60).split(batch)
+        # Entries not rolled up, including the ones without a timestamp
+        self.assertListEqual([entry.document_id for entry in entries], ["doc-4", "doc-5"])
+        self.assertListEqual(
+            sorted(datapoints),
+            [
+                Datapoint(1614692640, "git.fetch", "org-demo/public-repo", "hubot", "http", 1),
+                Datapoint(1614692640, "git.fetch", "org-demo/public-repo", "octocat", "http", 2),
+                Datapoint(1614692700, "git.clone", "org-demo/public-repo", "octocat", "http", 1),
+                Datapoint(1614692700, "git.fetch", "org-demo/public-repo", "octocat", "http", 1),
+            ],
+        )
+        self.assertEqual(sum(datapoint.count for datapoint in datapoints), 5)
+
+    def test_sample(self):
+        batch = make_batch([(1614692646036 + index, "git.fetch", "octocat") for index in range(1000)])
+        entries, datapoints = Rollup(sample_ratio=0.1).split(batch)
+        self.assertEqual(datapoints[0].count, 1000)
+        self.assertTrue(50 < len(entries) < 150)
+        # The same entries are sampled every time
+        self.assertListEqual(Rollup(sample_ratio=0.1).split(batch)[0], entries)
+        self.assertEqual(len(Rollup(sample_ratio=1).split(batch)[0]), 1000)
+        self.assertEqual(len(Rollup().split(batch)[0]), 0)
+
+    def test_serialize(self):
+        self.assertEqual(
+            Rollup.serialize(Datapoint(1614692640, "git.fetch", "org-demo/public-repo", None, "ssh", 12)),
+            "github.git.events=12 action=git.fetch repo=org-demo/public-repo transport_protocol_name=ssh",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+"""Unit tests for the Scheduler class
+"""
+import unittest
+from bin.scheduler import Scheduler
+from mocks import MockClock
+
+
+class TestScheduler(unittest.TestCase):
+    """Set of unit tests for the Scheduler class"""
+
+    def setUp(self):
+        self._clock = MockClock(1000.0)
+        self._scheduler = Scheduler(interval=60, clock=self._clock)
+
+    def test_pop_due(self):
+        self._scheduler.add("poizen-inc")
+        self._scheduler.add("evil-corp", due=1010.0)
+        self.assertListEqual(self._scheduler.pop_due(), ["poizen-inc"])
+        self.assertEqual(self._scheduler.wait_time(), 10.0)
+        self._clock.now = 1010.0
+        self.assertListEqual(self._scheduler.pop_due(), ["evil-corp"])
+        self.assertIsNone(self._scheduler.wait_time())
+
+    def test_reschedule(self):
+        self._scheduler.reschedule("poizen-inc", started=1000.0)
+        self._clock.now = 1030.0
+        self.assertEqual(self._scheduler.wait_time(), 30.0)
+        self.assertListEqual(self._scheduler.pop_due(), [])
+        # A poll longer than the interval is followed right away by the next
+        self._clock.now = 1100.0
+        self._scheduler.pop_due()
+        self._scheduler.reschedule("poizen-inc", started=1030.0)
+        self.assertEqual(self._scheduler.wait_time(), 0.0)
+        self.assertListEqual(self._scheduler.pop_due(), ["poizen-inc"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+"""Unit tests for the Spool class
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from bin.spool import Spool
+
+
+class TestSpool(unittest.TestCase):
+    """Set of unit tests for the Spool class"""
+
+    def setUp(self):
+        self._directory = os.path.join(tempfile.mkdtemp(), "poizen-inc")
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self._directory))
+
+    def test_append_read(self):
+        spool = Spool(self._directory, fsync=False)
+        self.assertListEqual(list(spool.read()), [])
+        positions = [spool.append(payload) for payload in (b"a", b"bb", b"")]
+        self.assertListEqual(positions, [(0, 9), (0, 19), (0, 27)])
+        self.assertListEqual(
+            list(spool.read()), [(b"a", (0, 9)), (b"bb", (0, 19)), (b"", (0, 27))]
+        )
+        # Resumes after the position of the last record handled
+        self.assertListEqual(list(spool.read((0, 9))), [(b"bb", (0, 19)), (b"", (0, 27))])
+        self.assertListEqual(list(spool.read((0, 27))), [])
+        self.assertEqual(spool.pending((0, 9)), 18)
+        self.assertEqual(spool.pending((0, 27)), 0)
+        # Reopened
+        self.assertEqual(len(list(Spool(self._directory).read())), 3)
+
+    def test_segments(self):
+        spool = Spool(self._directory, segment_bytes=20, fsync=False)
+        for index in range(5):
+            spool.append(b"0123456789" + str(index).encode("ascii"))
+        self.assertListEqual(spool.segments, [0, 1, 2])
+        records = list(spool.read())
+        self.assertEqual(len(records), 5)
+        position = records[2][1]
+        self.assertEqual(position, (1, 19))
+        self.assertListEqual([payload for payload, _ in spool.read(position)], [b"01234567893", b"01234567894"])
+        self.assertEqual(spool.pending(position), 38)
+        self.assertEqual(spool.release(position), 1)
+        self.assertListEqual(sorted(os.listdir(self._directory)), ["0000000001.spool", "0000000002.spool"])
+        # The last segment is kept, appends go on in it
+        self.assertEqual(spool.release(records[-1][1]), 1)
+        self.assertListEqual(spool.segments, [2])
+        self.assertEqual(spool.append(b"x"), (2, 28))
+
+    def test_torn_tail(self):
+        spool = Spool(self._directory, fsync=False)
+        spool.append(b"first")
+        spool.append(b"second")
+        path = os.path.join(self._directory, "0000000000.spool")
+        size = os.path.getsize(path)
+        # Crash mid-append: the header is written, the payload is not
+        with open(path, "ab") as segment_file:
+            segment_file.write(b"\x00\x00\x00\x10\x00\x00")
+        spool = Spool(self._directory, fsync=False)
+        self.assertEqual(os.path.getsize(path), size)
+        self.assertListEqual([payload for payload, _ in spool.read()], [b"first", b"second"])
+        self.assertEqual(spool.append(b"third"), (0, size + 13))
+
+    def test_corrupt(self):
+        spool = Spool(self._directory, segment_bytes=10, fsync=False)
+        spool.append(b"first")
+        spool.append(b"second")
+        path = os.path.join(self._directory, "0000000000.spool")
+        with open(path, "r+b") as segment_file:
+            segment_file.seek(9)
+            segment_file.write(b"F")
+        records = Spool(self._directory, segment_bytes=10, fsync=False).read()
+        with self.assertRaises(ValueError):
+            next(records)
+
+
+if __name__ == "__main__":
+    unittest.main()
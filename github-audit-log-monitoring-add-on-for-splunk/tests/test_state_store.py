@@ -0,0 +1,115 @@
+"""Unit tests for the StateStore class
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import configparser
+from bin.state_store import StateStore
+
+
+class TestStateStore(unittest.TestCase):
+    """Set of unit tests for the StateStore class"""
+
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+        self._path = os.path.join(self._directory, "poizen-inc_state")
+
+    def tearDown(self):
+        shutil.rmtree(self._directory)
+
+    def reopen(self, **kwargs):
+        return StateStore(self._path, **kwargs).load()
+
+    def test_configparser_api(self):
+        state = StateStore(self._path)
+        self.assertFalse(state.exists)
+        state.add_section("input")
+        state.set("input", "page_cursor", "")
+        state["input"]["etag"] = 'W/"abc"'
+        self.assertTrue(state.has_section("input"))
+        self.assertIn("input", state)
+        self.assertEqual(state.get("input", "etag"), 'W/"abc"')
+        self.assertEqual(state["input"].get("last_count", ""), "")
+        self.assertEqual(state.get("backfill", "completed", fallback="0"), "0")
+        self.assertListEqual(state.options("input"), ["page_cursor", "etag"])
+        with self.assertRaises(configparser.DuplicateSectionError):
+            state.add_section("input")
+        with self.assertRaises(configparser.NoSectionError):
+            state.set("spool", "offset", "0")
+        with self.assertRaises(configparser.NoOptionError):
+            state.get("input", "missing")
+        self.assertTrue(state.remove_option("input", "etag"))
+        self.assertTrue(state.remove_section("input"))
+        self.assertFalse(state.remove_section("input"))
+
+    def test_journal(self):
+        state = StateStore(self._path)
+        state.add_section("input")
+        state.set("input", "page_cursor", "c1")
+        state.set("input", "etag", "e1")
+        state.save()
+        state.set("input", "page_cursor", "c2")
+        state.remove_option("input", "etag")
+        state.add_section("backfill")
+        state.set("backfill", "2021-01-01..*", "")
+        state.save()
+        # Nothing changed, nothing journaled
+        size = os.path.getsize(self._path + ".journal")
+        state.save()
+        self.assertEqual(os.path.getsize(self._path + ".journal"), size)
+        self.assertFalse(os.path.exists(self._path + ".json"))
+        state.remove_section("backfill")
+        state.save()
+        state = self.reopen()
+        self.assertTrue(state.exists)
+        self.assertDictEqual(state["input"], {"page_cursor": "c2"})
+        self.assertListEqual(state.sections(), ["input"])
+
+    def test_torn_journal(self):
+        state = StateStore(self._path)
+        state.add_section("input")
+        state.set("input", "page_cursor", "c1")
+        state.save()
+        size = os.path.getsize(self._path + ".journal")
+        # Crash mid-append
+        with open(self._path + ".journal", "ab") as journal_file:
+            journal_file.write(b'{"set":{"input":{"page_cursor":"c')
+        state = self.reopen()
+        self.assertEqual(state.get("input", "page_cursor"), "c1")
+        self.assertEqual(os.path.getsize(self._path + ".journal"), size)
+        state.set("input", "page_cursor", "c2")
+        state.save()
+        self.assertEqual(self.reopen().get("input", "page_cursor"), "c2")
+
+    def test_compact(self):
+        state = StateStore(self._path, compact_bytes=200)
+        state.add_section("input")
+        for index in range(20):
+            state.set("input", "page_cursor", "cursor-{}".format(index))
+            state.save()
+            self.assertLessEqual(os.path.getsize(self._path + ".journal"), 200)
+        self.assertTrue(os.path.exists(self._path + ".json"))
+        self.assertEqual(self.reopen().get("input", "page_cursor"), "cursor-19")
+        # A crash between the snapshot and the journal truncation: the
+        # journal is replayed over a snapshot that already has its changes
+        with open(self._path + ".journal", "ab") as journal_file:
+            journal_file.write(b'{"set":{"input":{"page_cursor":"cursor-19"}}}\n')
+        state = self.reopen(compact_bytes=200)
+        state.compact()
+        self.assertEqual(os.path.getsize(self._path + ".journal"), 0)
+        self.assertEqual(self.reopen().get("input", "page_cursor"), "cursor-19")
+
+    def test_migrate(self):
+        config = configparser.ConfigParser()
+        config.read_string("[input]\npat_credential_id = abc\npage_cursor = c1\n[spool]\noffset = 12\n")
+        state = StateStore(self._path)
+        state.migrate(config)
+        state = self.reopen()
+        self.assertEqual(state["input"]["pat_credential_id"], "abc")
+        self.assertEqual(state.get("spool", "offset"), "12")
+        self.assertEqual(os.path.getsize(self._path + ".journal"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,8 @@
 """Unit tests for the audit log class
 """
 import os
+import shutil
+import tempfile
 import unittest
 from hashlib import md5
 from bin.utilities import Utilities
@@ -28,3 +30,41 @@ class TestUtilities(unittest.TestCase):
             "transport_protocol=1 repository=org-demo/public-repo business=poizen-inc timestamp=1614697638660 repo=org-demo/public-repo action=git.fetch repository_public=true transport_protocol_name=http _document_id=G5gbjASWTuYX-_BJa6i4eQ== org=org-demo "
         )
         self.assertListEqual(output, expected_output)
+
+    def test_json_serialize(self):
+        mock_entry = {
+            "@timestamp": 1614697638660,
+            "action": "git.fetch",
+            "actor_location": {"country_code": "FR"},
+            "user": "béatrice",
+            "repository_public": True,
+        }
+        output = Utilities.json_serialize(AuditLogEntry.from_dict(mock_entry))
+        self.assertEqual(
+            output,
+            '{"@timestamp":1614697638660,"action":"git.fetch","actor_location":{"country_code":"FR"},"user":"béatrice","repository_public":true}',
+        )
+        self.assertEqual(Utilities.json_serialize(None), "")
+
+    def test_event_times(self):
+        entries = [
+            AuditLogEntry(**{"@timestamp": 1614697638660, "created_at": 1614697638000}),
+            AuditLogEntry(created_at="1614697638007"),
+            AuditLogEntry(action="git.fetch"),
+        ]
+        self.assertListEqual(
+            Utilities.event_times(entries),
+            ["1614697638.660", "1614697638.007", None],
+        )
+
+    def test_atomic_write(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "poizen-inc_state.conf")
+            Utilities.atomic_write(path, "[input]\npage_cursor = abc\n")
+            Utilities.atomic_write(path, "[input]\npage_cursor = def\n")
+            with open(path) as state_file:
+                self.assertEqual(state_file.read(), "[input]\npage_cursor = def\n")
+            self.assertListEqual(os.listdir(directory), ["poizen-inc_state.conf"])
+        finally:
+            shutil.rmtree(directory)